@@ -0,0 +1,279 @@
+"""Micro-benchmarks for bridge hot paths (pytest-benchmark).
+
+Not collected by the regular test run; invoke explicitly:
+
+    pip install pytest-benchmark
+    python -m pytest bench_ibkr_bridge.py --benchmark-autosave
+    python -m pytest bench_ibkr_bridge.py --benchmark-compare --benchmark-compare-fail=mean:15%
+
+Fixtures are sized like a busy account (500 positions, 5 000 executions,
+100 k bars, a 2 000-contract chain) and built from sim_ib, so no Gateway is
+needed. Each benchmark also records the peak traced allocation of a single
+call in extra_info (peakKiB / blocks), which autosave keeps alongside the
+timings so allocation regressions show up in the same history.
+"""
+import os
+import random
+import sys
+import threading
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import ibkr_bridge  # noqa: E402
+import sim_ib  # noqa: E402
+from ib_insync import BarData, LimitOrder, OptionChain, OrderStatus, Ticker, Trade  # noqa: E402
+
+POSITIONS = 500
+EXECUTIONS = 5000
+BARS = 100_000
+CHAIN_EXPIRATIONS = 20
+CHAIN_STRIKES = 100
+CONTENTION_THREADS = 8
+
+
+def measure(benchmark, fn, *args, **kwargs):
+    """Benchmarks fn and records one call's peak allocation in extra_info."""
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["peakKiB"] = round(peak / 1024, 1)
+    benchmark.extra_info["blocks"] = sum(stat.count for stat in snapshot.statistics("filename"))
+    return benchmark(fn, *args, **kwargs)
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+# --- Fixtures ---
+
+@pytest.fixture(scope="module")
+def sim():
+    positions = {f"S{i:03d}": (i % 7 + 1) * 10 for i in range(POSITIONS)}
+    return sim_ib.SimulatedIB(sim_ib.SimConfig(positions=positions, executions=EXECUTIONS))
+
+
+@pytest.fixture(scope="module")
+def stock_ticker(sim):
+    return sim._fill_ticker(Ticker(contract=sim._stock("AAPL")))
+
+
+@pytest.fixture(scope="module")
+def option_ticker(sim):
+    contract = ibkr_bridge.Option("AAPL", "20991217", 200.0, "C", "SMART")
+    sim._qualify(contract)
+    return sim._fill_ticker(Ticker(contract=contract))
+
+
+@pytest.fixture(scope="module")
+def trades(sim):
+    rows = []
+    for i, position in enumerate(sim.positions()):
+        order = LimitOrder("BUY" if i % 2 else "SELL", 10, 100.0 + i)
+        order.orderId, order.permId, order.clientId = i + 1, 900000000 + i, 1
+        status = OrderStatus(orderId=order.orderId, status="Submitted", remaining=10, permId=order.permId)
+        rows.append(Trade(position.contract, order, status, [], []))
+    return rows
+
+
+@pytest.fixture(scope="module")
+def bars():
+    rng = random.Random(1)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    price = 100.0
+    rows = []
+    for i in range(BARS):
+        close = price * (1 + rng.gauss(0, 0.001))
+        rows.append(BarData(date=start + timedelta(minutes=i), open=price, high=max(price, close), low=min(price, close),
+                            close=close, volume=float(rng.randint(100, 10000)), average=(price + close) / 2, barCount=10))
+        price = close
+    return rows
+
+
+@pytest.fixture(scope="module")
+def chains():
+    today = datetime(2030, 1, 4)
+    expirations = [(today + timedelta(days=7 * i)).strftime("%Y%m%d") for i in range(CHAIN_EXPIRATIONS)]
+    strikes = [50.0 + 2.5 * i for i in range(CHAIN_STRIKES)]
+    return [OptionChain("SMART", 265598, "AAPL", "100", expirations, strikes),
+            OptionChain("CBOE", 265598, "AAPL", "100", expirations, strikes)]
+
+
+# --- Market data ---
+
+def test_build_market_payload(benchmark, stock_ticker):
+    measure(benchmark, ibkr_bridge.build_market_payload, "AAPL", stock_ticker, "realtime")
+
+
+def test_safe_value_and_number(benchmark):
+    values = [1.5, float("nan"), None, "2.25", 0, float("inf"), "bad"] * 1500
+
+    def convert():
+        return [ibkr_bridge.safe_value(v) for v in values], [ibkr_bridge.safe_number(v) for v in values]
+    measure(benchmark, convert)
+
+
+def test_extract_option_greeks(benchmark, option_ticker):
+    measure(benchmark, ibkr_bridge.extract_option_greeks, option_ticker)
+
+
+def test_apply_option_fallbacks_passthrough(benchmark):
+    response = {"bid": 5.0, "ask": 5.2, "delta": 0.5, "source": "realtime"}
+    req = {"expiration": "20991217", "right": "C", "strike": 200}
+    measure(benchmark, ibkr_bridge.apply_option_fallbacks, dict(response), req, 210.0)
+
+
+def test_apply_option_fallbacks_model(benchmark):
+    # No greeks from IB: falls through to the mibian Black-Scholes path.
+    expiration = (datetime.now() + timedelta(days=30)).strftime("%Y%m%d")
+    req = {"expiration": expiration, "right": "C", "strike": 200}
+    measure(benchmark, lambda: ibkr_bridge.apply_option_fallbacks({"bid": 12.4, "ask": 12.6, "source": "delayed"}, req, 205.0))
+
+
+# --- Caches & locks ---
+
+def test_cache_read_write_contended(benchmark):
+    cache = {}
+    ops = 2000
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(ops):
+            key = f"K{rng.randrange(200)}"
+            if rng.random() < 0.2:
+                ibkr_bridge.cache_write(cache, key, {"last": 1.0})
+            else:
+                ibkr_bridge.cache_read(cache, key, 60)
+    benchmark.extra_info["threads"] = CONTENTION_THREADS
+    benchmark.extra_info["opsPerThread"] = ops
+    benchmark.pedantic(run_threads, args=(CONTENTION_THREADS, worker), rounds=5, iterations=1)
+
+
+def test_bridge_lock_uncontended(benchmark):
+    def cycle():
+        acquired, _ = ibkr_bridge.acquire_bridge_lock("market", 1.0, 1, 0)
+        assert acquired
+        ibkr_bridge.release_bridge_lock("market", 0)
+    measure(benchmark, cycle)
+
+
+def test_bridge_lock_contended(benchmark):
+    def worker(_):
+        for _ in range(500):
+            acquired, _ = ibkr_bridge.acquire_bridge_lock("market", 5.0, 1, 0)
+            assert acquired
+            ibkr_bridge.release_bridge_lock("market", 0)
+    benchmark.extra_info["threads"] = CONTENTION_THREADS
+    benchmark.pedantic(run_threads, args=(CONTENTION_THREADS, worker), rounds=5, iterations=1)
+
+
+# --- Row builders ---
+
+def test_position_rows(benchmark, sim):
+    positions = sim.positions()
+    assert len(positions) == POSITIONS
+    measure(benchmark, lambda: [ibkr_bridge.build_position_row(p) for p in positions])
+
+
+def test_portfolio_rows(benchmark, sim):
+    items = sim.portfolio()
+    measure(benchmark, lambda: [ibkr_bridge.build_portfolio_row(p) for p in items])
+
+
+def test_order_rows(benchmark, trades):
+    measure(benchmark, lambda: [ibkr_bridge.build_order_row(t) for t in trades])
+
+
+def test_execution_rows(benchmark, sim):
+    fills = sim.fills
+    assert len(fills) == EXECUTIONS
+    measure(benchmark, lambda: [ibkr_bridge.build_execution_row(f.contract, f.execution, f.commissionReport) for f in fills])
+
+
+def test_execution_store_merge(benchmark, sim):
+    rows = [ibkr_bridge.build_execution_row(f.contract, f.execution, f.commissionReport) for f in sim.fills]
+
+    def merge():
+        store = ibkr_bridge.ExecutionStore(3650)
+        store.merge(rows)
+        return store
+    measure(benchmark, merge)
+
+
+def test_execution_store_query(benchmark, sim):
+    store = ibkr_bridge.ExecutionStore(3650)
+    store.merge([ibkr_bridge.build_execution_row(f.contract, f.execution, f.commissionReport) for f in sim.fills])
+    rows, _, _ = store.query()
+    assert len(rows) == EXECUTIONS
+    measure(benchmark, store.query)
+
+
+# --- Serialization ---
+
+def test_bar_payloads(benchmark, bars):
+    measure(benchmark, lambda: [ibkr_bridge.build_bar_payload(b) for b in bars])
+
+
+def test_jsonify_bars(benchmark, bars):
+    payload = {"symbol": "AAPL", "bars": [ibkr_bridge.build_bar_payload(b) for b in bars]}
+
+    def render():
+        with ibkr_bridge.app.test_request_context():
+            return ibkr_bridge.jsonify(payload).get_data()
+    measure(benchmark, render)
+
+
+def test_jsonify_execution_rows(benchmark, sim):
+    rows = [ibkr_bridge.build_execution_row(f.contract, f.execution, f.commissionReport) for f in sim.fills]
+    payload = {"executions": rows, "count": len(rows)}
+
+    def render():
+        with ibkr_bridge.app.test_request_context():
+            return ibkr_bridge.jsonify(payload).get_data()
+    measure(benchmark, render)
+
+
+def test_option_chain_payload(benchmark, chains):
+    with patch('ibkr_bridge.get_loop', return_value=MagicMock()), \
+            patch('ibkr_bridge.qualify_underlyings', return_value=None), \
+            patch('ibkr_bridge.submit_ib_call', return_value=(MagicMock(), None)), \
+            patch('ibkr_bridge.wait_for_future', return_value=(chains, None)):
+        payload, err = ibkr_bridge.request_option_chain_payload("AAPL")
+        assert err is None
+        assert len(payload["expirations"]) * len(payload["strikes"]) == CHAIN_EXPIRATIONS * CHAIN_STRIKES
+        measure(benchmark, ibkr_bridge.request_option_chain_payload, "AAPL")
+
+
+def test_option_chain_filter(benchmark, chains):
+    payload = {"symbol": "AAPL", "expirations": chains[0].expirations, "strikes": chains[0].strikes}
+    index = ibkr_bridge.OptionChainIndex(payload)
+    filters = {"dteMax": 45, "nearPrice": 175.0, "count": 20}
+    measure(benchmark, index.filter, filters, datetime(2030, 1, 1).date())
+
+
+def test_jsonify_option_chain(benchmark, chains):
+    with patch('ibkr_bridge.get_loop', return_value=MagicMock()), \
+            patch('ibkr_bridge.qualify_underlyings', return_value=None), \
+            patch('ibkr_bridge.submit_ib_call', return_value=(MagicMock(), None)), \
+            patch('ibkr_bridge.wait_for_future', return_value=(chains, None)):
+        payload, _ = ibkr_bridge.request_option_chain_payload("AAPL")
+
+    def render():
+        with ibkr_bridge.app.test_request_context():
+            return ibkr_bridge.jsonify(payload).get_data()
+    measure(benchmark, render)
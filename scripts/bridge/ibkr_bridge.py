@@ -9,27 +9,44 @@ Refactored for:
 3. Detailed market data logging (debugging tier fallbacks).
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from ib_insync import IB, Stock, Option, LimitOrder, MarketOrder, Order, ExecutionFilter, util
+from ib_insync import IB, Stock, Option, Index, Contract, ComboLeg, LimitOrder, MarketOrder, Order, ExecutionFilter, util
 import mibian
 import math
 import json
+import gzip
 import nest_asyncio
 import asyncio
 import os
 import logging
+import logging.handlers
+import atexit
 import threading
 import queue
-import urllib.request
-import urllib.error
+import bisect
+import collections
+import dataclasses
+import operator
+import http.client
+from urllib.parse import urlsplit
 import random
 import uuid
-from datetime import datetime
-from datetime import timedelta
+from datetime import datetime, time as dt_time, timedelta, timezone
 import time
 from contextlib import contextmanager
 from dotenv import load_dotenv
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Load environment variables from .env/.env.local (override via IBKR_BRIDGE_ENV_FILE)
 env_file = os.getenv('IBKR_BRIDGE_ENV_FILE') or os.getenv('BRIDGE_ENV_FILE')
@@ -42,11 +59,13 @@ else:
 # Apply nest_asyncio to allow nested event loops
 nest_asyncio.apply()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
-)
+# Configure logging. Startup logs go straight to the console handler; once the
+# config is read it moves behind a QueueListener (see "Logging Pipeline").
+LOG_TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+console_log_handler = logging.StreamHandler()
+console_log_handler.setFormatter(logging.Formatter(LOG_TEXT_FORMAT))
+logging.getLogger().addHandler(console_log_handler)
+logging.getLogger().setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -98,6 +117,8 @@ IB_PORT = env_int('IB_PORT', default_ib_port())
 if raw_port is None:
     logger.info("IB_PORT not set; using %s for client=%s mode=%s", IB_PORT, IB_CLIENT_TYPE, IB_TRADING_MODE)
 IB_CLIENT_ID = env_int('IB_CLIENT_ID', 1)
+# 'sim' swaps the Gateway for sim_ib.SimulatedIB (offline load/soak testing).
+IB_BACKEND = (read_env('IB_BACKEND', 'gateway') or 'gateway').lower()
 BRIDGE_API_KEY = read_env('IBKR_BRIDGE_API_KEY') or read_env('BRIDGE_API_KEY')
 EXECUTION_WEBHOOK_URL = read_env('IBKR_EXECUTION_WEBHOOK_URL') or read_env('EXECUTION_WEBHOOK_URL')
 
@@ -111,9 +132,12 @@ IB_CONNECT_TIMEOUT = env_float('IB_CONNECT_TIMEOUT', 15.0)
 IB_HEARTBEAT_INTERVAL = env_float('IB_HEARTBEAT_INTERVAL', 30.0)
 IB_HEARTBEAT_TIMEOUT = env_float('IB_HEARTBEAT_TIMEOUT', 20.0)
 IB_RECONNECT_INTERVAL = env_float('IB_RECONNECT_INTERVAL', 10.0)
+IB_RECONNECT_MIN_INTERVAL = env_float('IB_RECONNECT_MIN_INTERVAL', 0.5)
+IB_SYNC_TIMEOUT = env_float('IB_SYNC_TIMEOUT', 5.0)
 IB_CONTRACT_QUALIFY_TIMEOUT = env_float('IB_CONTRACT_QUALIFY_TIMEOUT', 5.0)
 IB_MARKET_DATA_CACHE_TTL = env_float('IB_MARKET_DATA_CACHE_TTL', 2.0)
-IB_OPTION_CHAIN_CACHE_TTL = env_float('IB_OPTION_CHAIN_CACHE_TTL', 300.0)
+# Upper bound only: chain entries also expire at the next market open/close.
+IB_OPTION_CHAIN_CACHE_TTL = env_float('IB_OPTION_CHAIN_CACHE_TTL', 3600.0)
 IB_HISTORICAL_CACHE_TTL = env_float('IB_HISTORICAL_CACHE_TTL', 300.0)
 IB_EXECUTIONS_TIMEOUT = env_float('IB_EXECUTIONS_TIMEOUT', 20.0)
 IB_ORDERS_TIMEOUT = env_float('IB_ORDERS_TIMEOUT', 10.0)
@@ -136,12 +160,225 @@ IB_PORTFOLIO_CACHE_TTL = env_float('IB_PORTFOLIO_CACHE_TTL', 5.0)
 IB_ACCOUNT_SUMMARY_TIMEOUT = env_float('IB_ACCOUNT_SUMMARY_TIMEOUT', 10.0)
 IB_CONTRACT_DETAILS_TIMEOUT = env_float('IB_CONTRACT_DETAILS_TIMEOUT', 5.0)
 IB_CONTRACT_DETAILS_CACHE_TTL = env_float('IB_CONTRACT_DETAILS_CACHE_TTL', 86400.0)
+BRIDGE_METRICS_ENABLED = env_bool('BRIDGE_METRICS_ENABLED', True)
+BRIDGE_TRACE_ENABLED = env_bool('BRIDGE_TRACE_ENABLED', True)
+BRIDGE_SERVER_TIMING = env_bool('BRIDGE_SERVER_TIMING', False)
+BRIDGE_SLOW_REQUEST_MS = env_int('BRIDGE_SLOW_REQUEST_MS', 1000)
+BRIDGE_SLOW_REQUEST_BUFFER = env_int('BRIDGE_SLOW_REQUEST_BUFFER', 50)
+BRIDGE_LOG_BUFFER_SIZE = env_int('BRIDGE_LOG_BUFFER_SIZE', 2000)
+BRIDGE_LOG_BUFFER_LEVEL = (read_env('BRIDGE_LOG_BUFFER_LEVEL', 'INFO') or 'INFO').upper()
+BRIDGE_LOG_ASYNC = env_bool('BRIDGE_LOG_ASYNC', True)
+BRIDGE_LOG_FORMAT = (read_env('BRIDGE_LOG_FORMAT', 'text') or 'text').lower()
+BRIDGE_LOG_SAMPLE_RATE = min(1.0, max(0.0, env_float('BRIDGE_LOG_SAMPLE_RATE', 1.0)))
+BRIDGE_LOG_QUEUE_SIZE = env_int('BRIDGE_LOG_QUEUE_SIZE', 10000)
+BRIDGE_STATE_DIR = read_env('BRIDGE_STATE_DIR', '.bridge_state')
+BRIDGE_CONTRACT_DETAILS_CACHE_PATH = read_env('BRIDGE_CONTRACT_DETAILS_CACHE_PATH', os.path.join(BRIDGE_STATE_DIR, 'contract_details_cache.json'))
+BRIDGE_WEBHOOK_SPOOL_PATH = read_env('BRIDGE_WEBHOOK_SPOOL_PATH', os.path.join(BRIDGE_STATE_DIR, 'execution_webhook_spool.jsonl'))
+BRIDGE_WEBHOOK_TIMEOUT = env_float('BRIDGE_WEBHOOK_TIMEOUT', 10.0)
+BRIDGE_WEBHOOK_POOL_SIZE = env_int('BRIDGE_WEBHOOK_POOL_SIZE', 2)
+BRIDGE_WEBHOOK_BATCH_MAX = env_int('BRIDGE_WEBHOOK_BATCH_MAX', 50)
+BRIDGE_WEBHOOK_BATCH_WINDOW = env_float('BRIDGE_WEBHOOK_BATCH_WINDOW', 0.25)
+BRIDGE_WEBHOOK_RETRY_BASE = env_float('BRIDGE_WEBHOOK_RETRY_BASE', 0.5)
+BRIDGE_WEBHOOK_RETRY_MAX = env_float('BRIDGE_WEBHOOK_RETRY_MAX', 60.0)
+BRIDGE_EXECUTIONS_STORE_PATH = read_env('BRIDGE_EXECUTIONS_STORE_PATH', os.path.join(BRIDGE_STATE_DIR, 'executions_store.json'))
+BRIDGE_EXECUTIONS_RETENTION_DAYS = env_float('BRIDGE_EXECUTIONS_RETENTION_DAYS', 30.0)
+BRIDGE_EXECUTIONS_BACKFILL_DAYS = env_float('BRIDGE_EXECUTIONS_BACKFILL_DAYS', 7.0)
+BRIDGE_ORDER_BATCH_MAX = env_int('BRIDGE_ORDER_BATCH_MAX', 20)
+BRIDGE_ORDER_WAIT_MAX = env_float('BRIDGE_ORDER_WAIT_MAX', 30.0)
+BRIDGE_ORDER_STREAM_MAX_SECONDS = env_float('BRIDGE_ORDER_STREAM_MAX_SECONDS', 600.0)
+BRIDGE_ORDER_STREAM_KEEPALIVE = env_float('BRIDGE_ORDER_STREAM_KEEPALIVE', 15.0)
+BRIDGE_HISTORICAL_DAILY_CACHE_TTL = env_float('BRIDGE_HISTORICAL_DAILY_CACHE_TTL', 21600.0)
+BRIDGE_WARMUP_ENABLED = env_bool('BRIDGE_WARMUP_ENABLED', True)
+BRIDGE_WARMUP_SYMBOLS = [s.strip().upper() for s in (read_env('BRIDGE_WARMUP_SYMBOLS', 'AAPL,MSFT,GOOGL,AMZN,META,NVDA,TSLA') or '').split(',') if s.strip()]
+BRIDGE_WARMUP_INCLUDE_POSITIONS = env_bool('BRIDGE_WARMUP_INCLUDE_POSITIONS', True)
+BRIDGE_WARMUP_MAX_SYMBOLS = env_int('BRIDGE_WARMUP_MAX_SYMBOLS', 40)
+BRIDGE_WARMUP_CHAINS = env_bool('BRIDGE_WARMUP_CHAINS', True)
+BRIDGE_WARMUP_BARS = env_bool('BRIDGE_WARMUP_BARS', True)
+BRIDGE_WARMUP_BARS_DURATION = read_env('BRIDGE_WARMUP_BARS_DURATION', '1 M')
+BRIDGE_WARMUP_STREAMS = env_bool('BRIDGE_WARMUP_STREAMS', True)
+BRIDGE_WARMUP_MAX_STREAMS = env_int('BRIDGE_WARMUP_MAX_STREAMS', 20)
+BRIDGE_WARMUP_PACING = env_float('BRIDGE_WARMUP_PACING', 0.5)
+BRIDGE_PNL_MAX_SUBSCRIPTIONS = env_int('BRIDGE_PNL_MAX_SUBSCRIPTIONS', 200)
+BRIDGE_PNL_IDLE_TTL = env_float('BRIDGE_PNL_IDLE_TTL', 300.0)
+BRIDGE_PNL_FIRST_UPDATE_TIMEOUT = env_float('BRIDGE_PNL_FIRST_UPDATE_TIMEOUT', 3.0)
+# 'auto' uses orjson when installed; 'stdlib' forces the json module.
+BRIDGE_JSON_ENCODER = (read_env('BRIDGE_JSON_ENCODER', 'auto') or 'auto').lower()
+BRIDGE_COMPRESSION = env_bool('BRIDGE_COMPRESSION', True)
+BRIDGE_COMPRESS_MIN_BYTES = env_int('BRIDGE_COMPRESS_MIN_BYTES', 1024)
+BRIDGE_GZIP_LEVEL = min(9, max(1, env_int('BRIDGE_GZIP_LEVEL', 5)))
+# Extra exchange holidays (YYYY-MM-DD or YYYYMMDD, comma separated) on top of the built-in NYSE table.
+BRIDGE_MARKET_HOLIDAYS = read_env('BRIDGE_MARKET_HOLIDAYS', '')
+BRIDGE_SESSION_CACHE_POLICY = env_bool('BRIDGE_SESSION_CACHE_POLICY', True)
+BRIDGE_EXTENDED_HOURS_CACHE_TTL = env_float('BRIDGE_EXTENDED_HOURS_CACHE_TTL', 10.0)
+BRIDGE_CLOSED_CACHE_TTL = env_float('BRIDGE_CLOSED_CACHE_TTL', 900.0)
 
 if IB_DEBUG_LOGGING:
     logging.getLogger().setLevel(logging.DEBUG)
     logger.setLevel(logging.DEBUG)
     logging.getLogger('ib_insync').setLevel(logging.DEBUG)
 
+request_context = threading.local()
+
+# --- Log Buffer ---
+
+class RequestContextFilter(logging.Filter):
+    # Runs on the logging thread, so request id/route come from the caller's context.
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = getattr(request_context, "request_id", None)
+        if not hasattr(record, "route"):
+            record.route = getattr(request_context, "name", None)
+        return True
+
+def record_event_message(record):
+    # log_ctx records carry the bare message separately from the text line's
+    # request prefix and fields suffix.
+    event_msg = getattr(record, "event_msg", None)
+    if event_msg is None:
+        return record.getMessage()
+    event_args = getattr(record, "event_args", None)
+    return event_msg % event_args if event_args else event_msg
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the newest structured log records in memory for /diag/logs."""
+
+    def __init__(self, capacity, level=logging.INFO):
+        super().__init__(level)
+        self.records = collections.deque(maxlen=max(1, capacity))
+
+    def emit(self, record):
+        try:
+            entry = {
+                "ts": record.created,
+                "time": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+                "level": record.levelname,
+                "levelNo": record.levelno,
+                "logger": record.name,
+                "message": record_event_message(record),
+                "requestId": getattr(record, "request_id", None),
+                "route": getattr(record, "route", None),
+            }
+            fields = getattr(record, "fields", None)
+            if fields:
+                entry["fields"] = {
+                    k: v if isinstance(v, (str, int, float, bool, dict, list, type(None))) else str(v)
+                    for k, v in fields.items()
+                }
+            ib_error_code = getattr(record, "ib_error_code", None)
+            if ib_error_code is not None:
+                entry["ibErrorCode"] = ib_error_code
+            self.records.append(entry)
+        except Exception:
+            self.handleError(record)
+
+    def query(self, limit, min_level=logging.NOTSET, request_id=None, route=None, since=None, until=None):
+        # Newest-first walk under the handler lock; stops after `limit` matches or
+        # once records fall before `since`.
+        matched = []
+        with self.lock:
+            for entry in reversed(self.records):
+                if since is not None and entry["ts"] < since:
+                    break
+                if until is not None and entry["ts"] > until:
+                    continue
+                if entry["levelNo"] < min_level:
+                    continue
+                if request_id and entry["requestId"] != request_id:
+                    continue
+                if route and entry["route"] != route:
+                    continue
+                matched.append(entry)
+                if len(matched) >= limit:
+                    break
+            size = len(self.records)
+        matched.reverse()
+        return matched, size
+
+log_buffer_handler = RingBufferHandler(
+    BRIDGE_LOG_BUFFER_SIZE,
+    level=logging.DEBUG if IB_DEBUG_LOGGING else getattr(logging, BRIDGE_LOG_BUFFER_LEVEL, logging.INFO)
+)
+
+# --- Logging Pipeline ---
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record_event_message(record),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["requestId"] = request_id
+            entry["route"] = getattr(record, "route", None)
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry["fields"] = fields
+        ib_error_code = getattr(record, "ib_error_code", None)
+        if ib_error_code is not None:
+            entry["ibErrorCode"] = ib_error_code
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records without formatting; the listener thread does the work."""
+
+    def prepare(self, record):
+        # Message args are formatted later on the listener thread, so callers must
+        # not mutate objects they pass as log args. Tracebacks are rendered now
+        # because frames do not survive the hand-off.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            inc_counter("bridge_log_dropped_total", level=record.levelname)
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    def handle(self, record):
+        flush_event = getattr(record, "flush_event", None)
+        if flush_event is not None:
+            flush_event.set()
+            return
+        super().handle(record)
+
+def flush_logs(timeout=2.0):
+    if not log_listener:
+        return True
+    marker = logging.makeLogRecord({"flush_event": threading.Event()})
+    log_queue.put(marker)
+    return marker.flush_event.wait(timeout)
+
+def configure_log_pipeline():
+    root = logging.getLogger()
+    if BRIDGE_LOG_FORMAT == 'json':
+        console_log_handler.setFormatter(JsonLogFormatter())
+    if not BRIDGE_LOG_ASYNC:
+        console_log_handler.addFilter(RequestContextFilter())
+        log_buffer_handler.addFilter(RequestContextFilter())
+        root.addHandler(log_buffer_handler)
+        return None
+    root.removeHandler(console_log_handler)
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    root.addHandler(queue_handler)
+    listener = FlushingQueueListener(log_queue, console_log_handler, log_buffer_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+log_queue = queue.Queue(maxsize=max(0, BRIDGE_LOG_QUEUE_SIZE))
+log_listener = configure_log_pipeline()
+
 # --- Global State ---
 
 ib = None
@@ -151,6 +388,9 @@ data_lock = threading.RLock()
 connection_in_progress_lock = threading.Lock()
 connection_ready = threading.Event()
 connection_epoch = 0
+# Set on disconnect so the monitor reconnects without waiting out its tick.
+reconnect_wakeup = threading.Event()
+disconnected_at = None
 bridge_start_time = time.time()
 
 # Lock groups avoid one slow call blocking everything.
@@ -189,6 +429,7 @@ diag_state = {
     "lastIbErrorMessage": None,
     "heartbeatFailures": 0,
     "reconnectAttempts": 0,
+    "lastRecoveryMs": None,
     "lastHeartbeatAt": None,
     "lastAccountSummaryAt": None,
     "lastAccountSummaryMs": None,
@@ -208,16 +449,231 @@ diag_state = {
 market_data_cache = {}
 option_chain_cache = {}
 historical_cache = {}
-executions_cache = {}
 orders_cache = {}
 positions_cache = {}
-account_summary_cache = {}
 contract_details_cache = {}
-pnl_cache = {}
+qualified_contracts_cache = {}
+
+cache_names = {
+    id(market_data_cache): "market_data",
+    id(option_chain_cache): "option_chain",
+    id(historical_cache): "historical",
+    id(orders_cache): "orders",
+    id(positions_cache): "positions",
+    id(contract_details_cache): "contract_details",
+    id(qualified_contracts_cache): "qualified_contracts",
+}
 
-# Webhook queue
+# Webhook queue (one execution dict per fill; batched by webhook_dispatcher)
 execution_webhook_queue = queue.Queue()
 
+# --- Metrics ---
+
+# Log-linear (HDR-style) histogram: exact below 32us, then 16 sub-buckets per
+# power of two (~6% relative error). Recording is a bit_length and a dict bump.
+HIST_SUB_BUCKET_BITS = 5
+HIST_SUB_BUCKET_HALF = 1 << (HIST_SUB_BUCKET_BITS - 1)
+PROMETHEUS_BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "sum_us", "max_us")
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @staticmethod
+    def bucket_index(value_us):
+        if value_us < (1 << HIST_SUB_BUCKET_BITS):
+            return value_us
+        shift = value_us.bit_length() - HIST_SUB_BUCKET_BITS
+        return shift * HIST_SUB_BUCKET_HALF + (value_us >> shift)
+
+    @staticmethod
+    def bucket_upper(index):
+        if index < (1 << HIST_SUB_BUCKET_BITS):
+            return index
+        shift = index // HIST_SUB_BUCKET_HALF - 1
+        mantissa = index - shift * HIST_SUB_BUCKET_HALF
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value_ms):
+        value_us = max(0, int(value_ms * 1000))
+        index = self.bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def percentile_ms(self, pct):
+        if not self.count:
+            return None
+        target = max(1, int(math.ceil(self.count * pct / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucket_upper(index), self.max_us) / 1000.0
+        return self.max_us / 1000.0
+
+    def cumulative_buckets(self, bounds_seconds):
+        ordered = sorted(self.counts.items())
+        out = []
+        seen = 0
+        pos = 0
+        for bound in bounds_seconds:
+            bound_us = bound * 1_000_000
+            while pos < len(ordered) and self.bucket_upper(ordered[pos][0]) <= bound_us:
+                seen += ordered[pos][1]
+                pos += 1
+            out.append((bound, seen))
+        return out
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "meanMs": round(self.sum_us / self.count / 1000.0, 3) if self.count else None,
+            "p50Ms": self.percentile_ms(50),
+            "p90Ms": self.percentile_ms(90),
+            "p99Ms": self.percentile_ms(99),
+            "maxMs": self.max_us / 1000.0 if self.count else None,
+        }
+
+metrics_lock = threading.Lock()
+latency_histograms = {}   # (route, group, stage) -> LatencyHistogram
+lock_hold_histograms = {} # group -> LatencyHistogram
+metric_counters = {}      # (name, labels tuple) -> int
+requests_in_flight = {}   # route -> int
+
+def observe_latency(route, group, stage, value_ms):
+    if not BRIDGE_METRICS_ENABLED or value_ms is None:
+        return
+    key = (route, group, stage)
+    with metrics_lock:
+        hist = latency_histograms.get(key)
+        if hist is None:
+            hist = latency_histograms[key] = LatencyHistogram()
+        hist.record(value_ms)
+
+def observe_lock_hold(group, value_ms):
+    if not BRIDGE_METRICS_ENABLED or value_ms is None:
+        return
+    with metrics_lock:
+        hist = lock_hold_histograms.get(group)
+        if hist is None:
+            hist = lock_hold_histograms[group] = LatencyHistogram()
+        hist.record(value_ms)
+
+def inc_counter(name, amount=1, **labels):
+    if not BRIDGE_METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with metrics_lock:
+        metric_counters[key] = metric_counters.get(key, 0) + amount
+
+def adjust_in_flight(route, delta):
+    with metrics_lock:
+        requests_in_flight[route] = max(0, requests_in_flight.get(route, 0) + delta)
+
+def record_cache_result(cache, hit):
+    name = cache_names.get(id(cache))
+    if name:
+        inc_counter("bridge_cache_requests_total", cache=name, result="hit" if hit else "miss")
+
+def format_prom_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        text = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{key}="{text}"')
+    return "{" + ",".join(parts) + "}"
+
+def render_histogram_lines(name, labels, hist):
+    lines = []
+    for bound, cumulative in hist.cumulative_buckets(PROMETHEUS_BUCKETS_SECONDS):
+        lines.append(f"{name}_bucket{format_prom_labels(labels + (('le', repr(bound)),))} {cumulative}")
+    lines.append(f"{name}_bucket{format_prom_labels(labels + (('le', '+Inf'),))} {hist.count}")
+    lines.append(f"{name}_sum{format_prom_labels(labels)} {hist.sum_us / 1_000_000:.6f}")
+    lines.append(f"{name}_count{format_prom_labels(labels)} {hist.count}")
+    return lines
+
+def snapshot_metrics():
+    with metrics_lock:
+        latency = {k: (dict(h.counts), h.count, h.sum_us, h.max_us) for k, h in latency_histograms.items()}
+        holds = {k: (dict(h.counts), h.count, h.sum_us, h.max_us) for k, h in lock_hold_histograms.items()}
+        counters = dict(metric_counters)
+        in_flight = dict(requests_in_flight)
+    def restore(raw):
+        hist = LatencyHistogram()
+        hist.counts, hist.count, hist.sum_us, hist.max_us = raw
+        return hist
+    return (
+        {k: restore(v) for k, v in latency.items()},
+        {k: restore(v) for k, v in holds.items()},
+        counters,
+        in_flight
+    )
+
+def render_prometheus_metrics():
+    latency, holds, counters, in_flight = snapshot_metrics()
+    locks = get_lock_snapshot()
+    lines = [
+        "# HELP bridge_request_stage_seconds Per-route request stage latency (ready, lock_wait, ib_call, serialize, total).",
+        "# TYPE bridge_request_stage_seconds histogram",
+    ]
+    for (route, group, stage), hist in sorted(latency.items()):
+        lines.extend(render_histogram_lines("bridge_request_stage_seconds", (("route", route), ("group", group), ("stage", stage)), hist))
+    lines.append("# HELP bridge_lock_hold_seconds Time a lock group slot was held.")
+    lines.append("# TYPE bridge_lock_hold_seconds histogram")
+    for group, hist in sorted(holds.items()):
+        lines.extend(render_histogram_lines("bridge_lock_hold_seconds", (("group", group),), hist))
+
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for name in sorted(by_name):
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in sorted(by_name[name]):
+            lines.append(f"{name}{format_prom_labels(labels)} {value}")
+
+    lines.append("# TYPE bridge_requests_in_flight gauge")
+    for route, value in sorted(in_flight.items()):
+        lines.append(f"bridge_requests_in_flight{format_prom_labels((('route', route),))} {value}")
+    lines.append("# TYPE bridge_lock_inflight gauge")
+    lines.append("# TYPE bridge_lock_capacity gauge")
+    for group, state in sorted(locks.items()):
+        labels = format_prom_labels((("group", group),))
+        lines.append(f"bridge_lock_inflight{labels} {state['inflight']}")
+        lines.append(f"bridge_lock_capacity{labels} {state['capacity']}")
+    lines.append("# TYPE bridge_connection_ready gauge")
+    lines.append(f"bridge_connection_ready {1 if connection_ready.is_set() else 0}")
+    lines.append("# TYPE bridge_connection_epoch gauge")
+    lines.append(f"bridge_connection_epoch {get_current_epoch()}")
+    lines.append("# TYPE bridge_uptime_seconds gauge")
+    lines.append(f"bridge_uptime_seconds {int(time.time() - bridge_start_time)}")
+    return "\n".join(lines) + "\n"
+
+def metrics_json():
+    latency, holds, counters, in_flight = snapshot_metrics()
+    routes = {}
+    for (route, group, stage), hist in latency.items():
+        routes.setdefault(route, {"group": group, "stages": {}})["stages"][stage] = hist.summary()
+    counter_rows = [
+        {"name": name, "labels": dict(labels), "value": value}
+        for (name, labels), value in sorted(counters.items())
+    ]
+    return {
+        "timestamp": now_iso(),
+        "routes": routes,
+        "lockHold": {group: hist.summary() for group, hist in holds.items()},
+        "counters": counter_rows,
+        "inFlight": in_flight,
+    }
+
 # --- Utilities ---
 
 def now_iso():
@@ -251,6 +707,14 @@ def safe_number(val):
     except Exception:
         return None
 
+def parse_limit(raw, default, maximum=None):
+    try:
+        value = int(raw) if raw not in (None, '') else default
+    except (TypeError, ValueError):
+        value = default
+    value = max(1, value)
+    return min(value, maximum) if maximum else value
+
 def is_valid_number(val):
     return val is not None and isinstance(val, (int, float)) and not math.isnan(val) and val > 0
 
@@ -276,16 +740,33 @@ def build_market_payload(symbol, ticker, source):
     }
 
 def cache_read(cache, key, ttl):
-    with data_lock:
-        entry = cache.get(key)
-        if not entry: return None, None
-        age = time.time() - entry["timestamp"]
-        if age <= ttl: return entry["payload"], age
+    with trace_span(f"cache.{cache_names.get(id(cache), 'unknown')}"):
+        with data_lock:
+            entry = cache.get(key)
+            now = time.time()
+            age = now - entry["timestamp"] if entry else None
+            fresh = entry and age <= ttl and (entry.get("expiresAt") is None or now < entry["expiresAt"])
+            payload = entry["payload"] if fresh else None
+    record_cache_result(cache, payload is not None)
+    if payload is not None:
+        return payload, age
     return None, None
 
-def cache_write(cache, key, payload):
+def cache_write(cache, key, payload, expires_at=None):
+    # expires_at ends the entry at a calendar event (session open/close)
+    # regardless of the ttl the reader passes.
+    with data_lock:
+        cache[key] = {"timestamp": time.time(), "payload": payload, "expiresAt": expires_at}
+
+def cache_swap(cache, key, current, payload):
+    # Replaces the payload but keeps the entry's age and expiry, only if no
+    # one refreshed the entry in between.
     with data_lock:
-        cache[key] = {"timestamp": time.time(), "payload": payload}
+        entry = cache.get(key)
+        if not entry or entry["payload"] is not current:
+            return False
+        entry["payload"] = payload
+        return True
 
 def cache_age(cache, key):
     with data_lock:
@@ -306,58 +787,180 @@ def contract_cache_key(contract):
         return f"{(sec_type or 'UNK').upper()}:{symbol}"
     return None
 
-def fetch_contract_company_name(contract, timeout, epoch):
-    key = contract_cache_key(contract)
-    if not key:
-        return None
-    cached, _ = cache_read(contract_details_cache, key, IB_CONTRACT_DETAILS_CACHE_TTL)
-    if cached:
-        return cached
-    _ib = get_ib_instance()
-    if not get_loop():
-        return None
-    if hasattr(_ib, "reqContractDetailsAsync"):
-        f_details, err = submit_ib_call(_ib.reqContractDetailsAsync, contract, invoke_timeout=timeout)
-        if err:
-            return None
-        details, err = wait_for_future(f_details, timeout, expected_epoch=epoch)
-        if err or not details:
-            return None
-        detail = details[0]
-    else:
-        start = time.time()
-        details = _ib.reqContractDetails(contract)
-        if time.time() - start > timeout:
+async def gather_contract_details(_ib, contracts, timeout):
+    async def fetch_one(contract):
+        try:
+            return await asyncio.wait_for(_ib.reqContractDetailsAsync(contract), timeout)
+        except Exception:
             return None
-        detail = details[0] if details else None
-    if not detail:
-        return None
-    name = getattr(detail, "longName", None)
-    if name:
-        cache_write(contract_details_cache, key, name)
-    return name
+    return await asyncio.gather(*(fetch_one(c) for c in contracts))
 
-def debug_log(message):
-    if IB_DEBUG_LOGGING:
-        logger.info(f"[debug] {message}")
+def fetch_company_names(contracts, timeout, epoch):
+    """Resolves longName for all contracts in one concurrent gather on the IB loop."""
+    names = {}
+    misses = []
+    for contract in contracts:
+        key = contract_cache_key(contract)
+        if not key or key in names:
+            continue
+        cached, _ = cache_read(contract_details_cache, key, IB_CONTRACT_DETAILS_CACHE_TTL)
+        if cached:
+            names[key] = cached
+        else:
+            names[key] = None
+            misses.append((key, contract))
+    if not misses:
+        return names
+    _ib = get_ib_instance()
+    if not get_loop() or not hasattr(_ib, "reqContractDetailsAsync"):
+        return names
+    f_details, err = submit_ib_call(gather_contract_details, _ib, [c for _, c in misses], timeout, invoke_timeout=timeout)
+    if err:
+        return names
+    results, err = wait_for_future(f_details, timeout + 1.0, expected_epoch=epoch)
+    if err or not results:
+        return names
+    for (key, _), details in zip(misses, results):
+        name = getattr(details[0], "longName", None) if details else None
+        if name:
+            cache_write(contract_details_cache, key, name)
+            names[key] = name
+    return names
 
-request_context = threading.local()
+def load_contract_details_cache(path):
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            entries = json.load(fh)
+    except (OSError, ValueError) as exc:
+        logger.warning("Contract details cache load failed: %s", exc)
+        return 0
+    cutoff = time.time() - IB_CONTRACT_DETAILS_CACHE_TTL
+    with data_lock:
+        for key, entry in entries.items():
+            if isinstance(entry, dict) and entry.get("timestamp", 0) >= cutoff and entry.get("payload"):
+                contract_details_cache.setdefault(key, entry)
+        return len(contract_details_cache)
+
+def save_contract_details_cache(path):
+    if not path:
+        return
+    with data_lock:
+        entries = dict(contract_details_cache)
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(entries, fh)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        logger.warning("Contract details cache save failed: %s", exc)
+
+def debug_log(message, *args):
+    if IB_DEBUG_LOGGING:
+        logger.info("[debug] " + message, *args)
 
 def set_request_context(request_id, name):
     request_context.request_id = request_id
     request_context.name = name
+    request_context.ib_ms = 0.0
+    request_context.spans = [] if BRIDGE_TRACE_ENABLED else None
+    request_context.span_origin = time.perf_counter()
+    request_context.span_depth = 0
+    request_context.future_labels = {}
+    request_context.log_sampled = BRIDGE_LOG_SAMPLE_RATE >= 1.0 or random.random() < BRIDGE_LOG_SAMPLE_RATE
 
 def clear_request_context():
     request_context.request_id = None
     request_context.name = None
+    request_context.ib_ms = 0.0
+    request_context.spans = None
+    request_context.span_depth = 0
+    request_context.future_labels = {}
+    request_context.log_sampled = True
+
+def add_request_ib_time(elapsed_ms):
+    if getattr(request_context, "request_id", None):
+        request_context.ib_ms = getattr(request_context, "ib_ms", 0.0) + elapsed_ms
+
+# Spans are (name, depth, startMs, durationMs) tuples relative to request start.
+@contextmanager
+def trace_span(name):
+    spans = getattr(request_context, "spans", None)
+    if spans is None:
+        yield
+        return
+    depth = request_context.span_depth
+    request_context.span_depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        request_context.span_depth = depth
+        spans.append((name, depth, (start - request_context.span_origin) * 1000, (end - start) * 1000))
+
+def label_future(future, label):
+    labels = getattr(request_context, "future_labels", None)
+    if labels is not None and future is not None:
+        labels[id(future)] = label
 
-def log_ctx(level, message, **fields):
+def pop_future_label(future):
+    labels = getattr(request_context, "future_labels", None)
+    if not labels:
+        return None
+    return labels.pop(id(future), None)
+
+def get_request_spans():
+    spans = getattr(request_context, "spans", None)
+    if not spans:
+        return []
+    return [
+        {"name": name, "depth": depth, "startMs": round(start, 3), "durationMs": round(dur, 3)}
+        for name, depth, start, dur in sorted(spans, key=lambda span: span[2])
+    ]
+
+def format_server_timing(spans, stages):
+    totals = {}
+    for span in spans:
+        if span["depth"] != 0:
+            continue
+        totals[span["name"]] = totals.get(span["name"], 0.0) + span["durationMs"]
+    parts = [f"{name};dur={value:.1f}" for name, value in stages.items() if value is not None]
+    parts.extend(f"{name};dur={value:.1f}" for name, value in totals.items())
+    return ", ".join(parts)
+
+slow_requests = collections.deque(maxlen=max(1, BRIDGE_SLOW_REQUEST_BUFFER))
+
+def record_slow_request(entry):
+    slow_requests.append(entry)
+
+def get_slow_requests(limit=None, route=None):
+    rows = list(slow_requests)
+    rows.reverse()
+    if route:
+        rows = [row for row in rows if row.get("route") == route]
+    return rows[:limit] if limit else rows
+
+def log_sampled():
+    return getattr(request_context, "log_sampled", True)
+
+def log_ctx(level, message, *args, **fields):
+    # Lazy %-formatting: the text (including the fields dict) is rendered on the
+    # listener thread, not the request thread.
+    if not logger.isEnabledFor(level):
+        return
     request_id = getattr(request_context, "request_id", None)
-    prefix = f"[req {request_id}] " if request_id else ""
+    fmt = message
+    fmt_args = args
+    if request_id:
+        fmt = "[req %s] " + fmt
+        fmt_args = (request_id,) + fmt_args
     if fields:
-        logger.log(level, f"{prefix}{message} | {fields}")
-    else:
-        logger.log(level, f"{prefix}{message}")
+        fmt += " | %s"
+        fmt_args = fmt_args + (fields,)
+    logger.log(level, fmt, *fmt_args, extra={"fields": fields or None, "event_msg": message, "event_args": args})
 
 def new_request_id():
     return uuid.uuid4().hex[:8]
@@ -403,6 +1006,7 @@ def release_bridge_lock(group, hold_ms):
             state["inflight"] = max(0, state["inflight"] - 1)
             state["lastHoldMs"] = hold_ms
             state["maxHoldMs"] = max(state["maxHoldMs"], hold_ms)
+    observe_lock_hold(group, hold_ms)
 
 class BridgeGuard:
     def __init__(self, name, group, timeout):
@@ -418,65 +1022,150 @@ class BridgeGuard:
         self.lock_wait_ms = None
         self.lock_hold_ms = None
         self.lock_acquired = False
+        self.ready_ms = None
+        self.serialize_ms = 0.0
 
     def __enter__(self):
         self.request_id = new_request_id()
         set_request_context(self.request_id, self.name)
         self.start_time = time.time()
+        adjust_in_flight(self.name, 1)
 
-        log_ctx(logging.INFO, f"{self.name} start", path=request.path, args=dict(request.args), ip=request.remote_addr)
+        if log_sampled():
+            log_ctx(logging.INFO, "%s start", self.name, path=request.path, args=request.args.to_dict(), ip=request.remote_addr)
         update_diag(lastRequestAt=now_iso(), lastRequestPath=request.path, lastRequestId=self.request_id)
 
         ready_start = time.time()
         if not wait_for_connection(self.timeout):
             ready_ms = int((time.time() - ready_start) * 1000)
+            self.ready_ms = ready_ms
             self.status_code = 503
             self.response = (jsonify({"error": "Bridge busy", "reason": "not-ready"}), 503)
-            log_ctx(logging.WARNING, f"{self.name} not ready", waitMs=ready_ms, health=get_health_snapshot())
+            log_ctx(logging.WARNING, "%s not ready", self.name, waitMs=ready_ms, health=get_health_snapshot())
             return self
 
         ready_ms = int((time.time() - ready_start) * 1000)
+        self.ready_ms = ready_ms
+        if self.group is None:
+            # Memory-only routes (event-fed books) skip the IB lock groups.
+            self.ok = True
+            return self
         acquired, wait_ms = acquire_bridge_lock(self.group, self.timeout, IB_DATA_LOCK_RETRY_ATTEMPTS, IB_DATA_LOCK_RETRY_BACKOFF)
+        self.lock_wait_ms = wait_ms
         if not acquired:
             self.status_code = 503
             self.response = (jsonify({"error": "Bridge busy", "reason": "lock-timeout"}), 503)
-            log_ctx(logging.WARNING, f"{self.name} lock timeout", waitMs=wait_ms, readyMs=ready_ms, health=get_health_snapshot())
+            log_ctx(logging.WARNING, "%s lock timeout", self.name, waitMs=wait_ms, readyMs=ready_ms, health=get_health_snapshot())
             return self
 
         self.lock_acquired = True
-        self.lock_wait_ms = wait_ms
         self.lock_start = time.time()
         self.ok = True
-        log_ctx(logging.INFO, f"{self.name} lock acquired", group=self.group, waitMs=wait_ms, readyMs=ready_ms)
+        if log_sampled():
+            log_ctx(logging.INFO, "%s lock acquired", self.name, group=self.group, waitMs=wait_ms, readyMs=ready_ms)
         return self
 
+    def serialize(self, payload):
+        start = time.perf_counter()
+        with trace_span("serialize"):
+            body = jsonify(payload)
+        self.serialize_ms += (time.perf_counter() - start) * 1000
+        return body
+
     def respond(self, payload, status=200):
         self.status_code = status
-        return jsonify(payload), status
+        return self.serialize(payload), status
 
     def error(self, status, message, **extra):
         self.status_code = status
         payload = {"error": message}
         payload.update(extra)
-        return jsonify(payload), status
+        return self.serialize(payload), status
+
+    def respond_conditional(self, payload):
+        # Weak ETag over the uncompressed body; a matching If-None-Match gets
+        # an empty 304 instead of the full payload.
+        response = self.serialize(payload)
+        response.add_etag(weak=True)
+        response.make_conditional(request)
+        self.status_code = response.status_code
+        return response
+
+    def not_modified(self):
+        self.status_code = 304
+        return app.response_class(status=304)
+
+    def release_lock(self):
+        # Lets a route give up its lock group early, e.g. before waiting on IB
+        # callbacks that need no further serialization.
+        if not self.lock_acquired:
+            return
+        self.lock_acquired = False
+        self.lock_hold_ms = int((time.time() - self.lock_start) * 1000)
+        release_bridge_lock(self.group, self.lock_hold_ms)
+        if self.lock_hold_ms >= IB_LOCK_WARN_THRESHOLD_MS:
+            log_ctx(logging.WARNING, "%s long lock hold", self.name, holdMs=self.lock_hold_ms, group=self.group)
 
     def __exit__(self, exc_type, exc, tb):
-        if self.lock_acquired:
-            self.lock_hold_ms = int((time.time() - self.lock_start) * 1000)
-            release_bridge_lock(self.group, self.lock_hold_ms)
-            if self.lock_hold_ms >= IB_LOCK_WARN_THRESHOLD_MS:
-                log_ctx(logging.WARNING, f"{self.name} long lock hold", holdMs=self.lock_hold_ms, group=self.group)
+        self.release_lock()
 
         duration_ms = int((time.time() - self.start_time) * 1000) if self.start_time else None
         status = self.status_code
         if status is None:
             status = 500 if exc else 200
         if exc:
-            log_ctx(logging.ERROR, f"{self.name} exception", error=str(exc))
-        log_ctx(logging.INFO, f"{self.name} done", status=status, durationMs=duration_ms, lockWaitMs=self.lock_wait_ms, lockHoldMs=self.lock_hold_ms)
+            log_ctx(logging.ERROR, "%s exception", self.name, error=str(exc))
+        # Routine completions follow the request's sampling decision; errors and
+        # slow requests are always logged.
+        if log_sampled() or exc or status >= 400 or (duration_ms or 0) >= BRIDGE_SLOW_REQUEST_MS:
+            log_ctx(logging.INFO, "%s done", self.name, status=status, durationMs=duration_ms, lockWaitMs=self.lock_wait_ms, lockHoldMs=self.lock_hold_ms)
+        self.record_metrics(status, duration_ms)
+        self.record_trace(status, duration_ms)
+        adjust_in_flight(self.name, -1)
         clear_request_context()
         return False
 
+    def stage_timings(self, duration_ms):
+        return {
+            "ready": self.ready_ms,
+            "lockWait": self.lock_wait_ms,
+            "ibCall": round(getattr(request_context, "ib_ms", 0.0), 3) if self.ok else None,
+            "serialize": round(self.serialize_ms, 3) if self.ok else None,
+            "total": duration_ms,
+        }
+
+    def record_trace(self, status, duration_ms):
+        if not BRIDGE_TRACE_ENABLED:
+            return
+        spans = get_request_spans()
+        stages = self.stage_timings(duration_ms)
+        if BRIDGE_SERVER_TIMING or request.headers.get('X-Bridge-Timing') or request.args.get('timing'):
+            g.server_timing = format_server_timing(spans, stages)
+        if duration_ms is not None and duration_ms >= BRIDGE_SLOW_REQUEST_MS:
+            record_slow_request({
+                "requestId": self.request_id,
+                "route": self.name,
+                "group": self.group,
+                "path": request.path,
+                "args": dict(request.args),
+                "status": status,
+                "at": now_iso(),
+                "stages": stages,
+                "spans": spans,
+            })
+
+    def record_metrics(self, status, duration_ms):
+        if not BRIDGE_METRICS_ENABLED:
+            return
+        group = self.group or "none"
+        observe_latency(self.name, group, "ready", self.ready_ms)
+        observe_latency(self.name, group, "lock_wait", self.lock_wait_ms)
+        if self.ok:
+            observe_latency(self.name, group, "ib_call", getattr(request_context, "ib_ms", 0.0))
+            observe_latency(self.name, group, "serialize", self.serialize_ms)
+        observe_latency(self.name, group, "total", duration_ms)
+        inc_counter("bridge_requests_total", route=self.name, status=str(status))
+
 def get_loop_stats(loop):
     if not loop:
         return {"loop": "none"}
@@ -503,10 +1192,26 @@ def get_loop_stats(loop):
     return stats
 
 def submit_ib_call(fn, *args, invoke_timeout=None, **kwargs):
+    fn_name = getattr(fn, "__name__", "unknown")
+    start = time.perf_counter()
+    try:
+        with trace_span(f"submit.{fn_name}"):
+            future, err = _submit_ib_call(fn, *args, invoke_timeout=invoke_timeout, **kwargs)
+        label_future(future, fn_name)
+        return future, err
+    finally:
+        add_request_ib_time((time.perf_counter() - start) * 1000)
+
+def run_on_ib_loop(fn, *args, invoke_timeout=None, **kwargs):
+    # Runs a plain (non-async) ib_insync call on the loop thread and returns its result.
     loop = get_loop()
     if not loop:
-        log_ctx(logging.WARNING, "submit_ib_call: no-loop", fn=getattr(fn, "__name__", "unknown"))
+        log_ctx(logging.WARNING, "run_on_ib_loop: no-loop", fn=getattr(fn, "__name__", "unknown"))
         return None, "no-loop"
+    with trace_span(f"loop.{getattr(fn, '__name__', 'call')}"):
+        return _invoke_on_loop(loop, fn, args, kwargs, invoke_timeout)
+
+def _invoke_on_loop(loop, fn, args, kwargs, invoke_timeout):
     result_holder = {}
     done_event = threading.Event()
     def invoke():
@@ -524,7 +1229,16 @@ def submit_ib_call(fn, *args, invoke_timeout=None, **kwargs):
     if "error" in result_holder:
         log_ctx(logging.ERROR, "submit_ib_call: invoke-error", fn=getattr(fn, "__name__", "unknown"), error=str(result_holder["error"]))
         return None, str(result_holder["error"])
-    res = result_holder.get("result")
+    return result_holder.get("result"), None
+
+def _submit_ib_call(fn, *args, invoke_timeout=None, **kwargs):
+    loop = get_loop()
+    if not loop:
+        log_ctx(logging.WARNING, "submit_ib_call: no-loop", fn=getattr(fn, "__name__", "unknown"))
+        return None, "no-loop"
+    res, err = _invoke_on_loop(loop, fn, args, kwargs, invoke_timeout)
+    if err:
+        return None, err
     if asyncio.iscoroutine(res):
         return asyncio.run_coroutine_threadsafe(res, loop), None
     if hasattr(res, "done"):
@@ -560,13 +1274,216 @@ def ib_access(timeout=None, group="default"):
             hold_ms = int((time.time() - start) * 1000)
             release_bridge_lock(group, hold_ms)
 
+# --- Market Calendar ---
+# Mirrors packages/shared/src/utils/marketTime.ts: NYSE regular hours in
+# America/New_York, weekends and the holiday table closed.
+
+try:
+    MARKET_TZ = ZoneInfo('America/New_York')
+except ZoneInfoNotFoundError:
+    MARKET_TZ = timezone(timedelta(hours=-5))
+    logger.warning("tzdata for America/New_York missing; market calendar uses fixed UTC-5")
+PRE_MARKET_OPEN_TIME = dt_time(4, 0)
+MARKET_OPEN_TIME = dt_time(9, 30)
+MARKET_CLOSE_TIME = dt_time(16, 0)
+AFTER_HOURS_CLOSE_TIME = dt_time(20, 0)
+RTH_BOUNDARIES = (MARKET_OPEN_TIME, MARKET_CLOSE_TIME)
+EXTENDED_BOUNDARIES = (PRE_MARKET_OPEN_TIME, MARKET_OPEN_TIME, MARKET_CLOSE_TIME, AFTER_HOURS_CLOSE_TIME)
+
+NYSE_HOLIDAYS = {
+    # 2026
+    '2026-01-01', '2026-01-19', '2026-02-16', '2026-04-03', '2026-05-25',
+    '2026-06-19', '2026-07-03', '2026-09-07', '2026-11-26', '2026-12-25',
+    # 2027
+    '2027-01-01', '2027-01-18', '2027-02-15', '2027-03-26', '2027-05-31',
+    '2027-06-18', '2027-07-05', '2027-09-06', '2027-11-25', '2027-12-24',
+}
+
+def parse_market_holidays(raw):
+    """ISO dates from a comma-separated YYYY-MM-DD / YYYYMMDD list; anything else is logged and skipped."""
+    days = set()
+    for value in (v.strip() for v in raw.split(',') if v.strip()):
+        for fmt in ('%Y-%m-%d', '%Y%m%d'):
+            try:
+                days.add(datetime.strptime(value, fmt).date().isoformat())
+                break
+            except ValueError:
+                pass
+        else:
+            logger.warning("Ignoring BRIDGE_MARKET_HOLIDAYS entry %r: expected YYYY-MM-DD or YYYYMMDD", value)
+    return days
+
+NYSE_HOLIDAYS.update(parse_market_holidays(BRIDGE_MARKET_HOLIDAYS))
+NYSE_HOLIDAY_YEARS = {int(d[:4]) for d in NYSE_HOLIDAYS}
+holiday_years_warned = set()
+
+def market_now(now=None):
+    current = datetime.fromtimestamp(time.time() if now is None else now, MARKET_TZ)
+    if current.year not in NYSE_HOLIDAY_YEARS and current.year not in holiday_years_warned:
+        holiday_years_warned.add(current.year)
+        logger.warning("No NYSE holidays known for %s; holidays count as trading days until NYSE_HOLIDAYS "
+                       "or BRIDGE_MARKET_HOLIDAYS covers that year", current.year)
+    return current
+
+def is_market_day(day):
+    return day.weekday() < 5 and day.isoformat() not in NYSE_HOLIDAYS
+
+def market_time(day, at):
+    return datetime.combine(day, at, tzinfo=MARKET_TZ)
+
+def market_session(now=None):
+    """One of pre-market, rth, after-hours, closed (nights/weekends) or holiday."""
+    current = market_now(now)
+    day = current.date()
+    if day.isoformat() in NYSE_HOLIDAYS:
+        return 'holiday'
+    at = current.time()
+    if day.weekday() >= 5 or at < PRE_MARKET_OPEN_TIME or at >= AFTER_HOURS_CLOSE_TIME:
+        return 'closed'
+    if at < MARKET_OPEN_TIME:
+        return 'pre-market'
+    return 'rth' if at < MARKET_CLOSE_TIME else 'after-hours'
+
+def next_session_boundary(now=None, boundaries=RTH_BOUNDARIES):
+    """Epoch seconds of the next session boundary (regular open/close by default) after `now`."""
+    current = market_now(now)
+    day = current.date()
+    for _ in range(15):
+        if is_market_day(day):
+            for at in boundaries:
+                boundary = market_time(day, at)
+                if boundary > current:
+                    return boundary.timestamp()
+        day += timedelta(days=1)
+    return current.timestamp() + 86400
+
+def expired_through(now=None):
+    """Latest YYYYMMDD expiration that has stopped trading (expiry at the close)."""
+    current = market_now(now)
+    day = current.date() if current.time() >= MARKET_CLOSE_TIME else current.date() - timedelta(days=1)
+    return day.strftime('%Y%m%d')
+
+# Quotes, portfolio marks and intraday bars only move while something trades,
+# so outside RTH the short cache TTLs are raised to a per-session floor and
+# entries end at the next extended-hours boundary instead of straddling it.
+SESSION_TTL_FLOORS = {
+    'rth': 0.0,
+    'pre-market': BRIDGE_EXTENDED_HOURS_CACHE_TTL,
+    'after-hours': BRIDGE_EXTENDED_HOURS_CACHE_TTL,
+    'closed': BRIDGE_CLOSED_CACHE_TTL,
+    'holiday': BRIDGE_CLOSED_CACHE_TTL,
+}
+MARKET_DATA_TIERS = [("realtime", 1), ("frozen", 2), ("delayed", 3)]
+# Nothing is live while closed: ask for the frozen close first and fall back
+# to delayed-frozen (type 4) rather than cycling through live/delayed.
+CLOSED_MARKET_DATA_TIERS = [("frozen", 2), ("delayed", 4)]
+
+def session_ttl(ttl, now=None):
+    if not BRIDGE_SESSION_CACHE_POLICY:
+        return ttl
+    return max(ttl, SESSION_TTL_FLOORS[market_session(now)])
+
+def session_expires_at(now=None):
+    if not BRIDGE_SESSION_CACHE_POLICY:
+        return None
+    return next_session_boundary(now, EXTENDED_BOUNDARIES)
+
+def market_data_tiers(now=None):
+    if BRIDGE_SESSION_CACHE_POLICY and market_session(now) in ('closed', 'holiday'):
+        return CLOSED_MARKET_DATA_TIERS
+    return MARKET_DATA_TIERS
+
+# --- Response Encoding ---
+
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+def scrub_non_finite(obj):
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, RowRecord):
+        obj = obj.to_dict()
+    if isinstance(obj, dict):
+        return {k: scrub_non_finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [scrub_non_finite(v) for v in obj]
+    return obj
+
+class BridgeJSONProvider(DefaultJSONProvider):
+    # Both encoders write NaN/Infinity as null, so payloads stay valid JSON
+    # without a safe_value() on every field. Datetimes/dataclasses still go
+    # through Flask's default() so output matches the stdlib path.
+    sort_keys = False
+    compact = True
+
+    def __init__(self, app, use_orjson):
+        super().__init__(app)
+        self.use_orjson = use_orjson
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, RowRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+    def encode(self, obj):
+        if self.use_orjson:
+            try:
+                return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+            except TypeError:
+                pass  # e.g. ints beyond 64 bits; the stdlib path copes
+        try:
+            text = json.dumps(obj, default=self.default, allow_nan=False, separators=(',', ':'))
+        except ValueError:
+            text = json.dumps(scrub_non_finite(obj), default=self.default, separators=(',', ':'))
+        return text.encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj), mimetype=self.mimetype)
+
+def select_json_encoder():
+    if BRIDGE_JSON_ENCODER == 'stdlib':
+        return False
+    if orjson is None:
+        if BRIDGE_JSON_ENCODER == 'orjson':
+            logger.warning("BRIDGE_JSON_ENCODER=orjson but orjson is not installed; using stdlib json")
+        return False
+    return True
+
+app.json = BridgeJSONProvider(app, select_json_encoder())
+
+def negotiate_encoding(accept):
+    br = accept.quality('br') if brotli else 0
+    gz = accept.quality('gzip')
+    if br and br >= gz:
+        return 'br'
+    return 'gzip' if gz else None
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=4)
+    return gzip.compress(data, compresslevel=BRIDGE_GZIP_LEVEL)
+
 # --- Connection Management ---
 
+def create_ib():
+    if IB_BACKEND == 'sim':
+        # sim_ib.py lives next to the bridge in the repo; the image doesn't ship it.
+        from sim_ib import SimulatedIB
+        logger.warning("IB_BACKEND=sim: serving synthetic data from the simulated Gateway.")
+        return SimulatedIB.from_env()
+    return IB()
+
 def get_ib_instance():
     global ib
     with data_lock:
         if ib is None:
-            ib = IB()
+            ib = create_ib()
         return ib
 
 def get_loop():
@@ -584,6 +1501,14 @@ def wait_for_connection(timeout=None):
     return connection_ready.wait(timeout=timeout or IB_CONNECT_TIMEOUT)
 
 def wait_for_future(future, timeout, expected_epoch=None):
+    start = time.perf_counter()
+    try:
+        with trace_span(f"wait.{pop_future_label(future) or 'future'}"):
+            return _wait_for_future(future, timeout, expected_epoch)
+    finally:
+        add_request_ib_time((time.perf_counter() - start) * 1000)
+
+def _wait_for_future(future, timeout, expected_epoch=None):
     if asyncio.iscoroutine(future):
         try:
             return util.run(future, timeout=timeout), None
@@ -608,88 +1533,1268 @@ def wait_for_future(future, timeout, expected_epoch=None):
     if future.exception(): return None, str(future.exception())
     return future.result(), None
 
-# --- Listeners ---
+# --- Row Records ---
 
-def on_ib_error(req_id, error_code, error_message, contract):
-    update_diag(
-        lastIbErrorAt=now_iso(),
-        lastIbErrorCode=error_code,
-        lastIbErrorMessage=str(error_message)
-    )
-    if error_code in (2104, 2106, 2158):
-        logger.debug(f"IB Status {error_code}: {error_message}")
-    else:
-        logger.warning(f"IB Error {error_code}: {error_message}")
+class RowRecord:
+    """Fixed-field row for books, caches and the executions store.
 
-def on_disconnect():
-    logger.warning("IB Gateway disconnected.")
-    connection_ready.clear()
-    update_diag(lastDisconnectAt=now_iso())
+    Slots instead of a per-row dict; BridgeJSONProvider turns it into a dict
+    only when a response is encoded. Reads mirror a dict (row["key"],
+    row.get(...)) so book and route code handle both. Treat as immutable:
+    replace() returns an updated copy.
+    """
+    __slots__ = ()
 
-def on_exec_details(trade, fill):
-    if not EXECUTION_WEBHOOK_URL: return
-    try:
-        c = fill.contract
-        e = fill.execution
-        payload = {
-            "executions": [{
-                "execId": e.execId, "time": str(e.time), "symbol": c.symbol,
-                "secType": c.secType, "side": e.side, "shares": e.shares,
-                "price": e.price, "avgPrice": e.avgPrice, "orderRef": e.orderRef,
-                "cumQty": e.cumQty, "strike": getattr(c, 'strike', None),
-                "right": getattr(c, 'right', None), "expiration": getattr(c, 'lastTradeDateOrContractMonth', None),
-            }]
-        }
-        execution_webhook_queue.put(payload)
-    except Exception as e:
-        logger.error(f"Exec detail processing failed: {e}")
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._values = operator.attrgetter(*cls.__slots__)
+        # __slots__ is the single field list. The keyword constructor (every
+        # field defaulting to None) is the one dataclasses generates for it,
+        # as slots=True does on 3.10+; a setattr loop made builders ~3x slower.
+        spec = dataclasses.make_dataclass(cls.__name__, [(name, object, None) for name in cls.__slots__],
+                                          repr=False, eq=False)
+        cls.__init__ = spec.__init__
 
-# --- Background Tasks ---
+    @classmethod
+    def coerce(cls, row):
+        if isinstance(row, cls):
+            return row
+        return cls(**{k: v for k, v in row.items() if k in cls.__slots__})
 
-def loop_driver():
-    _ib = get_ib_instance()
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    # Capture the loop associated with this thread
-    set_loop(loop)
-    logger.info(f"IB loop driver started with loop {get_loop()}")
-    while True:
-        try:
-            if not loop.is_running():
-                _ib.run()
-            else:
-                time.sleep(0.5)
-        except Exception as e:
-            logger.error(f"Loop driver exception: {e}")
-            time.sleep(0.1)
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
 
-def connection_monitor():
-    _ib = get_ib_instance()
-    _ib.errorEvent += on_ib_error
-    _ib.disconnectedEvent += on_disconnect
-    _ib.execDetailsEvent += on_exec_details
-    logger.info(
-        "Bridge config: host=%s port=%s clientId=%s tradingMode=%s heartbeatInterval=%s heartbeatTimeout=%s heartbeatFailuresBeforeExit=%s",
-        IB_HOST, IB_PORT, IB_CLIENT_ID, IB_TRADING_MODE, IB_HEARTBEAT_INTERVAL, IB_HEARTBEAT_TIMEOUT, IB_HEARTBEAT_FAILURES_BEFORE_EXIT
-    )
-    
-    last_hb = time.time()
-    failures = 0
-    while True:
-        now = time.time()
-        if not loop_ready.wait(timeout=1.0):
-            time.sleep(0.5)
-            continue
-        if not _ib.isConnected():
-            connection_ready.clear()
-            if not connection_in_progress_lock.acquire(timeout=IB_CONNECT_TIMEOUT):
-                time.sleep(1.0)
-                continue
-            # Use fixed ClientID for stability
-            active_id = IB_CLIENT_ID
-            logger.info(f"Connecting to {IB_HOST}:{IB_PORT} (clientId={active_id})")
-            increment_diag("reconnectAttempts")
-            try:
+    def get(self, name, default=None):
+        return getattr(self, name) if name in self.__slots__ else default
+
+    def items(self):
+        return zip(self.__slots__, self._values(self))
+
+    def to_dict(self):
+        return dict(zip(self.__slots__, self._values(self)))
+
+    def replace(self, **fields):
+        row = dict(zip(self.__slots__, self._values(self)))
+        row.update(fields)
+        return type(self)(**row)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self._values(self) == other._values(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+CONTRACT_ROW_FIELDS = ("secType", "right", "strike", "expiration", "localSymbol", "conId", "multiplier")
+
+class PositionRow(RowRecord):
+    __slots__ = ("key", "account", "symbol", "quantity", "avgCost") + CONTRACT_ROW_FIELDS + ("companyName",)
+
+class PortfolioRow(RowRecord):
+    __slots__ = ("key", "account", "symbol", "quantity", "avgCost", "marketPrice", "marketValue",
+                 "realizedPnl", "unrealizedPnl") + CONTRACT_ROW_FIELDS
+
+class ExecutionRow(RowRecord):
+    __slots__ = ("execId", "symbol", "side", "shares", "price", "commission", "realizedPnl", "time",
+                 "orderRef") + CONTRACT_ROW_FIELDS
+
+class OrderRow(RowRecord):
+    __slots__ = ("key", "orderId", "permId", "status", "action", "orderType", "lmtPrice", "auxPrice",
+                 "totalQuantity", "remaining", "filled", "avgFillPrice", "tif", "account", "orderRef",
+                 "initMarginChange", "symbol") + CONTRACT_ROW_FIELDS + ("currency", "exchange")
+
+# --- Portfolio Books ---
+
+class VersionedBook:
+    """Rows keyed by account/conId, each stamped with the book version that last changed it.
+
+    Versions start at the process start time in ms, so a cursor from a previous
+    bridge process is always below `floor` and gets a full snapshot.
+    """
+
+    def __init__(self, max_tombstones=1000):
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.removed = collections.OrderedDict()
+        self.version = int(time.time() * 1000)
+        self.floor = self.version
+        self.max_tombstones = max_tombstones
+        self.ready = False
+        self.updated_at = None
+
+    def _bump(self):
+        self.version += 1
+        self.updated_at = now_iso()
+        return self.version
+
+    def _tombstone(self, key):
+        self.rows.pop(key, None)
+        self.removed.pop(key, None)
+        self.removed[key] = self._bump()
+        while len(self.removed) > self.max_tombstones:
+            _, version = self.removed.popitem(last=False)
+            self.floor = max(self.floor, version)
+
+    def upsert(self, key, row):
+        with self.lock:
+            current = self.rows.get(key)
+            if current and current[1] == row:
+                return False
+            self.removed.pop(key, None)
+            self.rows[key] = (self._bump(), row)
+            return True
+
+    def patch(self, key, **fields):
+        with self.lock:
+            current = self.rows.get(key)
+            if not current or all(current[1].get(k) == v for k, v in fields.items()):
+                return False
+            row = current[1].replace(**fields) if isinstance(current[1], RowRecord) else {**current[1], **fields}
+            self.rows[key] = (self._bump(), row)
+            return True
+
+    def remove(self, key):
+        with self.lock:
+            if key not in self.rows:
+                return False
+            self._tombstone(key)
+            return True
+
+    def replace_all(self, rows_by_key):
+        with self.lock:
+            changed = 0
+            for key in [k for k in self.rows if k not in rows_by_key]:
+                self._tombstone(key)
+                changed += 1
+            for key, row in rows_by_key.items():
+                current = self.rows.get(key)
+                if current and current[1] == row:
+                    continue
+                self.removed.pop(key, None)
+                self.rows[key] = (self._bump(), row)
+                changed += 1
+            self.ready = True
+            return changed
+
+    def snapshot(self):
+        with self.lock:
+            return self.version, [row for _, row in self.rows.values()]
+
+    def delta(self, since_version):
+        """Returns (version, changed_rows, removed_keys), or None when `since_version` is too old."""
+        with self.lock:
+            if since_version < self.floor or since_version > self.version:
+                return None
+            changed = [row for version, row in self.rows.values() if version > since_version]
+            removed = [key for key, version in self.removed.items() if version > since_version]
+            return self.version, changed, removed
+
+    def stats(self):
+        with self.lock:
+            return {"ready": self.ready, "version": self.version, "rows": len(self.rows), "tombstones": len(self.removed), "updatedAt": self.updated_at}
+
+positions_book = VersionedBook()
+portfolio_book = VersionedBook()
+
+def book_key(account, contract):
+    return f"{account}:{getattr(contract, 'conId', None) or contract_cache_key(contract)}"
+
+def build_position_row(p, company_name=None):
+    c = p.contract
+    return PositionRow(
+        key=book_key(p.account, c), account=p.account, symbol=c.symbol, quantity=p.position, avgCost=p.avgCost,
+        secType=c.secType, right=c.right, strike=c.strike, expiration=c.lastTradeDateOrContractMonth,
+        localSymbol=c.localSymbol, conId=c.conId, multiplier=c.multiplier, companyName=company_name)
+
+def build_portfolio_row(p):
+    c = p.contract
+    return PortfolioRow(
+        key=book_key(p.account, c), account=p.account, symbol=c.symbol, quantity=p.position, avgCost=p.averageCost,
+        marketPrice=p.marketPrice, marketValue=p.marketValue, realizedPnl=p.realizedPNL, unrealizedPnl=p.unrealizedPNL,
+        secType=c.secType, right=c.right, strike=c.strike, expiration=c.lastTradeDateOrContractMonth,
+        localSymbol=c.localSymbol, conId=c.conId, multiplier=c.multiplier)
+
+def needs_company_name(contract):
+    return getattr(contract, "secType", None) in ("STK", "ETF")
+
+def cached_company_name(contract):
+    key = contract_cache_key(contract)
+    if not key:
+        return None
+    with data_lock:
+        entry = contract_details_cache.get(key)
+    return entry["payload"] if entry else None
+
+def position_row_from_event(p):
+    key = book_key(p.account, p.contract)
+    with positions_book.lock:
+        current = positions_book.rows.get(key)
+    name = current[1].get("companyName") if current else None
+    if name is None and needs_company_name(p.contract):
+        name = cached_company_name(p.contract)
+        if name is None:
+            schedule_company_names([p.contract])
+    return key, build_position_row(p, company_name=name)
+
+# Company names are resolved off the request path: misses are queued here and
+# filled in batches, patching the positions book so delta clients see them.
+company_name_queue = queue.Queue()
+company_name_pending = set()
+company_name_lock = threading.Lock()
+
+def schedule_company_names(contracts):
+    for contract in contracts:
+        key = contract_cache_key(contract)
+        if not key:
+            continue
+        with company_name_lock:
+            if key in company_name_pending:
+                continue
+            company_name_pending.add(key)
+        company_name_queue.put(contract)
+
+def apply_company_names(names):
+    if not names:
+        return
+    _, rows = positions_book.snapshot()
+    for row in rows:
+        key = f"conid:{row['conId']}" if row.get("conId") else None
+        name = names.get(key) if key else None
+        if name and row.get("companyName") != name:
+            positions_book.patch(row["key"], companyName=name)
+
+def company_name_worker():
+    logger.info("Company name resolver started.")
+    while True:
+        batch = [company_name_queue.get()]
+        while len(batch) < 50:
+            try:
+                batch.append(company_name_queue.get(timeout=0.05))
+            except queue.Empty:
+                break
+        keys = [contract_cache_key(c) for c in batch]
+        try:
+            if wait_for_connection(IB_CONNECT_TIMEOUT):
+                names = fetch_company_names(batch, IB_CONTRACT_DETAILS_TIMEOUT, get_current_epoch())
+                apply_company_names(names)
+                if any(names.values()):
+                    save_contract_details_cache(BRIDGE_CONTRACT_DETAILS_CACHE_PATH)
+        except Exception as exc:
+            logger.error("Company name resolution failed: %s", exc)
+        finally:
+            with company_name_lock:
+                company_name_pending.difference_update(keys)
+
+def on_position(p):
+    try:
+        key, row = position_row_from_event(p)
+        if p.position == 0:
+            positions_book.remove(key)
+        else:
+            positions_book.upsert(key, row)
+        if row.get("conId"):
+            pnl_manager.set_held(p.account, row["conId"], p.position != 0)
+    except Exception as exc:
+        logger.error("Position event processing failed: %s", exc)
+
+def on_portfolio_update(item):
+    try:
+        row = build_portfolio_row(item)
+        if item.position == 0:
+            portfolio_book.remove(row["key"])
+        else:
+            portfolio_book.upsert(row["key"], row)
+    except Exception as exc:
+        logger.error("Portfolio event processing failed: %s", exc)
+
+def resync_portfolio_books():
+    # Reconciles both books with ib_insync's own state after (re)connect, so rows
+    # closed while disconnected are tombstoned rather than kept forever.
+    _ib = get_ib_instance()
+    try:
+        positions = {}
+        for p in _ib.positions():
+            if p.position:
+                key, row = position_row_from_event(p)
+                positions[key] = row
+        portfolio = {}
+        for item in _ib.portfolio():
+            if item.position:
+                row = build_portfolio_row(item)
+                portfolio[row["key"]] = row
+    except Exception as exc:
+        logger.error("Portfolio book resync failed: %s", exc)
+        return
+    changed = positions_book.replace_all(positions) + portfolio_book.replace_all(portfolio)
+    logger.info("Portfolio books resynced: positions=%s portfolio=%s changed=%s", len(positions), len(portfolio), changed)
+    resubscribed = pnl_manager.resubscribe()
+    pnl_manager.sync_held({(row["account"], row["conId"]) for row in positions.values() if row.get("conId")})
+    account = default_pnl_account()
+    # Before managedAccounts arrives there is no account; IB rejects reqPnL('').
+    if account:
+        pnl_manager.ensure(account, '', None)
+    logger.info("PnL streams resubscribed: %s", resubscribed)
+
+def parse_since_version(raw):
+    if raw in (None, ''):
+        return None
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+def respond_from_book(guard, book, rows_key, since_version):
+    if since_version is not None:
+        delta = book.delta(since_version)
+        if delta is not None:
+            version, changed, removed = delta
+            if not changed and not removed:
+                return guard.not_modified()
+            with book.lock:
+                count = len(book.rows)
+            return guard.respond({
+                rows_key: changed,
+                "removed": removed,
+                "count": count,
+                "version": version,
+                "sinceVersion": since_version,
+                "full": False
+            }, 200)
+    version, rows = book.snapshot()
+    return guard.respond({rows_key: rows, "count": len(rows), "version": version, "full": True}, 200)
+
+# --- PnL Subscriptions ---
+
+IB_UNSET_DOUBLE = 1.7976931348623157e308
+
+def pnl_number(val):
+    val = safe_value(val)
+    if val is None or abs(val) >= IB_UNSET_DOUBLE:
+        return None
+    return val
+
+class PnlSubscription:
+    __slots__ = ("account", "model", "con_id", "values", "updated_at", "last_used", "held", "first_update")
+
+    def __init__(self, account, model, con_id=None, held=False):
+        self.account = account
+        self.model = model
+        self.con_id = con_id
+        self.values = {}
+        self.updated_at = None
+        self.last_used = time.time()
+        self.held = held
+        self.first_update = threading.Event()
+
+    def payload(self):
+        row = {
+            "account": self.account,
+            "model": self.model,
+            "dailyPnL": self.values.get("dailyPnL"),
+            "unrealizedPnL": self.values.get("unrealizedPnL"),
+            "realizedPnL": self.values.get("realizedPnL"),
+            "value": self.values.get("value"),
+            "asOf": datetime.fromtimestamp(self.updated_at, timezone.utc).isoformat() if self.updated_at else None,
+        }
+        if self.con_id is not None:
+            row["conId"] = self.con_id
+            row["position"] = self.values.get("position")
+            row["marketValue"] = self.values.get("value")
+        return row
+
+class PnlManager:
+    """Long-lived reqPnL/reqPnLSingle streams fed by pnlEvent/pnlSingleEvent.
+
+    Held positions stay subscribed for as long as they are held; conIds only
+    requested over HTTP are cancelled once idle for BRIDGE_PNL_IDLE_TTL.
+    """
+
+    def __init__(self, max_single, idle_ttl):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.max_single = max_single
+        self.idle_ttl = idle_ttl
+
+    def ensure(self, account, model='', con_id=None, held=False):
+        key = (account, model, con_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry.last_used = time.time()
+                entry.held = entry.held or held
+                return entry
+            entry = PnlSubscription(account, model, con_id, held=held)
+            self.entries[key] = entry
+            evicted = self._evict_locked(key) if con_id is not None else []
+        self._schedule(self._subscribe, key)
+        for old in evicted:
+            self._schedule(self._cancel, old)
+        return entry
+
+    def _evict_locked(self, keep):
+        now = time.time()
+        singles = [(k, e) for k, e in self.entries.items() if k[2] is not None and not e.held and k != keep]
+        evicted = [k for k, e in singles if now - e.last_used > self.idle_ttl]
+        total = sum(1 for k in self.entries if k[2] is not None)
+        overflow = total - len(evicted) - self.max_single
+        if overflow > 0:
+            remaining = sorted((e.last_used, k) for k, e in singles if k not in evicted)
+            evicted.extend(k for _, k in remaining[:overflow])
+        for key in evicted:
+            self.entries.pop(key, None)
+        return evicted
+
+    def _schedule(self, fn, key):
+        loop = get_loop()
+        if not loop:
+            return
+        loop.call_soon_threadsafe(fn, key)
+
+    def _subscribe(self, key):
+        account, model, con_id = key
+        _ib = get_ib_instance()
+        try:
+            if con_id is None:
+                _ib.reqPnL(account, model)
+            else:
+                _ib.reqPnLSingle(account, model, con_id)
+        except Exception as exc:
+            # ib_insync refuses duplicate subscriptions; the live one keeps feeding us.
+            logger.debug("PnL subscribe %s skipped: %s", key, exc)
+
+    def _cancel(self, key):
+        account, model, con_id = key
+        _ib = get_ib_instance()
+        try:
+            if con_id is None:
+                _ib.cancelPnL(account, model)
+            else:
+                _ib.cancelPnLSingle(account, model, con_id)
+        except Exception as exc:
+            logger.debug("PnL cancel %s failed: %s", key, exc)
+
+    def _update(self, key, values):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or all(v is None for v in values.values()):
+                return
+            entry.values = values
+            entry.updated_at = time.time()
+        entry.first_update.set()
+
+    def on_pnl(self, pnl):
+        self._update((pnl.account, pnl.modelCode or '', None), {
+            "dailyPnL": pnl_number(pnl.dailyPnL),
+            "unrealizedPnL": pnl_number(pnl.unrealizedPnL),
+            "realizedPnL": pnl_number(pnl.realizedPnL),
+        })
+
+    def on_pnl_single(self, pnl):
+        self._update((pnl.account, pnl.modelCode or '', pnl.conId), {
+            "dailyPnL": pnl_number(pnl.dailyPnL),
+            "unrealizedPnL": pnl_number(pnl.unrealizedPnL),
+            "realizedPnL": pnl_number(pnl.realizedPnL),
+            "position": pnl_number(getattr(pnl, "position", None)),
+            "value": pnl_number(getattr(pnl, "value", None)),
+        })
+
+    def set_held(self, account, con_id, held):
+        if held:
+            self.ensure(account, '', None, held=True)
+            self.ensure(account, '', con_id, held=True)
+            return
+        with self.lock:
+            entry = self.entries.get((account, '', con_id))
+            if entry is None or not entry.held:
+                return
+            entry.held = False
+            entry.last_used = time.time()
+
+    def sync_held(self, held):
+        # held: {(account, conId)} from the freshly resynced positions book.
+        accounts = {account for account, _ in held}
+        with self.lock:
+            for key, entry in self.entries.items():
+                if key[2] is not None:
+                    entry.held = (key[0], key[2]) in held
+                else:
+                    entry.held = entry.held or key[0] in accounts
+        for account, con_id in held:
+            self.set_held(account, con_id, True)
+
+    def resubscribe(self):
+        # IB drops every stream on disconnect; values are kept but marked stale
+        # until the fresh stream reports.
+        with self.lock:
+            keys = list(self.entries)
+            for entry in self.entries.values():
+                entry.first_update.clear()
+        for key in keys:
+            self._schedule(self._subscribe, key)
+        return len(keys)
+
+    def wait(self, entries, timeout):
+        deadline = time.time() + timeout
+        for entry in entries:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not entry.first_update.wait(remaining):
+                return False
+        return True
+
+    def held_con_ids(self, account, model=''):
+        with self.lock:
+            return sorted(k[2] for k, e in self.entries.items() if k[0] == account and k[1] == model and k[2] is not None and e.held)
+
+    def stats(self):
+        with self.lock:
+            singles = [e for k, e in self.entries.items() if k[2] is not None]
+            return {
+                "accounts": len(self.entries) - len(singles),
+                "singles": len(singles),
+                "held": sum(1 for e in singles if e.held),
+                "live": sum(1 for e in self.entries.values() if e.first_update.is_set()),
+                "maxSingles": self.max_single,
+            }
+
+pnl_manager = PnlManager(BRIDGE_PNL_MAX_SUBSCRIPTIONS, BRIDGE_PNL_IDLE_TTL)
+
+def default_pnl_account():
+    try:
+        accounts = get_ib_instance().managedAccounts()
+    except Exception:
+        accounts = []
+    return accounts[0] if accounts else ''
+
+def on_pnl(pnl):
+    try:
+        pnl_manager.on_pnl(pnl)
+    except Exception as exc:
+        logger.error("PnL event processing failed: %s", exc)
+
+def on_pnl_single(pnl):
+    try:
+        pnl_manager.on_pnl_single(pnl)
+    except Exception as exc:
+        logger.error("PnL single event processing failed: %s", exc)
+
+# --- Account Summary Stream ---
+
+ACCOUNT_SUMMARY_TAGS = (
+    'NetLiquidation',
+    'TotalCashValue',
+    'BuyingPower',
+    'AvailableFunds',
+    'ExcessLiquidity',
+    'DailyPnL',
+    'RealizedPnL',
+    'UnrealizedPnL',
+    'AccountCode'
+)
+ACCOUNT_SUMMARY_BASE_CURRENCY_TAGS = ('NetLiquidation', 'DailyPnL', 'RealizedPnL', 'UnrealizedPnL')
+
+# Fed by accountSummaryEvent from the subscription opened on every ready
+# transition; (account, tag, currency) -> value.
+account_summary_lock = threading.Lock()
+account_summary_values = {}
+account_summary_state = {"updatedAt": None, "epoch": None}
+account_summary_ready = threading.Event()
+
+def on_account_summary(value):
+    if value.tag not in ACCOUNT_SUMMARY_TAGS:
+        return
+    with account_summary_lock:
+        account_summary_values[(value.account, value.tag, value.currency)] = value.value
+        account_summary_state["updatedAt"] = time.time()
+    account_summary_ready.set()
+
+def start_account_summary_stream():
+    # IB allows only two concurrent summary subscriptions, so open one per
+    # connection; on_disconnect clears the marker.
+    _ib = get_ib_instance()
+    with account_summary_lock:
+        if account_summary_state["epoch"] is not None:
+            return None
+        account_summary_state["epoch"] = get_current_epoch()
+    start = time.time()
+    f, err = submit_ib_call(_ib.reqAccountSummaryAsync, invoke_timeout=IB_ACCOUNT_SUMMARY_TIMEOUT)
+    if err:
+        with account_summary_lock:
+            account_summary_state["epoch"] = None
+        update_diag(lastAccountSummaryAt=now_iso(), lastAccountSummaryError=str(err))
+        logger.warning("Account summary subscription failed: %s", err)
+        return None
+    def on_done(fut):
+        duration_ms = int((time.time() - start) * 1000)
+        exc = fut.exception() if not fut.cancelled() else "cancelled"
+        if exc:
+            with account_summary_lock:
+                account_summary_state["epoch"] = None
+            update_diag(lastAccountSummaryAt=now_iso(), lastAccountSummaryMs=duration_ms, lastAccountSummaryError=str(exc))
+            logger.warning("Account summary subscription failed: %s", exc)
+            return
+        with account_summary_lock:
+            count = len(account_summary_values)
+        update_diag(lastAccountSummaryAt=now_iso(), lastAccountSummaryMs=duration_ms, lastAccountSummaryCount=count, lastAccountSummaryError=None)
+    f.add_done_callback(on_done)
+    return f
+
+def reset_account_summary_stream():
+    with account_summary_lock:
+        account_summary_state["epoch"] = None
+    account_summary_ready.clear()
+
+def build_account_summary_payload(account=None):
+    with account_summary_lock:
+        rows = list(account_summary_values.items())
+        updated_at = account_summary_state["updatedAt"]
+    payload = {}
+    for (acct, tag, currency), value in rows:
+        if account and acct != account:
+            continue
+        # AccountCode is a string, handle separately
+        if tag == 'AccountCode':
+            payload[tag] = str(value)
+            continue
+        currency = (currency or '').strip().upper()
+        is_usd = currency == 'USD'
+        is_base = currency in ('', 'BASE')
+        if not (is_usd or (is_base and tag in ACCOUNT_SUMMARY_BASE_CURRENCY_TAGS)):
+            continue
+        payload[tag] = safe_number(value)
+    if not payload:
+        return None
+    payload["asOf"] = datetime.fromtimestamp(updated_at, timezone.utc).isoformat() if updated_at else None
+    return payload
+
+def account_summary_stats():
+    with account_summary_lock:
+        updated_at = account_summary_state["updatedAt"]
+        return {
+            "values": len(account_summary_values),
+            "subscribedEpoch": account_summary_state["epoch"],
+            "ageSeconds": round(time.time() - updated_at, 3) if updated_at else None,
+        }
+
+# --- Executions Store ---
+
+def execution_timestamp(value):
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    parsed = parse_time_arg(str(value)) if value not in (None, '') else None
+    return parsed or 0.0
+
+def build_execution_row(contract, execution, report=None):
+    # Fills arrive with an empty CommissionReport; the real one follows in
+    # commissionReportEvent and is matched by execId.
+    commission = None
+    if report is not None and getattr(report, "execId", None):
+        commission = safe_number(report.commission)
+    return ExecutionRow(
+        execId=execution.execId, symbol=contract.symbol, side=execution.side, shares=execution.shares,
+        price=execution.price, commission=commission, time=str(execution.time), orderRef=execution.orderRef,
+        secType=contract.secType, right=contract.right, strike=contract.strike,
+        expiration=contract.lastTradeDateOrContractMonth, localSymbol=contract.localSymbol,
+        conId=contract.conId, multiplier=contract.multiplier)
+
+class ExecutionStore:
+    """Fills merged by execId and indexed by execution time.
+
+    Every insert or update takes a new sequence number, and the latest one is
+    the cursor handed back to callers: a sinceCursor poll returns rows changed
+    after it, so late commission reports are re-sent exactly once. Sequences
+    start at the process start time in ms (as VersionedBook versions do), so a
+    cursor from a previous process falls below `floor` and resets. The older
+    sinceExecId cursor returns rows changed after that fill was first stored.
+    """
+
+    def __init__(self, retention_days):
+        self.lock = threading.Lock()
+        self.entries = {}   # execId -> [added_seq, seq, ts, ExecutionRow]
+        self.by_time = []   # sorted (ts, execId)
+        self.seq = int(time.time() * 1000)
+        self.floor = self.seq
+        self.latest_exec_id = None
+        self.covered_since = None
+        self.retention = retention_days * 86400
+
+    def merge(self, rows):
+        changed = 0
+        with self.lock:
+            for row in rows:
+                exec_id = row.get("execId")
+                if not exec_id:
+                    continue
+                entry = self.entries.get(exec_id)
+                if entry is not None:
+                    merged = entry[3].replace(**{k: v for k, v in row.items() if v is not None and k in ExecutionRow.__slots__})
+                    if merged == entry[3]:
+                        continue
+                    self.seq += 1
+                    entry[1] = self.seq
+                    entry[3] = merged
+                else:
+                    self.seq += 1
+                    ts = execution_timestamp(row.get("time"))
+                    self.entries[exec_id] = [self.seq, self.seq, ts, ExecutionRow.coerce(row)]
+                    bisect.insort(self.by_time, (ts, exec_id))
+                    self.latest_exec_id = exec_id
+                changed += 1
+        return changed
+
+    def set_commission(self, exec_id, commission, realized_pnl=None):
+        with self.lock:
+            if exec_id not in self.entries:
+                return False
+        return bool(self.merge([{"execId": exec_id, "commission": commission, "realizedPnl": realized_pnl}]))
+
+    def mark_covered(self, since_ts):
+        with self.lock:
+            if self.covered_since is None or since_ts < self.covered_since:
+                self.covered_since = since_ts
+
+    def covers(self, since_ts):
+        with self.lock:
+            return self.covered_since is not None and self.covered_since <= since_ts
+
+    def prune(self, now=None):
+        cutoff = (now or time.time()) - self.retention
+        with self.lock:
+            idx = bisect.bisect_left(self.by_time, (cutoff, ''))
+            for _, exec_id in self.by_time[:idx]:
+                self.entries.pop(exec_id, None)
+            del self.by_time[:idx]
+            if self.covered_since is not None:
+                self.covered_since = max(self.covered_since, cutoff)
+            return idx
+
+    def query(self, start_ts=None, since_exec_id=None, since_seq=None):
+        with self.lock:
+            idx = bisect.bisect_left(self.by_time, (start_ts, '')) if start_ts else 0
+            keys = [exec_id for _, exec_id in self.by_time[idx:]]
+            after = None
+            if since_seq is not None:
+                cursor_found = self.floor <= since_seq <= self.seq
+                after = since_seq if cursor_found else None
+            else:
+                cursor_found = since_exec_id is None or since_exec_id in self.entries
+                after = self.entries[since_exec_id][0] if since_exec_id is not None and cursor_found else None
+            if after is not None:
+                keys = [k for k in keys if self.entries[k][1] > after]
+            rows = [self.entries[k][3] for k in keys]
+            return rows, self.seq, cursor_found
+
+    def size(self):
+        with self.lock:
+            return len(self.entries)
+
+    def dump(self):
+        with self.lock:
+            ordered = sorted(self.entries.values(), key=lambda entry: entry[0])
+            return {"coveredSince": self.covered_since, "rows": [entry[3].to_dict() for entry in ordered]}
+
+    def restore(self, data):
+        self.merge(data.get("rows") or [])
+        if data.get("coveredSince") is not None:
+            self.mark_covered(data["coveredSince"])
+        return self.prune()
+
+execution_store = ExecutionStore(BRIDGE_EXECUTIONS_RETENTION_DAYS)
+execution_store_dirty = threading.Event()
+execution_backfill_lock = threading.Lock()
+execution_backfill = {"future": None, "since": None}
+
+def load_execution_store(path):
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            data = json.load(fh)
+    except (OSError, ValueError) as exc:
+        logger.warning("Executions store load failed: %s", exc)
+        return 0
+    execution_store.restore(data)
+    return execution_store.size()
+
+def save_execution_store(path):
+    if not path:
+        return
+    data = execution_store.dump()
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(data, fh, default=str)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        logger.warning("Executions store save failed: %s", exc)
+
+def execution_store_writer():
+    # Coalesces fill/commission bursts into one write; keeps file IO off the IB loop.
+    while True:
+        execution_store_dirty.wait()
+        time.sleep(1.0)
+        execution_store_dirty.clear()
+        execution_store.prune()
+        save_execution_store(BRIDGE_EXECUTIONS_STORE_PATH)
+
+def backfill_execution_store(since_ts):
+    # One reqExecutions in flight at a time; a request for an older window
+    # than the pending one starts its own.
+    with execution_backfill_lock:
+        pending = execution_backfill["future"]
+        if pending is not None and not pending.done() and execution_backfill["since"] <= since_ts:
+            return pending, None
+        _ib = get_ib_instance()
+        filt = ExecutionFilter(time=datetime.fromtimestamp(since_ts, timezone.utc).strftime('%Y%m%d %H:%M:%S UTC'))
+        f, err = submit_ib_call(_ib.reqExecutionsAsync, filt, invoke_timeout=IB_EXECUTIONS_TIMEOUT)
+        if err:
+            return None, err
+        execution_backfill["future"] = f
+        execution_backfill["since"] = since_ts
+    def on_done(fut):
+        if fut.cancelled() or fut.exception():
+            logger.warning("Executions backfill failed: %s", "cancelled" if fut.cancelled() else fut.exception())
+            return
+        merge_execution_fills(fut.result(), since_ts)
+    f.add_done_callback(on_done)
+    return f, None
+
+def merge_execution_fills(fills, since_ts):
+    # Idempotent, so a waiting request may merge before the done callback runs.
+    fills = fills or []
+    changed = execution_store.merge([build_execution_row(f.contract, f.execution, getattr(f, "commissionReport", None)) for f in fills])
+    execution_store.mark_covered(since_ts)
+    if changed:
+        execution_store_dirty.set()
+        logger.info("Executions backfill merged %s of %s fills", changed, len(fills))
+    return changed
+
+def on_commission_report(trade, fill, report):
+    try:
+        if execution_store.set_commission(report.execId, safe_number(report.commission), pnl_number(getattr(report, "realizedPNL", None))):
+            execution_store_dirty.set()
+    except Exception as exc:
+        logger.error("Commission report processing failed: %s", exc)
+
+# --- Order Book ---
+
+ORDER_DONE_STATES = ('Filled', 'Cancelled', 'ApiCancelled')
+
+orders_book = VersionedBook()
+# Trades behind the open-orders book, indexed by orderId and permId for
+# O(1) cancel.
+order_index_lock = threading.Lock()
+order_trades = {}
+order_ids = {}
+order_perm_ids = {}
+
+def order_book_key(order):
+    perm_id = getattr(order, "permId", None)
+    if perm_id:
+        return f"perm:{perm_id}"
+    return f"ord:{getattr(order, 'clientId', 0)}:{getattr(order, 'orderId', None)}"
+
+def build_order_row(trade):
+    order = trade.order
+    status = trade.orderStatus
+    contract = trade.contract
+    order_state = getattr(trade, "orderState", None)
+    # NaN fields are normalized here rather than left to the encoder: the
+    # book compares rows for equality, and NaN != NaN would re-version them.
+    return OrderRow(
+        key=order_book_key(order), orderId=order.orderId, permId=order.permId, status=status.status,
+        action=order.action, orderType=order.orderType, lmtPrice=safe_value(order.lmtPrice),
+        auxPrice=safe_value(order.auxPrice), totalQuantity=safe_value(order.totalQuantity),
+        remaining=safe_value(status.remaining), filled=safe_value(status.filled),
+        avgFillPrice=safe_value(status.avgFillPrice), tif=order.tif,
+        account=getattr(status, "account", None) or order.account, orderRef=order.orderRef,
+        initMarginChange=safe_number(getattr(order_state, "initMarginChange", None)),
+        symbol=contract.symbol, secType=contract.secType, right=contract.right, strike=safe_value(contract.strike),
+        expiration=contract.lastTradeDateOrContractMonth, localSymbol=contract.localSymbol, conId=contract.conId,
+        multiplier=safe_value(contract.multiplier), currency=contract.currency, exchange=contract.exchange)
+
+def index_order_trade(trade):
+    # Returns the previous book key when the order was re-keyed (permId
+    # assigned after submission).
+    order = trade.order
+    key = order_book_key(order)
+    order_id = getattr(order, "orderId", None)
+    perm_id = getattr(order, "permId", None)
+    with order_index_lock:
+        previous = order_ids.get(order_id) if order_id else None
+        order_trades[key] = trade
+        if order_id:
+            order_ids[order_id] = key
+        if perm_id:
+            order_perm_ids[perm_id] = key
+        if previous and previous != key:
+            order_trades.pop(previous, None)
+            return previous
+    return None
+
+def unindex_order_trade(trade):
+    order = trade.order
+    key = order_book_key(order)
+    with order_index_lock:
+        order_trades.pop(key, None)
+        order_id = getattr(order, "orderId", None)
+        perm_id = getattr(order, "permId", None)
+        if order_id and order_ids.get(order_id) == key:
+            del order_ids[order_id]
+        if perm_id and order_perm_ids.get(perm_id) == key:
+            del order_perm_ids[perm_id]
+    return key
+
+def find_order_trade(order_id=None, perm_id=None):
+    with order_index_lock:
+        key = None
+        if order_id is not None:
+            key = order_ids.get(order_id)
+        if key is None and perm_id is not None:
+            key = order_perm_ids.get(perm_id)
+        return order_trades.get(key) if key else None
+
+# Order status fan-out: waiters in /order block on the condition, /orders/stream
+# clients each own a bounded queue.
+order_status_cond = threading.Condition()
+order_stream_lock = threading.Lock()
+order_stream_queues = set()
+
+def subscribe_order_stream(maxsize=1000):
+    q = queue.Queue(maxsize=maxsize)
+    with order_stream_lock:
+        order_stream_queues.add(q)
+    return q
+
+def unsubscribe_order_stream(q):
+    with order_stream_lock:
+        order_stream_queues.discard(q)
+
+def publish_order_status(trade):
+    with order_status_cond:
+        order_status_cond.notify_all()
+    with order_stream_lock:
+        queues = list(order_stream_queues)
+    if not queues:
+        return
+    row = build_order_row(trade).to_dict()
+    log = getattr(trade, "log", None) or []
+    row["message"] = getattr(log[-1], "message", None) if log else None
+    for q in queues:
+        try:
+            q.put_nowait(row)
+        except queue.Full:
+            inc_counter("bridge_order_stream_dropped_total")
+
+def wait_for_order_status(trade, states, timeout):
+    deadline = time.time() + timeout
+    with order_status_cond:
+        while getattr(trade.orderStatus, "status", None) not in states:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            order_status_cond.wait(remaining)
+    return True
+
+def on_order_event(trade):
+    try:
+        if getattr(trade.orderStatus, "status", None) in ORDER_DONE_STATES:
+            orders_book.remove(unindex_order_trade(trade))
+        else:
+            previous = index_order_trade(trade)
+            if previous:
+                orders_book.remove(previous)
+            row = build_order_row(trade)
+            orders_book.upsert(row["key"], row)
+        publish_order_status(trade)
+    except Exception as exc:
+        logger.error("Order event processing failed: %s", exc)
+
+def resync_order_book():
+    _ib = get_ib_instance()
+    try:
+        trades = [t for t in _ib.openTrades() if getattr(t.orderStatus, "status", None) not in ORDER_DONE_STATES]
+    except Exception as exc:
+        logger.error("Order book resync failed: %s", exc)
+        return
+    with order_index_lock:
+        order_trades.clear()
+        order_ids.clear()
+        order_perm_ids.clear()
+    rows = {}
+    for trade in trades:
+        index_order_trade(trade)
+        row = build_order_row(trade)
+        rows[row["key"]] = row
+    changed = orders_book.replace_all(rows)
+    logger.info("Order book resynced: open=%s changed=%s", len(rows), changed)
+
+# --- Order Entry ---
+
+def build_order_contract(d):
+    if d.get('secType') == 'OPT':
+        return Option(d['symbol'], d['expiration'], float(d['strike']), d['right'], 'SMART')
+    return Stock(d['symbol'], 'SMART', 'USD')
+
+def build_order(d, uid=None):
+    if d.get('orderType', 'LMT') == 'LMT':
+        order = LimitOrder(d['action'], float(d['quantity']), float(d['limitPrice']))
+    else:
+        order = MarketOrder(d['action'], float(d['quantity']))
+    order.orderRef = d.get('uid') or uid or 'anon'
+    return order
+
+def leg_ratio(leg):
+    ratio = leg.get('ratio', 1)
+    try:
+        value = int(ratio)
+        valid = not isinstance(ratio, bool) and value >= 1 and value == float(ratio)
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError(f"invalid leg ratio: {ratio!r}")
+    return value
+
+def build_combo_contract(legs):
+    # Legs must already be qualified (conId set).
+    symbols = {leg_contract.symbol for leg_contract, _ in legs}
+    if len(symbols) != 1:
+        raise ValueError("combo legs must share one underlying")
+    combo = Contract(secType='BAG', symbol=symbols.pop(), exchange='SMART', currency='USD')
+    combo.comboLegs = [
+        ComboLeg(conId=leg_contract.conId, ratio=leg_ratio(leg), action=leg['action'], exchange='SMART')
+        for leg_contract, leg in legs
+    ]
+    return combo
+
+def qualify_order_contracts(contracts, timeout):
+    # One qualifyContracts round trip for every leg; unresolved legs keep conId 0.
+    _ib = get_ib_instance()
+    f, err = submit_ib_call(_ib.qualifyContractsAsync, *contracts, invoke_timeout=timeout)
+    if err:
+        return f"qualify-submit-failed: {err}"
+    _, err = wait_for_future(f, timeout)
+    if err:
+        return f"qualify-failed: {err}"
+    return None
+
+def place_orders(pairs, timeout):
+    # All placeOrder calls run in one turn of the IB loop.
+    _ib = get_ib_instance()
+    def place_all():
+        placed = []
+        for contract, order in pairs:
+            try:
+                placed.append((_ib.placeOrder(contract, order), None))
+            except Exception as exc:
+                placed.append((None, str(exc)))
+        return placed
+    return run_on_ib_loop(place_all, invoke_timeout=timeout)
+
+def cancel_trades(trades, timeout):
+    _ib = get_ib_instance()
+    def cancel_all():
+        results = []
+        for trade in trades:
+            try:
+                _ib.cancelOrder(trade.order)
+                results.append(None)
+            except Exception as exc:
+                results.append(str(exc))
+        return results
+    return run_on_ib_loop(cancel_all, invoke_timeout=timeout)
+
+def order_result(trade, index=None, error=None, **extra):
+    row = {"index": index} if index is not None else {}
+    if trade is not None:
+        row.update({
+            "orderId": getattr(trade.order, "orderId", None),
+            "permId": getattr(trade.order, "permId", None),
+            "status": getattr(trade.orderStatus, "status", None),
+            "symbol": getattr(trade.contract, "symbol", None),
+            "localSymbol": getattr(trade.contract, "localSymbol", None),
+        })
+    if error:
+        row["error"] = error
+    row.update(extra)
+    return row
+
+# Statuses a placement wait returns on: accepted (working or held), filled, or
+# rejected/cancelled by IB.
+ORDER_ACK_STATES = ('PreSubmitted', 'Submitted', 'Filled', 'Cancelled', 'ApiCancelled', 'Inactive')
+
+def order_placement_result(trade, waited_ms=None, timed_out=False):
+    status = trade.orderStatus
+    log = getattr(trade, "log", None) or []
+    last = log[-1] if log else None
+    return {
+        "orderId": trade.order.orderId,
+        "permId": getattr(trade.order, "permId", None),
+        "status": status.status,
+        "filled": safe_value(getattr(status, "filled", None)),
+        "remaining": safe_value(getattr(status, "remaining", None)),
+        "avgFillPrice": safe_value(getattr(status, "avgFillPrice", None)),
+        "conId": getattr(trade.contract, "conId", None),
+        "localSymbol": getattr(trade.contract, "localSymbol", None),
+        "message": getattr(last, "message", None) if last else None,
+        "errorCode": getattr(last, "errorCode", None) if last else None,
+        "waitedMs": waited_ms,
+        "timedOut": timed_out,
+    }
+
+def open_trades_for_symbol(symbol):
+    symbol = symbol.upper()
+    with order_index_lock:
+        return [t for t in order_trades.values() if (getattr(t.contract, "symbol", "") or "").upper() == symbol]
+
+# --- Listeners ---
+
+def on_ib_error(req_id, error_code, error_message, contract):
+    update_diag(
+        lastIbErrorAt=now_iso(),
+        lastIbErrorCode=error_code,
+        lastIbErrorMessage=str(error_message)
+    )
+    inc_counter("bridge_ib_errors_total", code=str(error_code))
+    if error_code in (2104, 2106, 2158):
+        logger.debug("IB Status %s: %s", error_code, error_message, extra={"ib_error_code": error_code})
+    else:
+        logger.warning("IB Error %s: %s", error_code, error_message, extra={"ib_error_code": error_code})
+
+def on_disconnect():
+    global disconnected_at
+    logger.warning("IB Gateway disconnected.")
+    connection_ready.clear()
+    reset_account_summary_stream()
+    suspend_market_data_streams()
+    if disconnected_at is None:
+        disconnected_at = time.time()
+    update_diag(lastDisconnectAt=now_iso())
+    reconnect_wakeup.set()
+
+def on_exec_details(trade, fill):
+    try:
+        if execution_store.merge([build_execution_row(fill.contract, fill.execution, getattr(fill, "commissionReport", None))]):
+            execution_store_dirty.set()
+    except Exception as exc:
+        logger.error("Execution store merge failed: %s", exc)
+    if not EXECUTION_WEBHOOK_URL: return
+    try:
+        c = fill.contract
+        e = fill.execution
+        execution_webhook_queue.put({
+            "execId": e.execId, "time": str(e.time), "symbol": c.symbol,
+            "secType": c.secType, "side": e.side, "shares": e.shares,
+            "price": e.price, "avgPrice": e.avgPrice, "orderRef": e.orderRef,
+            "cumQty": e.cumQty, "strike": getattr(c, 'strike', None),
+            "right": getattr(c, 'right', None), "expiration": getattr(c, 'lastTradeDateOrContractMonth', None),
+        })
+    except Exception as e:
+        logger.error(f"Exec detail processing failed: {e}")
+
+# --- Background Tasks ---
+
+def loop_driver():
+    _ib = get_ib_instance()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    # Capture the loop associated with this thread
+    set_loop(loop)
+    logger.info(f"IB loop driver started with loop {get_loop()}")
+    while True:
+        try:
+            if not loop.is_running():
+                _ib.run()
+            else:
+                time.sleep(0.5)
+        except Exception as e:
+            logger.error(f"Loop driver exception: {e}")
+            time.sleep(0.1)
+
+def wait_for_ib_sync(_ib, timeout):
+    # connectAsync only returns once positions, orders, account updates and
+    # executions are in; this just confirms the socket survived that.
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if _ib.isConnected() and _ib.client.isReady() and _ib.managedAccounts():
+            return True
+        time.sleep(0.05)
+    return False
+
+def mark_connection_ready():
+    """Re-point everything at the new session while keeping caches warm."""
+    global disconnected_at
+    epoch = bump_epoch()
+    resync_portfolio_books()
+    resync_order_book()
+    start_account_summary_stream()
+    backfill_execution_store(time.time() - BRIDGE_EXECUTIONS_BACKFILL_DAYS * 86400)
+    connection_ready.set()
+    opened, err = resume_market_data_streams()
+    if err:
+        logger.warning("Market data streams not restored: %s", err)
+    if disconnected_at is not None:
+        recovery_ms = int((time.time() - disconnected_at) * 1000)
+        disconnected_at = None
+        update_diag(lastRecoveryMs=recovery_ms)
+        logger.info("Recovered in %sms: epoch=%s streams=%s", recovery_ms, epoch, opened)
+
+def reconnect_delay(attempt):
+    if attempt <= 0:
+        return 0.0
+    return min(IB_RECONNECT_INTERVAL, IB_RECONNECT_MIN_INTERVAL * (2 ** (attempt - 1)))
+
+def request_disconnect(_ib):
+    """Drop a wedged session so the monitor reconnects it in-process."""
+    global disconnected_at
+    connection_ready.clear()
+    if disconnected_at is None:
+        disconnected_at = time.time()
+    _, err = run_on_ib_loop(_ib.disconnect, invoke_timeout=IB_HEARTBEAT_TIMEOUT)
+    if err:
+        # The loop itself is stuck; nothing in-process can recover that.
+        logger.critical("IB loop unresponsive during disconnect (%s); exiting.", err)
+        os._exit(1)
+
+def connection_monitor():
+    _ib = get_ib_instance()
+    _ib.errorEvent += on_ib_error
+    _ib.disconnectedEvent += on_disconnect
+    _ib.execDetailsEvent += on_exec_details
+    _ib.commissionReportEvent += on_commission_report
+    _ib.openOrderEvent += on_order_event
+    _ib.orderStatusEvent += on_order_event
+    _ib.positionEvent += on_position
+    _ib.updatePortfolioEvent += on_portfolio_update
+    _ib.pnlEvent += on_pnl
+    _ib.pnlSingleEvent += on_pnl_single
+    _ib.accountSummaryEvent += on_account_summary
+    logger.info(
+        "Bridge config: host=%s port=%s clientId=%s tradingMode=%s heartbeatInterval=%s heartbeatTimeout=%s heartbeatFailuresBeforeReconnect=%s",
+        IB_HOST, IB_PORT, IB_CLIENT_ID, IB_TRADING_MODE, IB_HEARTBEAT_INTERVAL, IB_HEARTBEAT_TIMEOUT, IB_HEARTBEAT_FAILURES_BEFORE_EXIT
+    )
+    
+    last_hb = time.time()
+    failures = 0
+    connect_failures = 0
+    while True:
+        now = time.time()
+        if not loop_ready.wait(timeout=1.0):
+            time.sleep(0.5)
+            continue
+        if not _ib.isConnected():
+            connection_ready.clear()
+            if not connection_in_progress_lock.acquire(timeout=IB_CONNECT_TIMEOUT):
+                time.sleep(1.0)
+                continue
+            # Use fixed ClientID for stability
+            active_id = IB_CLIENT_ID
+            logger.info(f"Connecting to {IB_HOST}:{IB_PORT} (clientId={active_id})")
+            increment_diag("reconnectAttempts")
+            try:
                 loop = get_loop()
                 if not loop:
                     raise RuntimeError("IB event loop not ready")
@@ -701,18 +2806,18 @@ def connection_monitor():
                 if err:
                     raise RuntimeError(f"connect-async-failed: {err}")
                 update_diag(lastConnectAt=now_iso())
-                # Give it a moment to stabilize synchronization
-                time.sleep(5.0)
-                if _ib.isConnected():
-                    logger.info("Connection established and synchronized. READY.")
-                    bump_epoch()
-                    connection_ready.set()
-                    failures = 0
+                if not wait_for_ib_sync(_ib, IB_SYNC_TIMEOUT):
+                    raise RuntimeError("sync-incomplete")
+                logger.info("Connection established and synchronized. READY.")
+                mark_connection_ready()
+                failures = 0
+                connect_failures = 0
                 last_hb = time.time()
             except Exception as e:
-                logger.error(f"Connect failed: {e}")
-                failures += 1
-                time.sleep(IB_RECONNECT_INTERVAL)
+                connect_failures += 1
+                delay = reconnect_delay(connect_failures)
+                logger.error(f"Connect failed: {e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
                 continue
             finally:
                 try: connection_in_progress_lock.release()
@@ -731,7 +2836,7 @@ def connection_monitor():
                 # Actual end-to-end check
                 try:
                     hb_start = time.time()
-                    debug_log(f"Heartbeat E2E start: epoch={get_current_epoch()} ready={connection_ready.is_set()} loop={get_loop_stats(loop)}")
+                    debug_log("Heartbeat E2E start: epoch=%s ready=%s loop=%s", get_current_epoch(), connection_ready.is_set(), get_loop_stats(loop))
                     # reqCurrentTimeAsync might return a Coroutine OR a Future
                     res_or_coro = _ib.reqCurrentTimeAsync()
                     if asyncio.iscoroutine(res_or_coro):
@@ -749,10 +2854,10 @@ def connection_monitor():
                             logger.warning(f"Heartbeat E2E future failed: {err}")
                             success = False
                     else:
-                        debug_log(f"Heartbeat E2E request returned value: {res_or_coro}")
+                        debug_log("Heartbeat E2E request returned value: %s", res_or_coro)
                         # It returned a result directly
                         if not res_or_coro: success = False
-                    debug_log(f"Heartbeat E2E end: success={success} duration={time.time() - hb_start:.2f}s")
+                    debug_log("Heartbeat E2E end: success=%s duration=%.2fs", success, time.time() - hb_start)
                 except Exception as e:
                     logger.error(f"Heartbeat E2E exception: {e}")
                     success = False
@@ -762,45 +2867,280 @@ def connection_monitor():
                 failures = 0
                 if not connection_ready.is_set():
                     logger.info("Connection considered READY.")
-                    bump_epoch()
-                    connection_ready.set()
+                    mark_connection_ready()
             else:
                 failures += 1
                 increment_diag("heartbeatFailures")
                 connection_ready.clear()
                 logger.warning(f"Heartbeat failed ({failures}/{IB_HEARTBEAT_FAILURES_BEFORE_EXIT})")
                 if IB_HEARTBEAT_FAILURES_BEFORE_EXIT > 0 and failures >= IB_HEARTBEAT_FAILURES_BEFORE_EXIT:
-                    logger.warning("Heartbeat failure threshold reached; disconnecting.")
+                    logger.warning("Heartbeat failure threshold reached; reconnecting.")
+                    request_disconnect(_ib)
+                    failures = 0
+                    continue
+        if reconnect_wakeup.wait(timeout=1.0):
+            reconnect_wakeup.clear()
+
+# --- Execution Webhook ---
+
+class ExecutionSpool:
+    """Append-only JSONL journal of undelivered executions.
+
+    Fills are written before the first delivery attempt and acked once the
+    webhook accepts them, so pending fills survive a bridge restart.
+    """
+
+    def __init__(self, path, compact_after=500):
+        self.path = path
+        self.compact_after = compact_after
+        self.pending = collections.OrderedDict()
+        self.acked_since_compact = 0
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            self.pending.clear()
+            if not self.path or not os.path.exists(self.path):
+                return []
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                for line in fh:
                     try:
-                        loop = get_loop()
-                        if loop:
-                            loop.call_soon_threadsafe(_ib.disconnect)
-                        else:
-                            _ib.disconnect()
-                    except: pass
-                    os._exit(1)
-        time.sleep(1.0)
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn write from a crash
+                    if entry.get("op") == "add":
+                        execution = entry.get("execution") or {}
+                        self.pending[execution.get("execId")] = execution
+                    elif entry.get("op") == "ack":
+                        for exec_id in entry.get("execIds") or []:
+                            self.pending.pop(exec_id, None)
+            self._rewrite()
+            return list(self.pending.values())
+
+    def add(self, executions):
+        with self.lock:
+            fresh = [e for e in executions if e.get("execId") not in self.pending]
+            for execution in fresh:
+                self.pending[execution.get("execId")] = execution
+            self._append([{"op": "add", "execution": e} for e in fresh])
+            return fresh
+
+    def ack(self, exec_ids):
+        with self.lock:
+            for exec_id in exec_ids:
+                self.pending.pop(exec_id, None)
+            self.acked_since_compact += len(exec_ids)
+            if self.acked_since_compact >= self.compact_after or not self.pending:
+                self._rewrite()
+            else:
+                self._append([{"op": "ack", "execIds": list(exec_ids)}])
+
+    def batch(self, limit):
+        with self.lock:
+            return [e for _, e in zip(range(limit), self.pending.values())]
+
+    def size(self):
+        with self.lock:
+            return len(self.pending)
+
+    def _append(self, entries):
+        if not self.path or not entries:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as fh:
+            for entry in entries:
+                fh.write(json.dumps(entry, default=str) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def _rewrite(self):
+        self.acked_since_compact = 0
+        if not self.path:
+            return
+        if not self.pending:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = self.path + ".tmp"
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            for execution in self.pending.values():
+                fh.write(json.dumps({"op": "add", "execution": execution}, default=str) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.path)
+
+class WebhookConnectionPool:
+    """Keep-alive HTTP(S) connections to the execution webhook host."""
+
+    def __init__(self, url, size, timeout):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        conn_cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return conn_cls(self.host, self.port, timeout=self.timeout)
+
+    def release(self, conn, reusable=True):
+        if not reusable:
+            conn.close()
+            return
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(conn)
+                return
+        conn.close()
 
-def webhook_worker():
-    logger.info("Webhook worker started.")
+    def post_json(self, body, headers):
+        # One transparent retry covers a keep-alive socket the server closed.
+        for attempt in range(2):
+            conn = self.acquire()
+            try:
+                conn.request('POST', self.path, body=body, headers=headers)
+                res = conn.getresponse()
+                data = res.read()
+                self.release(conn, reusable=not res.will_close)
+                return res.status, data
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.release(conn, reusable=False)
+                if attempt:
+                    raise
+            except Exception:
+                self.release(conn, reusable=False)
+                raise
+
+def webhook_backoff(failures):
+    delay = min(BRIDGE_WEBHOOK_RETRY_MAX, BRIDGE_WEBHOOK_RETRY_BASE * (2 ** max(0, failures - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+def post_execution_batch(pool, executions):
+    """Returns (delivered, permanent_failure, error)."""
+    body = json.dumps({"executions": executions}, default=str).encode('utf-8')
+    headers = {'Content-Type': 'application/json', 'X-API-KEY': BRIDGE_API_KEY or '', 'Connection': 'keep-alive'}
+    try:
+        status, data = pool.post_json(body, headers)
+    except Exception as exc:
+        return False, False, str(exc)
+    if 200 <= status < 300:
+        return True, False, None
+    detail = f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}"
+    # Client errors other than timeout/throttling will not succeed on retry.
+    permanent = 400 <= status < 500 and status not in (408, 425, 429)
+    return False, permanent, detail
+
+def collect_webhook_batch(timeout):
+    try:
+        first = execution_webhook_queue.get(timeout=timeout)
+    except queue.Empty:
+        return []
+    batch = [first]
+    deadline = time.time() + BRIDGE_WEBHOOK_BATCH_WINDOW
+    while len(batch) < BRIDGE_WEBHOOK_BATCH_MAX:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(execution_webhook_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+execution_spool = ExecutionSpool(BRIDGE_WEBHOOK_SPOOL_PATH)
+
+def webhook_dispatcher():
+    if not EXECUTION_WEBHOOK_URL:
+        logger.info("Webhook dispatcher disabled (no execution webhook URL).")
+        return
+    pool = WebhookConnectionPool(EXECUTION_WEBHOOK_URL, BRIDGE_WEBHOOK_POOL_SIZE, BRIDGE_WEBHOOK_TIMEOUT)
+    try:
+        recovered = execution_spool.load()
+    except Exception as exc:
+        logger.error("Webhook spool load failed: %s", exc)
+        recovered = []
+    logger.info("Webhook dispatcher started (recovered %s spooled executions).", len(recovered))
+    failures = 0
+    next_attempt_at = 0.0
     while True:
-        payload = execution_webhook_queue.get()
-        if not EXECUTION_WEBHOOK_URL:
-            execution_webhook_queue.task_done()
+        pending = execution_spool.size()
+        wait = max(0.0, next_attempt_at - time.time()) if pending else 1.0
+        incoming = collect_webhook_batch(wait if pending else None)
+        if incoming:
+            try:
+                execution_spool.add(incoming)
+            except Exception as exc:
+                logger.error("Webhook spool write failed: %s", exc)
+                with execution_spool.lock:
+                    for execution in incoming:
+                        execution_spool.pending.setdefault(execution.get("execId"), execution)
+        if time.time() < next_attempt_at:
             continue
-        try:
-            data = json.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(
-                EXECUTION_WEBHOOK_URL, data=data,
-                headers={'Content-Type': 'application/json', 'X-API-KEY': BRIDGE_API_KEY or ''},
-                method='POST'
-            )
-            with urllib.request.urlopen(req, timeout=10) as res: res.read()
-        except Exception as e: logger.error(f"Webhook failed: {e}")
-        finally: execution_webhook_queue.task_done()
+        batch = execution_spool.batch(BRIDGE_WEBHOOK_BATCH_MAX)
+        if not batch:
+            continue
+        delivered, permanent, err = post_execution_batch(pool, batch)
+        exec_ids = [e.get("execId") for e in batch]
+        if delivered or permanent:
+            execution_spool.ack(exec_ids)
+            failures = 0
+            next_attempt_at = 0.0
+            if permanent:
+                inc_counter("bridge_webhook_batches_total", result="rejected")
+                logger.error("Webhook rejected %s executions (%s); dropping execIds=%s", len(batch), err, exec_ids)
+            else:
+                inc_counter("bridge_webhook_batches_total", result="delivered")
+                inc_counter("bridge_webhook_executions_total", amount=len(batch))
+            update_diag(lastWebhookAt=now_iso(), lastWebhookError=err, webhookPending=execution_spool.size(), webhookFailures=0)
+        else:
+            failures += 1
+            delay = webhook_backoff(failures)
+            next_attempt_at = time.time() + delay
+            inc_counter("bridge_webhook_batches_total", result="retry")
+            logger.warning("Webhook delivery failed (%s); %s pending, retry %s in %.1fs", err, execution_spool.size(), failures, delay)
+            update_diag(lastWebhookError=err, webhookPending=execution_spool.size(), webhookFailures=failures)
 
 # --- snapshot fetchers ---
 
+def underlying_cache_key(contract):
+    # Only stock/index underlyings: unqualified option contracts are not unique by symbol.
+    sec_type = getattr(contract, "secType", None)
+    if sec_type not in ('STK', 'IND'):
+        return None
+    return f"{sec_type}:{contract.symbol}:{getattr(contract, 'currency', '') or 'USD'}"
+
+def qualify_underlyings(contracts, timeout, epoch=None):
+    """Qualifies stock/index contracts in place, reusing cached conIds."""
+    misses = []
+    for contract in contracts:
+        key = underlying_cache_key(contract)
+        cached, _ = cache_read(qualified_contracts_cache, key, IB_CONTRACT_DETAILS_CACHE_TTL) if key else (None, None)
+        if cached is not None:
+            util.dataclassUpdate(contract, cached)
+        else:
+            misses.append((key, contract))
+    if not misses:
+        return None
+    _ib = get_ib_instance()
+    f_qual, err = submit_ib_call(_ib.qualifyContractsAsync, *[c for _, c in misses], invoke_timeout=IB_CONTRACT_QUALIFY_TIMEOUT)
+    if err:
+        return f"qualify-submit-failed: {err}"
+    _, err = wait_for_future(f_qual, timeout, expected_epoch=epoch)
+    if err:
+        return f"qualify-failed: {err}"
+    for key, contract in misses:
+        if key and getattr(contract, "conId", None):
+            cache_write(qualified_contracts_cache, key, contract)
+    return None
+
 def get_contract(symbol, sec_type='STK', exchange='SMART', currency='USD'):
     symbol = symbol.upper()
     if sec_type == 'STK':
@@ -814,36 +3154,33 @@ def fetch_market_data_snapshot(symbol, data_type, timeout):
     epoch = get_current_epoch()
     contract = get_contract(symbol)
     if not get_loop():
-        debug_log(f"[{symbol}] Snapshot type={data_type} failed: no-loop")
+        debug_log("[%s] Snapshot type=%s failed: no-loop", symbol, data_type)
         return None, "no-loop"
     
-    logger.info(f"[{symbol}] Snapshot (type={data_type})")
+    if log_sampled():
+        log_ctx(logging.INFO, "[%s] Snapshot (type=%s)", symbol, data_type)
     
-    f_qual, err = submit_ib_call(_ib.qualifyContractsAsync, contract, invoke_timeout=IB_CONTRACT_QUALIFY_TIMEOUT)
+    err = qualify_underlyings([contract], IB_CONTRACT_QUALIFY_TIMEOUT, epoch)
     if err:
-        debug_log(f"[{symbol}] Qualify submit failed type={data_type} err={err}")
-        return None, f"qualify-submit-failed: {err}"
-    _, err = wait_for_future(f_qual, IB_CONTRACT_QUALIFY_TIMEOUT, expected_epoch=epoch)
-    if err:
-        debug_log(f"[{symbol}] Qualify failed type={data_type} err={err}")
-        return None, f"qualify-failed: {err}"
+        debug_log("[%s] Qualify failed type=%s err=%s", symbol, data_type, err)
+        return None, err
     
     _ib.reqMarketDataType(data_type)
     f_ticker, err = submit_ib_call(_ib.reqTickersAsync, contract, invoke_timeout=timeout)
     if err:
-        debug_log(f"[{symbol}] Ticker submit failed type={data_type} err={err}")
+        debug_log("[%s] Ticker submit failed type=%s err=%s", symbol, data_type, err)
         return None, f"tickers-submit-failed: {err}"
     res, err = wait_for_future(f_ticker, timeout, expected_epoch=epoch)
     
     if err:
-        debug_log(f"[{symbol}] Snapshot type={data_type} error={err}")
+        debug_log("[%s] Snapshot type=%s error=%s", symbol, data_type, err)
         return None, err
     if res:
         ticker = res[0]
         if has_market_price(ticker):
-            debug_log(f"[{symbol}] Snapshot type={data_type} ok last={ticker.last} bid={ticker.bid} ask={ticker.ask} close={ticker.close}")
+            debug_log("[%s] Snapshot type=%s ok last=%s bid=%s ask=%s close=%s", symbol, data_type, ticker.last, ticker.bid, ticker.ask, ticker.close)
             return ticker, None
-        debug_log(f"[{symbol}] Snapshot type={data_type} no-price last={ticker.last} bid={ticker.bid} ask={ticker.ask} close={ticker.close}")
+        debug_log("[%s] Snapshot type=%s no-price last=%s bid=%s ask=%s close=%s", symbol, data_type, ticker.last, ticker.bid, ticker.ask, ticker.close)
         return ticker, "no-price"
     return None, "empty"
 
@@ -854,9 +3191,8 @@ def fetch_market_data_batch(symbols, data_type, timeout):
     contracts = [get_contract(s) for s in symbols]
     if not get_loop(): return {}, "no-loop"
     
-    f_qual, err = submit_ib_call(_ib.qualifyContractsAsync, *contracts, invoke_timeout=IB_CONTRACT_QUALIFY_TIMEOUT)
-    if err: return None, f"qualify-submit-failed: {err}"
-    wait_for_future(f_qual, IB_CONTRACT_QUALIFY_TIMEOUT, expected_epoch=epoch)
+    err = qualify_underlyings(contracts, IB_CONTRACT_QUALIFY_TIMEOUT, epoch)
+    if err and err.startswith("qualify-submit-failed"): return None, err
     
     _ib.reqMarketDataType(data_type)
     f_tickers, err = submit_ib_call(_ib.reqTickersAsync, *contracts, invoke_timeout=timeout)
@@ -867,9 +3203,11 @@ def fetch_market_data_batch(symbols, data_type, timeout):
     return {t.contract.symbol: t for t in tickers if t.contract}, None
 
 def fetch_underlying_price(symbol):
-    cached, _ = cache_read(market_data_cache, symbol.upper(), IB_MARKET_DATA_CACHE_TTL)
+    streamed = streamed_market_payload(symbol)
+    if streamed: return streamed.get("last") or streamed.get("bid") or streamed.get("close")
+    cached, _ = cache_read(market_data_cache, symbol.upper(), session_ttl(IB_MARKET_DATA_CACHE_TTL))
     if cached: return cached.get("last") or cached.get("bid") or cached.get("close")
-    ticker, _ = fetch_market_data_snapshot(symbol, 1, 2.0)
+    ticker, _ = fetch_market_data_snapshot(symbol, market_data_tiers()[0][1], 2.0)
     if ticker: return safe_value(ticker.last) or safe_value(ticker.bid) or safe_value(ticker.close)
     return None
 
@@ -920,52 +3258,26 @@ def apply_option_fallbacks(response, req, und_price):
         except: pass
     return response
 
-def fetch_account_summary(timeout):
-    _ib = get_ib_instance()
-    if not get_loop():
-        return None, "no-loop"
-    if hasattr(_ib, "accountSummaryAsync"):
-        f, err = submit_ib_call(_ib.accountSummaryAsync, invoke_timeout=timeout)
-        if err:
-            return None, err
-        res, err = wait_for_future(f, timeout)
-        return res, err
-    if hasattr(_ib, "reqAccountSummaryAsync"):
-        tags = "NetLiquidation,TotalCashValue,BuyingPower,AvailableFunds,ExcessLiquidity,DailyPnL,RealizedPnL,UnrealizedPnL"
-        f, err = submit_ib_call(_ib.reqAccountSummaryAsync, "All", tags, invoke_timeout=timeout)
-        if err:
-            return None, err
-        res, err = wait_for_future(f, timeout)
-        return res, err
-    # Fallback to sync call (may block).
-    start = time.time()
-    res = _ib.accountSummary()
-    elapsed = time.time() - start
-    if elapsed > timeout:
-        return None, "timeout"
-    return res, None
-
 def request_option_chain_payload(symbol):
     _ib = get_ib_instance()
     epoch = get_current_epoch()
     stock = get_contract(symbol)
     if not get_loop():
-        debug_log(f"[{symbol}] Option chain failed: no-loop")
+        debug_log("[%s] Option chain failed: no-loop", symbol)
         return None, "no-loop"
     
-    f_qual, err = submit_ib_call(_ib.qualifyContractsAsync, stock, invoke_timeout=IB_CONTRACT_QUALIFY_TIMEOUT)
-    if err:
-        debug_log(f"[{symbol}] Option chain qualify submit failed err={err}")
-        return None, f"qualify-submit-failed: {err}"
-    _, err = wait_for_future(f_qual, 5.0, expected_epoch=epoch)
+    err = qualify_underlyings([stock], 5.0, epoch)
+    if err and err.startswith("qualify-submit-failed"):
+        debug_log("[%s] Option chain qualify submit failed err=%s", symbol, err)
+        return None, err
     
     f_chain, err = submit_ib_call(_ib.reqSecDefOptParamsAsync, stock.symbol, '', stock.secType, stock.conId, invoke_timeout=10.0)
     if err:
-        debug_log(f"[{symbol}] Option chain submit failed err={err}")
+        debug_log("[%s] Option chain submit failed err=%s", symbol, err)
         return None, f"chain-submit-failed: {err}"
     chains, err = wait_for_future(f_chain, 10.0, expected_epoch=epoch)
     if err or not chains:
-        debug_log(f"[{symbol}] Option chain failed err={err} chains={len(chains) if chains else 0}")
+        debug_log("[%s] Option chain failed err=%s chains=%s", symbol, err, len(chains) if chains else 0)
         return None, err or "empty"
     
     sym_upper = symbol.upper()
@@ -975,27 +3287,495 @@ def request_option_chain_payload(symbol):
     )
     if not target:
         target = next((c for c in chains if c.exchange == 'SMART'), chains[0])
+    classes = merge_option_chains(chains, sym_upper)
+    merged = classes.get(getattr(target, 'tradingClass', None) or sym_upper) or {}
     return {
         "symbol": symbol,
-        "expirations": sorted(target.expirations),
-        "strikes": sorted(target.strikes),
+        "expirations": merged.get("expirations") or sorted(target.expirations),
+        "strikes": merged.get("strikes") or sorted(target.strikes),
         "multiplier": target.multiplier,
         "exchange": getattr(target, 'exchange', None),
         "currency": getattr(target, 'currency', None) or 'USD',
         "tradingClass": getattr(target, 'tradingClass', None),
         "underlyingConId": getattr(target, 'underlyingConId', None),
+        "classes": classes,
     }, None
 
+def merge_option_chains(chains, default_class):
+    # IB returns one OptionChain per (exchange, tradingClass); SPX and SPXW,
+    # or a root and its weeklies, come back as separate classes.
+    merged = {}
+    for chain in chains:
+        name = getattr(chain, 'tradingClass', None) or default_class
+        entry = merged.get(name)
+        if entry is None:
+            entry = merged[name] = {"multiplier": chain.multiplier, "exchanges": set(), "expirations": set(), "strikes": set()}
+        entry["exchanges"].add(chain.exchange)
+        entry["expirations"].update(chain.expirations)
+        entry["strikes"].update(chain.strikes)
+    return {
+        name: {
+            "tradingClass": name,
+            "multiplier": entry["multiplier"],
+            "exchanges": sorted(entry["exchanges"]),
+            "expirations": sorted(entry["expirations"]),
+            "strikes": sorted(entry["strikes"]),
+        }
+        for name, entry in merged.items()
+    }
+
+CHAIN_FILTER_PARSERS = {
+    "dteMin": int, "dteMax": int, "strikeMin": float, "strikeMax": float, "nearPrice": float, "count": int,
+    "tradingClass": str.upper, "expiration": str,
+}
+CHAIN_ALL_CLASSES = "ALL"
+
+def parse_chain_filters(args):
+    """Returns (filters, bad_param); filters only holds the params that were given."""
+    filters = {}
+    for name, parse in CHAIN_FILTER_PARSERS.items():
+        raw = args.get(name)
+        if raw in (None, ''):
+            continue
+        try:
+            value = parse(raw)
+        except ValueError:
+            return None, name
+        if value != value or (name == "count" and value < 1):
+            return None, name
+        filters[name] = value
+    return filters, None
+
+class OptionChainIndex:
+    """Sorted expirations/strikes of one cached chain payload, sliced by bisect.
+
+    Built once per payload object (option_chain_indexes keeps it next to the
+    cache entry) so filtered requests never re-sort or scan the full chain.
+    Per-class views and the expiration -> classes map come from the merged
+    "classes" section; unions for an expiration or for all classes are
+    memoized on first use. Responses leave "classes" out unless the caller
+    passes classes=1.
+    """
+    __slots__ = ("source", "expirations", "strikes", "classes", "expiration_classes", "unions", "bare")
+
+    def __init__(self, payload):
+        self.source = payload
+        self.expirations = sorted(payload.get("expirations") or [])
+        self.strikes = sorted(float(s) for s in payload.get("strikes") or [])
+        self.classes = {}
+        self.expiration_classes = {}
+        for name, entry in (payload.get("classes") or {}).items():
+            exps = sorted(entry.get("expirations") or [])
+            self.classes[name.upper()] = (exps, sorted(float(s) for s in entry.get("strikes") or []))
+            for exp in exps:
+                self.expiration_classes.setdefault(exp, []).append(name)
+        self.unions = {}
+        self.bare = None
+
+    def unfiltered(self):
+        if self.bare is None:
+            self.bare = {k: v for k, v in self.source.items() if k != "classes"}
+        return self.bare
+
+    def union(self, key, class_names):
+        cached = self.unions.get(key)
+        if cached is None:
+            views = [self.classes[name.upper()] for name in class_names]
+            exps = sorted({exp for view in views for exp in view[0]})
+            strikes = views[0][1] if len(views) == 1 else sorted({s for view in views for s in view[1]})
+            cached = self.unions[key] = (exps, strikes)
+        return cached
+
+    def view(self, trading_class=None, expiration=None):
+        """Returns (expirations, strikes) or None when the class/expiration is not listed."""
+        if trading_class == CHAIN_ALL_CLASSES:
+            exps, strikes = self.union(CHAIN_ALL_CLASSES, list(self.classes))
+        elif trading_class:
+            if trading_class not in self.classes:
+                return None
+            exps, strikes = self.classes[trading_class]
+        else:
+            exps, strikes = self.expirations, self.strikes
+        if expiration is None:
+            return exps, strikes
+        listed = [name for name in self.expiration_classes.get(expiration, ())
+                  if not trading_class or trading_class in (CHAIN_ALL_CLASSES, name.upper())]
+        if not listed:
+            return ([expiration], strikes) if not self.classes and expiration in exps else None
+        return [expiration], self.union(("exp", expiration, tuple(listed)), listed)[1]
+
+    def expiration_slice(self, dte_min=None, dte_max=None, today=None, expirations=None):
+        expirations = self.expirations if expirations is None else expirations
+        today = today or datetime.now(timezone.utc).date()
+        lo, hi = 0, len(expirations)
+        if dte_min is not None:
+            lo = bisect.bisect_left(expirations, (today + timedelta(days=dte_min)).strftime('%Y%m%d'))
+        if dte_max is not None:
+            hi = bisect.bisect_right(expirations, (today + timedelta(days=dte_max)).strftime('%Y%m%d'))
+        return expirations[lo:hi]
+
+    def strike_slice(self, strike_min=None, strike_max=None, near_price=None, count=None, strikes=None):
+        strikes = self.strikes if strikes is None else strikes
+        lo = bisect.bisect_left(strikes, strike_min) if strike_min is not None else 0
+        hi = bisect.bisect_right(strikes, strike_max) if strike_max is not None else len(strikes)
+        if not count or hi - lo <= count:
+            return strikes[lo:hi]
+        if near_price is None:
+            return strikes[lo:lo + count]
+        # Grow a window outward from the insertion point, taking the nearer side each step.
+        right = min(max(bisect.bisect_left(strikes, near_price, lo, hi), lo), hi)
+        left = right - 1
+        for _ in range(count):
+            if right >= hi or (left >= lo and near_price - strikes[left] <= strikes[right] - near_price):
+                left -= 1
+            else:
+                right += 1
+        return strikes[left + 1:right]
+
+    def filter(self, filters, today=None):
+        """Returns the sliced payload, or None when tradingClass/expiration is not listed."""
+        trading_class = filters.get("tradingClass")
+        selected = self.view(trading_class, filters.get("expiration"))
+        if selected is None:
+            return None
+        exps, strikes = selected
+        payload = {k: v for k, v in self.source.items() if k != "classes"}
+        payload["expirations"] = self.expiration_slice(filters.get("dteMin"), filters.get("dteMax"), today, exps)
+        payload["strikes"] = self.strike_slice(filters.get("strikeMin"), filters.get("strikeMax"),
+                                               filters.get("nearPrice"), filters.get("count"), strikes)
+        if trading_class == CHAIN_ALL_CLASSES:
+            payload["tradingClass"] = None
+        elif trading_class:
+            entry = next((e for name, e in (self.source.get("classes") or {}).items() if name.upper() == trading_class), {})
+            payload["tradingClass"] = trading_class
+            payload["multiplier"] = entry.get("multiplier", payload.get("multiplier"))
+        if trading_class == CHAIN_ALL_CLASSES or "expiration" in filters:
+            payload["expirationClasses"] = {exp: self.expiration_classes.get(exp, []) for exp in payload["expirations"]}
+        payload["totalExpirations"] = len(exps)
+        payload["totalStrikes"] = len(strikes)
+        payload["filters"] = filters
+        return payload
+
+def prune_option_chain(payload, cutoff):
+    """Drops expirations <= cutoff; returns the same object when none expired.
+
+    Relies on the payload's expiration lists being sorted, as
+    request_option_chain_payload builds them.
+    """
+    def live(exps):
+        return exps[bisect.bisect_right(exps, cutoff):]
+    classes = payload.get("classes") or {}
+    firsts = [payload.get("expirations") or []] + [entry.get("expirations") or [] for entry in classes.values()]
+    if not any(exps and exps[0] <= cutoff for exps in firsts):
+        return payload
+    pruned = dict(payload)
+    pruned["expirations"] = live(payload.get("expirations") or [])
+    if classes:
+        pruned["classes"] = {
+            name: dict(entry, expirations=live(entry.get("expirations") or []))
+            for name, entry in classes.items() if live(entry.get("expirations") or [])
+        }
+    return pruned
+
+def store_option_chain(symbol, payload, now=None):
+    # Secdef data barely moves intraday, so entries live up to the (long) TTL
+    # but never across a session open/close: corporate actions and new
+    # listings take effect at the open and are picked up by the next read.
+    now = time.time() if now is None else now
+    payload = prune_option_chain(payload, expired_through(now))
+    cache_write(option_chain_cache, symbol.upper(), payload,
+                expires_at=min(now + IB_OPTION_CHAIN_CACHE_TTL, next_session_boundary(now)))
+    return payload
+
+def prune_cached_chain(symbol, payload, now=None):
+    """Returns the cached chain minus expirations that stopped trading, or None
+    when nothing is left, writing the pruned copy back once per rollover."""
+    pruned = prune_option_chain(payload, expired_through(now))
+    if pruned is payload:
+        return payload
+    if not pruned.get("expirations"):
+        return None
+    if cache_swap(option_chain_cache, symbol.upper(), payload, pruned):
+        debug_log("[%s] Pruned expired expirations: %s -> %s", symbol, len(payload.get("expirations") or []), len(pruned["expirations"]))
+    return pruned
+
+def invalidate_option_chains(symbols=None):
+    with data_lock:
+        keys = list(option_chain_cache) if not symbols else [s.upper() for s in symbols if s and s.upper() in option_chain_cache]
+        for key in keys:
+            option_chain_cache.pop(key, None)
+            option_chain_indexes.pop(key, None)
+    return keys
+
+option_chain_indexes = {}
+
+def option_chain_index(symbol, payload):
+    key = symbol.upper()
+    with data_lock:
+        index = option_chain_indexes.get(key)
+    if index is None or index.source is not payload:
+        index = OptionChainIndex(payload)
+        with data_lock:
+            option_chain_indexes[key] = index
+    return index
+
+def build_bar_payload(bar):
+    avg = safe_value(getattr(bar, 'average', None))
+    if avg is None:
+        avg = safe_value(getattr(bar, 'wap', None))
+    return {
+        "date": str(bar.date),
+        "open": bar.open,
+        "high": bar.high,
+        "low": bar.low,
+        "close": bar.close,
+        "volume": bar.volume,
+        "average": avg
+    }
+
+def historical_params(d):
+    return {
+        "endDateTime": d.get('endDateTime', ''),
+        "durationStr": d.get('duration', '1 M'),
+        "barSizeSetting": d.get('barSize', '1 day'),
+        "whatToShow": d.get('whatToShow', 'TRADES'),
+        "useRTH": str(d.get('useRTH', True)).lower() not in ('0', 'false', 'no'),
+    }
+
+def historical_cache_key(contract, params):
+    # Only open-ended (up to now) requests are cacheable.
+    if params["endDateTime"]:
+        return None
+    sec_type = getattr(contract, "secType", None) or 'STK'
+    if sec_type != 'OPT':
+        # Keyed by symbol rather than conId so the route can hit bars that
+        # warmup prefetched for a qualified contract before qualifying its own.
+        key = f"{sec_type}:{contract.symbol.upper()}"
+    elif getattr(contract, "conId", None):
+        key = contract_cache_key(contract)
+    else:
+        key = f"OPT:{contract.symbol}:{contract.lastTradeDateOrContractMonth}:{contract.strike}:{contract.right}"
+    return f"{key}|{params['durationStr']}|{params['barSizeSetting']}|{params['whatToShow']}|{int(params['useRTH'])}"
+
+def is_daily_bar_size(params):
+    return params["barSizeSetting"] in ('1 day', '1 week', '1 month')
+
+def historical_cache_ttl(params):
+    return BRIDGE_HISTORICAL_DAILY_CACHE_TTL if is_daily_bar_size(params) else session_ttl(IB_HISTORICAL_CACHE_TTL)
+
+def historical_cache_expiry(params):
+    # Daily bars gain today's bar at the open and finalise it at the close.
+    return next_session_boundary() if is_daily_bar_size(params) else session_expires_at()
+
+def request_historical_bars(contract, params, timeout=20.0):
+    _ib = get_ib_instance()
+    f_hist, err = submit_ib_call(_ib.reqHistoricalDataAsync, contract, invoke_timeout=timeout, **params)
+    if err:
+        return None, f"historical-submit-failed: {err}"
+    bars, err = wait_for_future(f_hist, timeout)
+    if err:
+        return None, err
+    return [build_bar_payload(b) for b in bars or []], None
+
+# --- Market Data Streams ---
+
+# Long-lived reqMktData tickers opened by warmup; /market-data reads them
+# before falling back to snapshots. IB drops them on disconnect, so their
+# contracts are parked until the next ready and re-requested then.
+market_data_streams_lock = threading.Lock()
+market_data_streams = {}
+suspended_market_data_streams = {}
+
+def open_market_data_streams(contracts):
+    _ib = get_ib_instance()
+    with market_data_streams_lock:
+        fresh = [c for c in contracts if c.symbol.upper() not in market_data_streams]
+    if not fresh:
+        return 0, None
+    def subscribe_all():
+        _ib.reqMarketDataType(1)
+        return [(c, _ib.reqMktData(c, '', False, False)) for c in fresh]
+    tickers, err = run_on_ib_loop(subscribe_all, invoke_timeout=IB_CONNECT_TIMEOUT)
+    if err:
+        return 0, err
+    with market_data_streams_lock:
+        for contract, ticker in tickers:
+            market_data_streams[contract.symbol.upper()] = ticker
+    return len(tickers), None
+
+def suspend_market_data_streams():
+    with market_data_streams_lock:
+        for symbol, ticker in market_data_streams.items():
+            suspended_market_data_streams[symbol] = ticker.contract
+        market_data_streams.clear()
+
+def resume_market_data_streams():
+    with market_data_streams_lock:
+        contracts = list(suspended_market_data_streams.values())
+        suspended_market_data_streams.clear()
+    if not contracts:
+        return 0, None
+    opened, err = open_market_data_streams(contracts)
+    if err:
+        # Keep them parked; the next ready retries.
+        with market_data_streams_lock:
+            for contract in contracts:
+                suspended_market_data_streams.setdefault(contract.symbol.upper(), contract)
+    return opened, err
+
+def streamed_market_payload(symbol):
+    with market_data_streams_lock:
+        ticker = market_data_streams.get(symbol.upper())
+    if ticker is not None and has_market_price(ticker):
+        return build_market_payload(symbol.upper(), ticker, "stream")
+    return None
+
+# --- Warmup ---
+
+warmup_lock = threading.Lock()
+warmup_state = {"status": "idle", "epoch": None, "startedAt": None, "finishedAt": None, "durationMs": None, "symbols": 0, "steps": {}, "errors": []}
+
+def update_warmup(step=None, done=None, total=None, error=None, **fields):
+    with warmup_lock:
+        warmup_state.update(fields)
+        if step:
+            entry = warmup_state["steps"].setdefault(step, {"done": 0, "total": 0, "failed": 0})
+            if total is not None:
+                entry["total"] = total
+            if done:
+                entry["done"] += done
+            if error:
+                entry["failed"] += 1
+        if error and len(warmup_state["errors"]) < 20:
+            warmup_state["errors"].append({"step": step, "error": str(error)})
+
+def get_warmup_snapshot():
+    with warmup_lock:
+        snapshot = dict(warmup_state)
+        snapshot["steps"] = {k: dict(v) for k, v in warmup_state["steps"].items()}
+        snapshot["errors"] = list(warmup_state["errors"])
+        return snapshot
+
+def warmup_symbols():
+    symbols = list(BRIDGE_WARMUP_SYMBOLS)
+    if BRIDGE_WARMUP_INCLUDE_POSITIONS:
+        _, rows = positions_book.snapshot()
+        symbols.extend(row["symbol"].upper() for row in rows if row.get("symbol") and row.get("secType") in ('STK', 'OPT'))
+    return list(dict.fromkeys(symbols))[:BRIDGE_WARMUP_MAX_SYMBOLS]
+
+@contextmanager
+def warmup_lock_group(group):
+    # Warmup competes with live requests through the same lock groups, one
+    # slot at a time.
+    acquired, _ = acquire_bridge_lock(group, IB_CONNECT_TIMEOUT, 1, 0)
+    start = time.time()
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            release_bridge_lock(group, int((time.time() - start) * 1000))
+
+def run_warmup(epoch):
+    symbols = warmup_symbols()
+    start = time.time()
+    update_warmup(status="running", epoch=epoch, startedAt=now_iso(), finishedAt=None, durationMs=None, symbols=len(symbols), steps={}, errors=[])
+    logger.info("Warmup started: epoch=%s symbols=%s", epoch, len(symbols))
+
+    def aborted():
+        return get_current_epoch() != epoch or not connection_ready.is_set()
+
+    contracts = [get_contract(s) for s in symbols]
+    update_warmup("qualify", total=len(contracts))
+    with warmup_lock_group("market") as acquired:
+        err = qualify_underlyings(contracts, IB_CONTRACT_QUALIFY_TIMEOUT, epoch) if acquired else "lock-timeout"
+    qualified = [c for c in contracts if getattr(c, "conId", None)]
+    update_warmup("qualify", done=len(qualified), error=err)
+
+    if BRIDGE_WARMUP_STREAMS and not aborted():
+        streamable = qualified[:BRIDGE_WARMUP_MAX_STREAMS]
+        update_warmup("streams", total=len(streamable))
+        opened, err = open_market_data_streams(streamable)
+        update_warmup("streams", done=opened, error=err)
+
+    if BRIDGE_WARMUP_CHAINS:
+        update_warmup("chains", total=len(qualified))
+        for contract in qualified:
+            if aborted():
+                break
+            with warmup_lock_group("options") as acquired:
+                payload, err = request_option_chain_payload(contract.symbol) if acquired else (None, "lock-timeout")
+            if payload:
+                store_option_chain(contract.symbol, payload)
+            update_warmup("chains", done=1 if payload else 0, error=err)
+            time.sleep(BRIDGE_WARMUP_PACING)
+
+    if BRIDGE_WARMUP_BARS:
+        params = historical_params({"duration": BRIDGE_WARMUP_BARS_DURATION})
+        update_warmup("bars", total=len(qualified))
+        for contract in qualified:
+            if aborted():
+                break
+            with warmup_lock_group("historical") as acquired:
+                bars, err = request_historical_bars(contract, params) if acquired else (None, "lock-timeout")
+            if bars:
+                cache_write(historical_cache, historical_cache_key(contract, params), {"symbol": contract.symbol, "bars": bars},
+                            expires_at=historical_cache_expiry(params))
+            update_warmup("bars", done=1 if bars is not None else 0, error=err)
+            time.sleep(BRIDGE_WARMUP_PACING)
+
+    status = "aborted" if aborted() else "done"
+    duration_ms = int((time.time() - start) * 1000)
+    update_warmup(status=status, finishedAt=now_iso(), durationMs=duration_ms)
+    logger.info("Warmup %s: epoch=%s durationMs=%s", status, epoch, duration_ms)
+
+def warmup_worker():
+    last_epoch = None
+    while True:
+        if not connection_ready.wait(timeout=5.0):
+            continue
+        epoch = get_current_epoch()
+        if epoch != last_epoch:
+            last_epoch = epoch
+            try:
+                run_warmup(epoch)
+            except Exception as exc:
+                update_warmup(status="failed", finishedAt=now_iso(), error=exc)
+                logger.error("Warmup failed: %s", exc)
+        time.sleep(1.0)
+
 # --- endpoints ---
 
 @app.before_request
 def auth():
     if request.method == 'OPTIONS': return
-    if request.path in ('/health', '/ping', '/diag'): return
+    if request.path in ('/health', '/ping', '/diag', '/metrics'): return
     if BRIDGE_API_KEY and request.headers.get('X-API-KEY') != BRIDGE_API_KEY:
         logger.warning("Unauthorized request", extra={"path": request.path, "ip": request.remote_addr})
         return jsonify({"error": "Unauthorized"}), 401
 
+@app.after_request
+def add_server_timing(response):
+    timing = g.pop('server_timing', None)
+    if timing:
+        response.headers['Server-Timing'] = timing
+    return response
+
+@app.after_request
+def compress_response(response):
+    if not BRIDGE_COMPRESSION or response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.mimetype != 'application/json' or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < BRIDGE_COMPRESS_MIN_BYTES:
+        return response
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding:
+        response.set_data(compress_body(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
 @app.route('/ping')
 def ping():
     return jsonify({"status": "ok", "timestamp": int(time.time()*1000)})
@@ -1012,9 +3792,11 @@ def health():
         "host": IB_HOST,
         "port": IB_PORT,
         "clientType": IB_CLIENT_TYPE,
-        "tradingMode": IB_TRADING_MODE
+        "tradingMode": IB_TRADING_MODE,
+        "backend": IB_BACKEND
     }
     with data_lock: res.update(diag_state)
+    res["warmup"] = get_warmup_snapshot()
     return jsonify(res)
 
 @app.route('/diag')
@@ -1030,26 +3812,60 @@ def diag():
             "marketDataEntries": len(market_data_cache),
             "optionChainEntries": len(option_chain_cache),
             "historicalEntries": len(historical_cache),
-            "executionsEntries": len(executions_cache),
             "positionsEntries": len(positions_cache),
-            "accountSummaryEntries": len(account_summary_cache)
+            "executionsStored": execution_store.size()
+        },
+        "accountSummary": account_summary_stats(),
+        "books": {
+            "positions": positions_book.stats(),
+            "portfolio": portfolio_book.stats(),
+            "orders": orders_book.stats()
+        },
+        "pnl": pnl_manager.stats(),
+        "marketSession": {
+            "session": market_session(),
+            "nextBoundary": datetime.utcfromtimestamp(next_session_boundary(boundaries=EXTENDED_BOUNDARIES)).isoformat() + "Z",
+            "policyEnabled": BRIDGE_SESSION_CACHE_POLICY,
+            "marketDataTtl": session_ttl(IB_MARKET_DATA_CACHE_TTL),
+            "tiers": [tier for tier, _ in market_data_tiers()]
         }
     })
 
+@app.route('/diag/slow')
+def get_slow_diag():
+    limit = parse_limit(request.args.get('limit'), BRIDGE_SLOW_REQUEST_BUFFER)
+    rows = get_slow_requests(limit=limit, route=request.args.get('route'))
+    return jsonify({
+        "thresholdMs": BRIDGE_SLOW_REQUEST_MS,
+        "capacity": slow_requests.maxlen,
+        "count": len(rows),
+        "requests": rows
+    })
+
+@app.route('/metrics')
+def metrics():
+    if (request.args.get('format') or '').lower() == 'json':
+        return jsonify(metrics_json())
+    return app.response_class(render_prometheus_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/market-data/<symbol>')
 def get_market_data(symbol):
     with BridgeGuard("market-data", group="market", timeout=2.0) as guard:
         if not guard.ok:
             return guard.response
-        cached, _ = cache_read(market_data_cache, symbol.upper(), IB_MARKET_DATA_CACHE_TTL)
+        streamed = streamed_market_payload(symbol)
+        if streamed:
+            return guard.respond(streamed, 200)
+        cached, _ = cache_read(market_data_cache, symbol.upper(), session_ttl(IB_MARKET_DATA_CACHE_TTL))
         if cached:
             return guard.respond(cached, 200)
         tier_debug = []
-        for tier, dtype in [("realtime", 1), ("frozen", 2), ("delayed", 3)]:
-            ticker, err = fetch_market_data_snapshot(symbol, dtype, 2.0)
+        for tier, dtype in market_data_tiers():
+            with trace_span(f"tier.{tier}"):
+                ticker, err = fetch_market_data_snapshot(symbol, dtype, 2.0)
             if not err and has_market_price(ticker):
                 payload = build_market_payload(symbol, ticker, tier)
-                cache_write(market_data_cache, symbol.upper(), payload)
+                cache_write(market_data_cache, symbol.upper(), payload, expires_at=session_expires_at())
                 return guard.respond(payload, 200)
             tier_debug.append({
                 "tier": tier,
@@ -1059,7 +3875,7 @@ def get_market_data(symbol):
                 "ask": safe_value(ticker.ask) if ticker else None,
                 "close": safe_value(ticker.close) if ticker else None,
             })
-        debug_log(f"[{symbol}] No market data. tiers={tier_debug} lastIbError={diag_state.get('lastIbErrorCode')}:{diag_state.get('lastIbErrorMessage')}")
+        debug_log("[%s] No market data. tiers=%s lastIbError=%s:%s", symbol, tier_debug, diag_state.get('lastIbErrorCode'), diag_state.get('lastIbErrorMessage'))
         return guard.error(404, "No market data")
 
 @app.route('/market-data/batch', methods=['POST'])
@@ -1076,21 +3892,25 @@ def get_market_data_batch():
         remaining_symbols = []
         for s in symbols:
             s_upper = s.upper()
-            cached, _ = cache_read(market_data_cache, s_upper, IB_MARKET_DATA_CACHE_TTL)
+            cached = streamed_market_payload(s_upper)
+            if cached is None:
+                cached, _ = cache_read(market_data_cache, s_upper, session_ttl(IB_MARKET_DATA_CACHE_TTL))
             if cached:
                 results.append(cached)
             else:
                 remaining_symbols.append(s_upper)
         
         if remaining_symbols:
-            for tier, dtype in [("realtime", 1), ("frozen", 2), ("delayed", 3)]:
-                tickers, err = fetch_market_data_batch(remaining_symbols, dtype, 5.0)
+            expires_at = session_expires_at()
+            for tier, dtype in market_data_tiers():
+                with trace_span(f"tier.{tier}"):
+                    tickers, err = fetch_market_data_batch(remaining_symbols, dtype, 5.0)
                 if not err and tickers:
                     for s_upper in list(remaining_symbols):
                         ticker = tickers.get(s_upper)
                         if ticker and has_market_price(ticker):
                             payload = build_market_payload(s_upper, ticker, tier)
-                            cache_write(market_data_cache, s_upper, payload)
+                            cache_write(market_data_cache, s_upper, payload, expires_at=expires_at)
                             results.append(payload)
                             remaining_symbols.remove(s_upper)
                 if not remaining_symbols:
@@ -1103,15 +3923,41 @@ def get_option_chain(symbol):
     with BridgeGuard("option-chain", group="options", timeout=2.0) as guard:
         if not guard.ok:
             return guard.response
-        cached, _ = cache_read(option_chain_cache, symbol.upper(), IB_OPTION_CHAIN_CACHE_TTL)
-        if cached:
-            return guard.respond(cached, 200)
-        
-        payload, err = request_option_chain_payload(symbol)
-        if err:
-            return guard.error(500, err)
-        cache_write(option_chain_cache, symbol.upper(), payload)
-        return guard.respond(payload, 200)
+        filters, bad_param = parse_chain_filters(request.args)
+        if bad_param:
+            return guard.error(400, "invalid-filter", param=bad_param)
+        include_classes = (request.args.get('classes') or '').lower() in ('1', 'true', 'yes')
+        payload, _ = cache_read(option_chain_cache, symbol.upper(), IB_OPTION_CHAIN_CACHE_TTL)
+        if payload:
+            payload = prune_cached_chain(symbol, payload)
+        if not payload:
+            payload, err = request_option_chain_payload(symbol)
+            if err:
+                return guard.error(500, err)
+            payload = store_option_chain(symbol, payload)
+        classes = payload.get("classes")
+        if filters:
+            with trace_span("chain.filter"):
+                payload = option_chain_index(symbol, payload).filter(filters)
+            if payload is None:
+                return guard.error(404, "not-listed", tradingClass=filters.get("tradingClass"), expiration=filters.get("expiration"))
+            if include_classes and classes:
+                payload["classes"] = classes
+        elif not include_classes:
+            payload = option_chain_index(symbol, payload).unfiltered()
+        return guard.respond_conditional(payload)
+
+@app.route('/option-chain/invalidate', methods=['POST'])
+def post_option_chain_invalidate():
+    # For out-of-band events (corporate actions, adjusted classes) that should
+    # not wait for the next session boundary. No symbols clears every chain.
+    d = request.get_json(silent=True) or {}
+    symbols = d.get('symbols')
+    if symbols is not None and not isinstance(symbols, list):
+        return jsonify({"error": "invalid-symbols"}), 400
+    keys = invalidate_option_chains(symbols)
+    logger.info("Option chains invalidated: %s reason=%s", keys, d.get('reason'))
+    return jsonify({"invalidated": keys, "count": len(keys)})
 
 @app.route('/option-quote', methods=['POST'])
 def get_option_quote():
@@ -1157,7 +4003,8 @@ def get_option_quote():
         if not res:
             return guard.error(404, err or "No data")
         ticker = res[0]
-        und = fetch_underlying_price(data['symbol'])
+        with trace_span("underlying"):
+            und = fetch_underlying_price(data['symbol'])
         greeks = extract_option_greeks(ticker)
         resp = {
             "symbol": data['symbol'],
@@ -1171,7 +4018,8 @@ def get_option_quote():
         for key, value in greeks.items():
             if value is not None:
                 resp[key] = value
-        resp = apply_option_fallbacks(resp, data, und)
+        with trace_span("fallback"):
+            resp = apply_option_fallbacks(resp, data, und)
         return guard.respond(resp, 200)
 
 @app.route('/historical', methods=['POST'])
@@ -1205,10 +4053,16 @@ def get_historical():
                 multiplier=multiplier or None
             )
         else:
-            contract = Stock(symbol, 'SMART', 'USD')
+            contract = Stock(symbol.upper(), 'SMART', 'USD')
         _ib = get_ib_instance()
         if not get_loop():
             return guard.error(500, "no-loop")
+        params = historical_params(d)
+        cache_key = historical_cache_key(contract, params)
+        if cache_key:
+            cached, _ = cache_read(historical_cache, cache_key, historical_cache_ttl(params))
+            if cached:
+                return guard.respond({"symbol": d['symbol'], "bars": cached["bars"]}, 200)
 
         if sec_type in ('OPT', 'OPTION'):
             f_qual, err = submit_ib_call(_ib.qualifyContractsAsync, contract, invoke_timeout=IB_CONTRACT_QUALIFY_TIMEOUT)
@@ -1219,36 +4073,21 @@ def get_historical():
                 return guard.error(500, f"qualify-failed: {err}")
             if qual:
                 contract = qual[0]
-        
-        f_hist, err = submit_ib_call(_ib.reqHistoricalDataAsync,
-            contract, endDateTime=d.get('endDateTime', ''), durationStr=d.get('duration', '1 M'),
-            barSizeSetting=d.get('barSize', '1 day'), whatToShow=d.get('whatToShow', 'TRADES'),
-            useRTH=(str(d.get('useRTH', True)).lower() not in ('0', 'false', 'no')),
-            invoke_timeout=20.0
-        )
-        if err:
-            return guard.error(500, f"historical-submit-failed: {err}")
-        bars, err = wait_for_future(f_hist, 20.0)
+        else:
+            err = qualify_underlyings([contract], 5.0)
+            if err and err.startswith("qualify-submit-failed"):
+                return guard.error(500, err)
+
+        bars, err = request_historical_bars(contract, params)
         if err:
             return guard.error(500, err)
-
-        def build_bar_payload(bar):
-            avg = safe_value(getattr(bar, 'average', None))
-            if avg is None:
-                avg = safe_value(getattr(bar, 'wap', None))
-            return {
-                "date": str(bar.date),
-                "open": bar.open,
-                "high": bar.high,
-                "low": bar.low,
-                "close": bar.close,
-                "volume": bar.volume,
-                "average": avg
-            }
-
+        # An empty list is what a pacing violation (162) or "no data" error
+        # leaves behind; never serve that from the cache.
+        if cache_key and bars:
+            cache_write(historical_cache, cache_key, {"symbol": d['symbol'], "bars": bars}, expires_at=historical_cache_expiry(params))
         return guard.respond({
             "symbol": d['symbol'],
-            "bars": [build_bar_payload(b) for b in bars]
+            "bars": bars
         }, 200)
 
 @app.route('/order', methods=['POST'])
@@ -1256,20 +4095,167 @@ def place_order():
     with BridgeGuard("order", group="orders", timeout=5.0) as guard:
         if not guard.ok:
             return guard.response
-        d = request.json
-        if d.get('secType') == 'OPT':
-            contract = Option(d['symbol'], d['expiration'], float(d['strike']), d['right'], 'SMART')
-        else:
-            contract = Stock(d['symbol'], 'SMART', 'USD')
-        _ib = get_ib_instance()
-        order = LimitOrder(d['action'], float(d['quantity']), float(d['limitPrice'])) if d.get('orderType', 'LMT') == 'LMT' else MarketOrder(d['action'], float(d['quantity']))
-        order.orderRef = d.get('uid', 'anon')
-        trade = _ib.placeOrder(contract, order)
-        return guard.respond({"orderId": trade.order.orderId, "status": trade.orderStatus.status}, 200)
+        d = request.json or {}
+        try:
+            contract = build_order_contract(d)
+            order = build_order(d)
+            wait_seconds = min(float(d.get('waitSeconds') or (10.0 if d.get('wait') else 0.0)), BRIDGE_ORDER_WAIT_MAX)
+        except (KeyError, TypeError, ValueError) as exc:
+            return guard.error(400, "invalid-order", detail=str(exc))
+        err = qualify_order_contracts([contract], IB_CONTRACT_QUALIFY_TIMEOUT)
+        if err:
+            return guard.error(500, err)
+        if not getattr(contract, "conId", None):
+            return guard.error(400, "unqualified-contract")
+        placed, err = place_orders([(contract, order)], IB_ORDERS_TIMEOUT)
+        if err:
+            return guard.error(500, "place-failed", detail=err)
+        trade, place_err = placed[0]
+        if place_err:
+            return guard.error(500, "place-failed", detail=place_err)
+        guard.release_lock()
+        if wait_seconds <= 0:
+            return guard.respond(order_placement_result(trade), 200)
+        start = time.time()
+        with trace_span("order.wait"):
+            acked = wait_for_order_status(trade, ORDER_ACK_STATES, wait_seconds)
+        return guard.respond(order_placement_result(trade, int((time.time() - start) * 1000), not acked), 200)
+
+@app.route('/orders/stream')
+def stream_orders():
+    # Server-sent events: one "order" event per openOrder/orderStatus update.
+    # With orderId/permId the stream ends once that order is done.
+    if not wait_for_connection(5.0):
+        return jsonify({"error": "Bridge busy", "reason": "not-ready"}), 503
+    try:
+        order_id = int(request.args['orderId']) if request.args.get('orderId') else None
+        perm_id = int(request.args['permId']) if request.args.get('permId') else None
+    except ValueError:
+        return jsonify({"error": "invalid-order-id"}), 400
+    try:
+        max_seconds = float(request.args.get('maxSeconds') or BRIDGE_ORDER_STREAM_MAX_SECONDS)
+    except ValueError:
+        max_seconds = float('nan')
+    if not max_seconds > 0:
+        return jsonify({"error": "invalid-maxSeconds"}), 400
+    max_seconds = min(max_seconds, BRIDGE_ORDER_STREAM_MAX_SECONDS)
+    single = order_id is not None or perm_id is not None
+
+    def matches(row):
+        if order_id is None and perm_id is None:
+            return True
+        return (order_id is not None and row.get("orderId") == order_id) or (perm_id is not None and row.get("permId") == perm_id)
+
+    def events():
+        # Subscribed only once the body is iterated, so the finally below
+        # always runs; subscribing before the snapshot misses no update.
+        q = subscribe_order_stream()
+        try:
+            inc_counter("bridge_order_streams_total")
+            deadline = time.time() + max_seconds
+            initial = find_order_trade(order_id, perm_id) if single else None
+            # Flush headers immediately so clients (and proxies) see the stream open.
+            yield "retry: 3000\n\n"
+            if initial is not None:
+                row = build_order_row(initial)
+                yield f"event: order\ndata: {app.json.dumps(row)}\n\n"
+                if row.get("status") in ORDER_DONE_STATES:
+                    yield "event: end\ndata: {}\n\n"
+                    return
+            while time.time() < deadline:
+                try:
+                    row = q.get(timeout=min(BRIDGE_ORDER_STREAM_KEEPALIVE, max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if not matches(row):
+                    continue
+                yield f"event: order\ndata: {app.json.dumps(row)}\n\n"
+                if single and row.get("status") in ORDER_DONE_STATES:
+                    yield "event: end\ndata: {}\n\n"
+                    return
+        finally:
+            unsubscribe_order_stream(q)
+
+    return app.response_class(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/orders/batch', methods=['POST'])
+def place_order_batch():
+    with BridgeGuard("orders-batch", group="orders", timeout=5.0) as guard:
+        if not guard.ok:
+            return guard.response
+        d = request.json or {}
+        legs = d.get('orders') or []
+        if not legs:
+            return guard.error(400, "missing-orders")
+        if len(legs) > BRIDGE_ORDER_BATCH_MAX:
+            return guard.error(400, "too-many-orders", detail=f"max {BRIDGE_ORDER_BATCH_MAX}")
+        uid = d.get('uid')
+        try:
+            contracts = [build_order_contract(leg) for leg in legs]
+            if d.get('combo'):
+                for leg in legs:
+                    if leg.get('action') not in ('BUY', 'SELL'):
+                        raise ValueError(f"invalid leg action: {leg.get('action')}")
+                    leg_ratio(leg)
+                combo_order = build_order(d, uid=uid)
+            else:
+                orders = [build_order(leg, uid=uid) for leg in legs]
+        except (KeyError, TypeError, ValueError) as exc:
+            return guard.error(400, "invalid-order", detail=str(exc))
+
+        err = qualify_order_contracts(contracts, IB_CONTRACT_QUALIFY_TIMEOUT)
+        if err:
+            return guard.error(500, err)
+        # All or nothing: placing the other legs of a roll without the one
+        # that failed to qualify would leave a half-open position.
+        unqualified = [i for i, c in enumerate(contracts) if not getattr(c, "conId", None)]
+        if unqualified:
+            return guard.error(400, "unqualified-legs", legs=unqualified)
+
+        if d.get('combo'):
+            try:
+                combo = build_combo_contract(list(zip(contracts, legs)))
+            except ValueError as exc:
+                return guard.error(400, "invalid-order", detail=str(exc))
+            placed, err = place_orders([(combo, combo_order)], IB_ORDERS_TIMEOUT)
+            if err:
+                return guard.error(500, "place-failed", detail=err)
+            trade, place_err = placed[0]
+            result = order_result(trade, error=place_err, legs=[
+                {"index": i, "conId": c.conId, "localSymbol": getattr(c, "localSymbol", None), "action": leg['action'], "ratio": leg_ratio(leg)}
+                for i, (c, leg) in enumerate(zip(contracts, legs))
+            ])
+            return guard.respond({"combo": True, "results": [result], "count": 1, "placed": 0 if place_err else 1, "failed": 1 if place_err else 0}, 200)
+
+        placed, err = place_orders(list(zip(contracts, orders)), IB_ORDERS_TIMEOUT)
+        if err:
+            return guard.error(500, "place-failed", detail=err)
+        results = [order_result(trade, index=i, error=place_err) for i, (trade, place_err) in enumerate(placed)]
+        failed = sum(1 for row in results if row.get("error"))
+        return guard.respond({"combo": False, "results": results, "count": len(results), "placed": len(results) - failed, "failed": failed}, 200)
+
+@app.route('/orders/cancel-all', methods=['POST'])
+def cancel_all_orders():
+    with BridgeGuard("orders-cancel-all", group=None, timeout=IB_ORDERS_TIMEOUT) as guard:
+        if not guard.ok:
+            return guard.response
+        symbol = request.args.get('symbol') or (request.get_json(silent=True) or {}).get('symbol')
+        if not symbol:
+            return guard.error(400, "missing-symbol")
+        trades = open_trades_for_symbol(symbol)
+        if not trades:
+            return guard.respond({"symbol": symbol.upper(), "results": [], "count": 0, "cancelled": 0, "failed": 0}, 200)
+        errors, err = cancel_trades(trades, IB_ORDERS_TIMEOUT)
+        if err:
+            return guard.error(500, "cancel-failed", detail=err)
+        results = [order_result(trade, error=cancel_err) for trade, cancel_err in zip(trades, errors)]
+        failed = sum(1 for row in results if row.get("error"))
+        return guard.respond({"symbol": symbol.upper(), "results": results, "count": len(results), "cancelled": len(results) - failed, "failed": failed}, 200)
 
 @app.route('/order/cancel', methods=['POST'])
 def cancel_order():
-    with BridgeGuard("order-cancel", group="orders", timeout=IB_ORDERS_TIMEOUT) as guard:
+    with BridgeGuard("order-cancel", group=None, timeout=IB_ORDERS_TIMEOUT) as guard:
         if not guard.ok:
             return guard.response
         d = request.json or {}
@@ -1287,59 +4273,24 @@ def cancel_order():
             return guard.error(400, "missing-order-id")
 
         _ib = get_ib_instance()
-        if not get_loop():
-            update_diag(lastOrdersAt=now_iso(), lastOrdersError="no-loop")
-            return guard.error(500, "no-loop")
-
-        f, err = submit_ib_call(_ib.reqOpenOrdersAsync, invoke_timeout=IB_ORDERS_TIMEOUT)
-        if err:
-            update_diag(lastOrdersAt=now_iso(), lastOrdersError=err)
-            return guard.error(500, f"orders-submit-failed: {err}")
-        res, err = wait_for_future(f, IB_ORDERS_TIMEOUT)
-        if err:
-            update_diag(lastOrdersAt=now_iso(), lastOrdersError=err)
-            return guard.error(500, err)
-
-        trades = res if res is not None else []
-        match = None
-        for trade in trades:
-            try:
-                order = trade.order
-            except Exception:
-                continue
-            oid = getattr(order, "orderId", None)
-            pid = getattr(order, "permId", None)
-            if order_id is not None and oid == order_id:
-                match = trade
-                break
-            if perm_id is not None and pid == perm_id:
-                match = trade
-                break
-
+        match = find_order_trade(order_id, perm_id)
         if not match:
             if order_id is not None:
-                try:
-                    _ib.client.cancelOrder(order_id)
-                    with data_lock:
-                        orders_cache.pop("orders", None)
-                    return guard.respond({
-                        "orderId": order_id,
-                        "permId": perm_id,
-                        "status": "CancelRequested",
-                        "message": "cancel sent by orderId"
-                    }, 200)
-                except Exception as exc:
-                    return guard.error(404, "order-not-found", detail=str(exc))
+                _, err = run_on_ib_loop(_ib.client.cancelOrder, order_id)
+                if err:
+                    return guard.error(404, "order-not-found", detail=err)
+                return guard.respond({
+                    "orderId": order_id,
+                    "permId": perm_id,
+                    "status": "CancelRequested",
+                    "message": "cancel sent by orderId"
+                }, 200)
             return guard.error(404, "order-not-found")
 
         order = match.order
-        try:
-            _ib.cancelOrder(order)
-        except Exception as exc:
-            return guard.error(500, "cancel-failed", detail=str(exc))
-
-        with data_lock:
-            orders_cache.pop("orders", None)
+        _, err = run_on_ib_loop(_ib.cancelOrder, order)
+        if err:
+            return guard.error(500, "cancel-failed", detail=err)
 
         status = getattr(match.orderStatus, "status", None) or "CancelRequested"
         return guard.respond({
@@ -1351,49 +4302,46 @@ def cancel_order():
 
 @app.route('/executions')
 def get_executions():
-    with BridgeGuard("executions", group="executions", timeout=IB_EXECUTIONS_TIMEOUT) as guard:
-        if not guard.ok:
+    with BridgeGuard("executions", group=None, timeout=IB_EXECUTIONS_TIMEOUT) as guard:
+        try:
             days = float(request.args.get('lookbackDays', 7))
-            cache_key = f"executions:{days}"
-            cached, age = cache_read(executions_cache, cache_key, IB_EXECUTIONS_CACHE_TTL)
-            if cached:
-                log_ctx(logging.WARNING, "serving cached executions", age=age, lookbackDays=days)
-                return guard.respond(cached, 200)
-            return guard.response
-        _ib = get_ib_instance()
-        days = float(request.args.get('lookbackDays', 7))
-        filt = ExecutionFilter(time=(datetime.utcnow() - timedelta(days=days)).strftime('%Y%m%d %H:%M:%S UTC'))
-        if not get_loop():
-            return guard.error(500, "no-loop")
-        f, err = submit_ib_call(_ib.reqExecutionsAsync, filt, invoke_timeout=IB_EXECUTIONS_TIMEOUT)
-        if err:
-            return guard.error(500, f"executions-submit-failed: {err}")
-        res, err = wait_for_future(f, IB_EXECUTIONS_TIMEOUT)
-        if err:
-            return guard.error(500, err)
-        results = [{
-            "execId": e.execution.execId,
-            "symbol": e.contract.symbol,
-            "side": e.execution.side,
-            "shares": e.execution.shares,
-            "price": e.execution.price,
-            "commission": safe_number(getattr(getattr(e, "commissionReport", None), "commission", None)),
-            "time": str(e.execution.time),
-            "orderRef": e.execution.orderRef,
-            "secType": getattr(e.contract, "secType", None),
-            "right": getattr(e.contract, "right", None),
-            "strike": getattr(e.contract, "strike", None),
-            "expiration": getattr(e.contract, "lastTradeDateOrContractMonth", None),
-            "localSymbol": getattr(e.contract, "localSymbol", None),
-            "conId": getattr(e.contract, "conId", None),
-            "multiplier": getattr(e.contract, "multiplier", None),
-        } for e in res]
-        payload = {"executions": results, "count": len(results)}
-        cache_write(executions_cache, f"executions:{days}", payload)
+        except ValueError:
+            return guard.error(400, "invalid-lookbackDays")
+        start_ts = time.time() - days * 86400
+        since_time = parse_time_arg(request.args.get('sinceTime') or request.args.get('since'))
+        if since_time is not None:
+            # Inclusive and floored to the second: IB stamps fills with whole
+            # seconds, and callers de-duplicate by execId.
+            start_ts = math.floor(since_time)
+        since_exec_id = request.args.get('sinceExecId') or None
+        since_seq = parse_since_version(request.args.get('sinceCursor'))
+        if not guard.ok:
+            if execution_store.size():
+                log_ctx(logging.WARNING, "serving stored executions", lookbackDays=days)
+            else:
+                return guard.response
+        elif not execution_store.covers(start_ts):
+            f, err = backfill_execution_store(start_ts)
+            if err:
+                return guard.error(500, f"executions-submit-failed: {err}")
+            fills, err = wait_for_future(f, IB_EXECUTIONS_TIMEOUT)
+            if err:
+                return guard.error(500, err)
+            merge_execution_fills(fills, start_ts)
+        rows, cursor, cursor_found = execution_store.query(start_ts, since_exec_id, since_seq)
+        payload = {"executions": rows, "count": len(rows), "cursor": cursor, "latestExecId": execution_store.latest_exec_id}
+        if not cursor_found:
+            payload["cursorReset"] = True
         return guard.respond(payload, 200)
 
 @app.route('/orders')
 def get_orders():
+    since_version = parse_since_version(request.args.get('sinceVersion'))
+    if orders_book.ready:
+        with BridgeGuard("orders", group=None, timeout=2.0) as guard:
+            if not guard.ok:
+                return guard.response
+            return respond_from_book(guard, orders_book, "orders", since_version)
     with BridgeGuard("orders", group="orders", timeout=IB_ORDERS_TIMEOUT) as guard:
         if not guard.ok:
             cached, age = cache_read(orders_cache, "orders", IB_ORDERS_CACHE_TTL)
@@ -1419,39 +4367,9 @@ def get_orders():
         results = []
         for trade in trades:
             try:
-                order = trade.order
-                status = trade.orderStatus
-                contract = trade.contract
-                order_state = getattr(trade, "orderState", None)
+                results.append(build_order_row(trade))
             except Exception:
                 continue
-            results.append({
-                "orderId": getattr(order, "orderId", None),
-                "permId": getattr(order, "permId", None),
-                "status": getattr(status, "status", None),
-                "action": getattr(order, "action", None),
-                "orderType": getattr(order, "orderType", None),
-                "lmtPrice": safe_value(getattr(order, "lmtPrice", None)),
-                "auxPrice": safe_value(getattr(order, "auxPrice", None)),
-                "totalQuantity": safe_value(getattr(order, "totalQuantity", None)),
-                "remaining": safe_value(getattr(status, "remaining", None)),
-                "filled": safe_value(getattr(status, "filled", None)),
-                "avgFillPrice": safe_value(getattr(status, "avgFillPrice", None)),
-                "tif": getattr(order, "tif", None),
-                "account": getattr(status, "account", None),
-                "orderRef": getattr(order, "orderRef", None),
-                "initMarginChange": safe_number(getattr(order_state, "initMarginChange", None)),
-                "symbol": getattr(contract, "symbol", None),
-                "secType": getattr(contract, "secType", None),
-                "right": getattr(contract, "right", None),
-                "strike": safe_value(getattr(contract, "strike", None)),
-                "expiration": getattr(contract, "lastTradeDateOrContractMonth", None),
-                "localSymbol": getattr(contract, "localSymbol", None),
-                "conId": getattr(contract, "conId", None),
-                "multiplier": safe_value(getattr(contract, "multiplier", None)),
-                "currency": getattr(contract, "currency", None),
-                "exchange": getattr(contract, "exchange", None)
-            })
 
         duration_ms = int((time.time() - start) * 1000)
         update_diag(
@@ -1466,9 +4384,15 @@ def get_orders():
 
 @app.route('/positions')
 def get_positions():
+    since_version = parse_since_version(request.args.get('sinceVersion'))
+    if positions_book.ready:
+        with BridgeGuard("positions", group=None, timeout=2.0) as guard:
+            if not guard.ok:
+                return guard.response
+            return respond_from_book(guard, positions_book, "positions", since_version)
     with BridgeGuard("positions", group="portfolio", timeout=2.0) as guard:
         if not guard.ok:
-            cached, age = cache_read(positions_cache, "positions", IB_PORTFOLIO_CACHE_TTL)
+            cached, age = cache_read(positions_cache, "positions", session_ttl(IB_PORTFOLIO_CACHE_TTL))
             if cached:
                 log_ctx(logging.WARNING, "serving cached positions", age=age)
                 return guard.respond(cached, 200)
@@ -1480,25 +4404,14 @@ def get_positions():
             update_diag(lastPositionsAt=now_iso(), lastPositionsError=str(exc))
             return guard.error(500, "positions-failed", detail=str(exc))
         duration_ms = int((time.time() - start) * 1000)
-        epoch = get_current_epoch()
+        named = [p.contract for p in pos if needs_company_name(p.contract)]
+        names = {}
+        for contract in named:
+            names[contract_cache_key(contract)] = cached_company_name(contract)
+        schedule_company_names([c for c in named if not names.get(contract_cache_key(c))])
         payload = {
             "positions": [
-                {
-                    "account": p.account,
-                    "symbol": p.contract.symbol,
-                    "quantity": p.position,
-                    "avgCost": p.avgCost,
-                    "secType": getattr(p.contract, "secType", None),
-                    "right": getattr(p.contract, "right", None),
-                    "strike": getattr(p.contract, "strike", None),
-                    "expiration": getattr(p.contract, "lastTradeDateOrContractMonth", None),
-                    "localSymbol": getattr(p.contract, "localSymbol", None),
-                    "conId": getattr(p.contract, "conId", None),
-                    "multiplier": getattr(p.contract, "multiplier", None),
-                    "companyName": fetch_contract_company_name(p.contract, IB_CONTRACT_DETAILS_TIMEOUT, epoch)
-                        if getattr(p.contract, "secType", None) in ("STK", "ETF")
-                        else None,
-                }
+                build_position_row(p, company_name=names.get(contract_cache_key(p.contract)))
                 for p in pos
             ],
             "count": len(pos)
@@ -1509,14 +4422,20 @@ def get_positions():
             lastPositionsCount=len(pos),
             lastPositionsError=None
         )
-        cache_write(positions_cache, "positions", payload)
+        cache_write(positions_cache, "positions", payload, expires_at=session_expires_at())
         return guard.respond(payload, 200)
 
 @app.route('/portfolio')
 def get_portfolio():
+    since_version = parse_since_version(request.args.get('sinceVersion'))
+    if portfolio_book.ready:
+        with BridgeGuard("portfolio", group=None, timeout=2.0) as guard:
+            if not guard.ok:
+                return guard.response
+            return respond_from_book(guard, portfolio_book, "positions", since_version)
     with BridgeGuard("portfolio", group="portfolio", timeout=5.0) as guard:
         if not guard.ok:
-            cached, age = cache_read(positions_cache, "portfolio", IB_PORTFOLIO_CACHE_TTL)
+            cached, age = cache_read(positions_cache, "portfolio", session_ttl(IB_PORTFOLIO_CACHE_TTL))
             if cached:
                 log_ctx(logging.WARNING, "serving cached portfolio", age=age)
                 return guard.respond(cached, 200)
@@ -1531,26 +4450,7 @@ def get_portfolio():
         duration_ms = int((time.time() - start) * 1000)
         
         payload = {
-            "positions": [
-                {
-                    "account": p.account,
-                    "symbol": p.contract.symbol,
-                    "quantity": p.position,
-                    "avgCost": p.averageCost,
-                    "marketPrice": p.marketPrice,
-                    "marketValue": p.marketValue,
-                    "realizedPnl": p.realizedPNL,
-                    "unrealizedPnl": p.unrealizedPNL,
-                    "secType": getattr(p.contract, "secType", None),
-                    "right": getattr(p.contract, "right", None),
-                    "strike": getattr(p.contract, "strike", None),
-                    "expiration": getattr(p.contract, "lastTradeDateOrContractMonth", None),
-                    "localSymbol": getattr(p.contract, "localSymbol", None),
-                    "conId": getattr(p.contract, "conId", None),
-                    "multiplier": getattr(p.contract, "multiplier", None),
-                }
-                for p in port
-            ],
+            "positions": [build_portfolio_row(p) for p in port],
             "count": len(port)
         }
         
@@ -1559,140 +4459,134 @@ def get_portfolio():
             lastPortfolioMs=duration_ms,
             lastPortfolioCount=len(port)
         )
-        cache_write(positions_cache, "portfolio", payload)
+        cache_write(positions_cache, "portfolio", payload, expires_at=session_expires_at())
         return guard.respond(payload, 200)
 
 @app.route('/account-summary')
 def get_account_summary():
-    with BridgeGuard("account-summary", group="portfolio", timeout=2.0) as guard:
+    with BridgeGuard("account-summary", group=None, timeout=2.0) as guard:
+        account = request.args.get('account') or None
         if not guard.ok:
-            cached, age = cache_read(account_summary_cache, "account-summary", IB_PORTFOLIO_CACHE_TTL)
-            if cached:
-                log_ctx(logging.WARNING, "serving cached account summary", age=age)
-                return guard.respond(cached, 200)
+            payload = build_account_summary_payload(account)
+            if payload:
+                log_ctx(logging.WARNING, "serving stale account summary", asOf=payload["asOf"])
+                return guard.respond(payload, 200)
             return guard.response
-        start = time.time()
-        summ, err = fetch_account_summary(IB_ACCOUNT_SUMMARY_TIMEOUT)
-        duration_ms = int((time.time() - start) * 1000)
-        if err:
-            update_diag(lastAccountSummaryAt=now_iso(), lastAccountSummaryMs=duration_ms, lastAccountSummaryError=str(err))
-            return guard.error(500, "account-summary-failed", detail=str(err))
-        if summ is None:
-            update_diag(lastAccountSummaryAt=now_iso(), lastAccountSummaryMs=duration_ms, lastAccountSummaryError="empty")
+        if not account_summary_ready.is_set():
+            start_account_summary_stream()
+            account_summary_ready.wait(IB_ACCOUNT_SUMMARY_TIMEOUT)
+        payload = build_account_summary_payload(account)
+        if payload is None:
             return guard.error(500, "account-summary-empty")
-        allowed_tags = (
-            'NetLiquidation',
-            'TotalCashValue',
-            'BuyingPower',
-            'AvailableFunds',
-            'ExcessLiquidity',
-            'DailyPnL',
-            'RealizedPnL',
-            'UnrealizedPnL',
-            'AccountCode'
-        )
-        base_currency_tags = ('NetLiquidation', 'DailyPnL', 'RealizedPnL', 'UnrealizedPnL')
-        payload = {}
-        for s in summ:
-            if s.tag not in allowed_tags:
-                continue
-            
-            # AccountCode is a string, handle separately
-            if s.tag == 'AccountCode':
-                payload[s.tag] = str(s.value)
-                continue
-
-            currency = (s.currency or '').strip().upper()
-            is_usd = currency == 'USD'
-            is_base = currency in ('', 'BASE')
-            if not (is_usd or (is_base and s.tag in base_currency_tags)):
-                continue
-            payload[s.tag] = safe_number(s.value)
-        
-        update_diag(lastAccountSummaryAt=now_iso(), lastAccountSummaryMs=duration_ms, lastAccountSummaryCount=len(payload))
-        cache_write(account_summary_cache, "account-summary", payload)
         return guard.respond(payload, 200)
 
+def pnl_request_params():
+    account = request.args.get('account') or default_pnl_account()
+    model = request.args.get('model') or ''
+    return account, model
+
 @app.route('/pnl')
 def get_pnl():
-    with BridgeGuard("pnl", group="portfolio", timeout=5.0) as guard:
+    with BridgeGuard("pnl", group=None, timeout=5.0) as guard:
         if not guard.ok:
             return guard.response
-        acc = request.args.get('account') or ''
-        model = request.args.get('model') or ''
-        
-        cache_key = f"acc:{acc}:mod:{model}"
-        cached, age = cache_read(pnl_cache, cache_key, 5.0) # 5s TTL
-        if cached:
-            return guard.respond(cached, 200)
-
-        _ib = get_ib_instance()
-        pnl = _ib.reqPnL(acc, model)
-        
-        # Wait for update
-        start = time.time()
-        while time.time() - start < 3.0:
-            if pnl.dailyPnL is not None or pnl.unrealizedPnL is not None:
-                break
-            time.sleep(0.1)
-        
-        res = {
-            "dailyPnL": safe_value(pnl.dailyPnL),
-            "unrealizedPnL": safe_value(pnl.unrealizedPnL),
-            "realizedPnL": safe_value(pnl.realizedPnL),
-            "value": safe_value(pnl.value)
-        }
-        _ib.cancelPnL(acc, model)
-        cache_write(pnl_cache, cache_key, res)
-        return guard.respond(res, 200)
+        acc, model = pnl_request_params()
+        entry = pnl_manager.ensure(acc, model)
+        pnl_manager.wait([entry], BRIDGE_PNL_FIRST_UPDATE_TIMEOUT)
+        return guard.respond(entry.payload(), 200)
 
 @app.route('/pnl-single')
 def get_pnl_single():
-    with BridgeGuard("pnl-single", group="portfolio", timeout=5.0) as guard:
+    with BridgeGuard("pnl-single", group=None, timeout=5.0) as guard:
         if not guard.ok:
             return guard.response
-        acc = request.args.get('account') or ''
-        model = request.args.get('model') or ''
+        acc, model = pnl_request_params()
         con_id = request.args.get('conId')
         if not con_id:
             return guard.error(400, "missing-conId")
-        
-        cache_key = f"acc:{acc}:mod:{model}:con:{con_id}"
-        cached, age = cache_read(pnl_cache, cache_key, 5.0) # 5s TTL
-        if cached:
-            return guard.respond(cached, 200)
+        try:
+            con_id = int(con_id)
+        except ValueError:
+            return guard.error(400, "invalid-conId")
+        entry = pnl_manager.ensure(acc, model, con_id)
+        pnl_manager.wait([entry], BRIDGE_PNL_FIRST_UPDATE_TIMEOUT)
+        return guard.respond(entry.payload(), 200)
 
-        _ib = get_ib_instance()
-        pnl = _ib.reqPnLSingle(acc, model, int(con_id))
-        
-        # Wait for update
-        start = time.time()
-        while time.time() - start < 3.0:
-            if pnl.dailyPnL is not None or pnl.unrealizedPnL is not None:
-                break
-            time.sleep(0.1)
-            
-        res = {
-            "dailyPnL": safe_value(pnl.dailyPnL),
-            "unrealizedPnL": safe_value(pnl.unrealizedPnL),
-            "realizedPnL": safe_value(pnl.realizedPnL),
-            "value": safe_value(pnl.value),
-            "marketValue": safe_value(pnl.marketValue)
-        }
-        _ib.cancelPnLSingle(acc, model, int(con_id))
-        cache_write(pnl_cache, cache_key, res)
-        return guard.respond(res, 200)
+@app.route('/pnl-single/batch')
+def get_pnl_single_batch():
+    with BridgeGuard("pnl-single-batch", group=None, timeout=5.0) as guard:
+        if not guard.ok:
+            return guard.response
+        acc, model = pnl_request_params()
+        raw = request.args.get('conIds')
+        if raw:
+            try:
+                con_ids = list(dict.fromkeys(int(c) for c in raw.split(',') if c.strip()))
+            except ValueError:
+                return guard.error(400, "invalid-conIds")
+        else:
+            con_ids = pnl_manager.held_con_ids(acc, model)
+        if len(con_ids) > BRIDGE_PNL_MAX_SUBSCRIPTIONS:
+            return guard.error(400, "too-many-conIds", detail=f"max {BRIDGE_PNL_MAX_SUBSCRIPTIONS}")
+        entries = [pnl_manager.ensure(acc, model, con_id) for con_id in con_ids]
+        pnl_manager.wait(entries, BRIDGE_PNL_FIRST_UPDATE_TIMEOUT)
+        results = [entry.payload() for entry in entries]
+        return guard.respond({
+            "account": acc,
+            "model": model,
+            "count": len(results),
+            "results": results,
+            "missing": [row["conId"] for row in results if row["asOf"] is None]
+        }, 200)
+
+def parse_time_arg(raw):
+    if raw in (None, ''):
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
 
 @app.route('/diag/logs')
 def get_logs():
-    limit = int(request.args.get('limit', 100))
-    # This is a bit hacky but useful for remote debugging
-    # We'll just return the last N lines of the log file if we can find it
-    # For now, return diag state as a proxy
-    return diag()
+    limit = parse_limit(request.args.get('limit'), 100, maximum=log_buffer_handler.records.maxlen)
+    level_name = (request.args.get('level') or '').upper()
+    min_level = getattr(logging, level_name, logging.NOTSET) if level_name else logging.NOTSET
+    since = parse_time_arg(request.args.get('since'))
+    window = safe_number(request.args.get('windowSeconds'))
+    if window:
+        since = max(since or 0.0, time.time() - window)
+    entries, size = log_buffer_handler.query(
+        limit,
+        min_level=min_level if isinstance(min_level, int) else logging.NOTSET,
+        request_id=request.args.get('requestId'),
+        route=request.args.get('route'),
+        since=since,
+        until=parse_time_arg(request.args.get('until'))
+    )
+    return jsonify({
+        "timestamp": now_iso(),
+        "capacity": log_buffer_handler.records.maxlen,
+        "buffered": size,
+        "count": len(entries),
+        "logs": entries
+    })
 
 if __name__ == '__main__':
+    load_contract_details_cache(BRIDGE_CONTRACT_DETAILS_CACHE_PATH)
+    load_execution_store(BRIDGE_EXECUTIONS_STORE_PATH)
     threading.Thread(target=loop_driver, daemon=True).start()
     threading.Thread(target=connection_monitor, daemon=True).start()
-    threading.Thread(target=webhook_worker, daemon=True).start()
+    threading.Thread(target=webhook_dispatcher, daemon=True).start()
+    threading.Thread(target=company_name_worker, daemon=True).start()
+    threading.Thread(target=execution_store_writer, daemon=True).start()
+    if BRIDGE_WARMUP_ENABLED:
+        threading.Thread(target=warmup_worker, daemon=True).start()
     app.run(host='0.0.0.0', port=5050, debug=False)
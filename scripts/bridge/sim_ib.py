@@ -0,0 +1,740 @@
+"""Simulated IB Gateway for offline load and soak testing of ibkr_bridge.
+
+ibkr_bridge.py builds a SimulatedIB instead of ib_insync.IB when
+IB_BACKEND=sim. It implements the slice of the IB API the bridge calls, runs
+on the bridge's own event loop and answers with synthetic tickers, option
+chains, bars, orders and executions. Latencies come from a seeded RNG so a
+run can be repeated, and failures (timeouts, disconnects, IB error codes,
+historical pacing) are injected at configurable rates.
+
+Gateway-side state (orders, positions, fills) survives a reconnect, while
+subscriptions (tickers, PnL, account summary) are dropped, as with the
+real Gateway.
+"""
+import asyncio
+import collections
+import itertools
+import math
+import os
+import random
+import zlib
+from datetime import date, datetime, timedelta, timezone
+
+from eventkit import Event
+from ib_insync import (
+    AccountValue, BarData, CommissionReport, ContractDetails, Execution, Fill,
+    OptionChain, OptionComputation, OrderStatus, PnL, PnLSingle, PortfolioItem,
+    Position, Stock, Ticker, Trade, TradeLogEntry
+)
+
+DONE_STATES = ('Filled', 'Cancelled', 'ApiCancelled', 'Inactive')
+INDEX_SYMBOLS = ('SPX', 'NDX', 'RUT', 'VIX', 'VIXW')
+
+# Error each request type answers with when error injection fires.
+INJECTED_ERRORS = {
+    'reqTickersAsync': (10197, "No market data during competing live session"),
+    'reqHistoricalDataAsync': (162, "Historical Market Data Service error message:API historical data query cancelled"),
+    'reqSecDefOptParamsAsync': (321, "Error validating request.-'bW' : cause - Invalid underlying conId"),
+    'reqContractDetailsAsync': (200, "No security definition has been found for the request"),
+    'qualifyContractsAsync': (200, "No security definition has been found for the request"),
+}
+DEFAULT_INJECTED_ERROR = (322, "Error processing request.-'cA' : cause - Duplicate ticker id")
+PACING_ERROR = (162, "Historical Market Data Service error message:Historical data request pacing violation")
+
+DURATION_UNITS = {'S': 1, 'D': 86400, 'W': 7 * 86400, 'M': 30 * 86400, 'Y': 365 * 86400}
+BAR_UNITS = {'sec': 1, 'secs': 1, 'min': 60, 'mins': 60, 'hour': 3600, 'hours': 3600,
+             'day': 86400, 'days': 86400, 'week': 7 * 86400, 'month': 30 * 86400}
+
+ACCOUNT_TAGS = ('NetLiquidation', 'TotalCashValue', 'BuyingPower', 'AvailableFunds',
+                'ExcessLiquidity', 'GrossPositionValue', 'MaintMarginReq', 'InitMarginReq')
+
+
+def _env(name, default, cast=str):
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == '':
+        return default
+    try:
+        return cast(raw.strip())
+    except ValueError:
+        return default
+
+
+def _parse_pairs(raw, cast):
+    # "AAPL:100,MSFT:-50" or "reqTickersAsync=20,..."
+    pairs = {}
+    for item in (raw or '').split(','):
+        key, sep, value = item.replace('=', ':').partition(':')
+        if not sep or not key.strip():
+            continue
+        try:
+            pairs[key.strip()] = cast(value.strip())
+        except ValueError:
+            continue
+    return pairs
+
+
+def symbol_seed(*parts):
+    return zlib.crc32('|'.join(str(p) for p in parts).encode())
+
+
+def base_price(symbol):
+    return round(20.0 + (symbol_seed(symbol.upper()) % 48000) / 100.0, 2)
+
+
+def duration_seconds(duration):
+    try:
+        count, unit = duration.split()
+        return int(count) * DURATION_UNITS[unit.upper()[0]]
+    except (ValueError, KeyError, AttributeError):
+        return 86400
+
+
+def bar_seconds(bar_size):
+    try:
+        count, unit = bar_size.split()
+        return int(count) * BAR_UNITS[unit.lower()]
+    except (ValueError, KeyError, AttributeError):
+        return 60
+
+
+def _cdf(x):
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def option_model(und, strike, right, expiry, vol):
+    """Black-Scholes price and greeks with zero rates; good enough to look real."""
+    try:
+        exp = datetime.strptime(expiry[:8], '%Y%m%d')
+    except (TypeError, ValueError):
+        exp = datetime.now() + timedelta(days=30)
+    t = max((exp - datetime.now()).total_seconds() / (365 * 86400), 1.0 / 365)
+    sd = vol * math.sqrt(t)
+    d1 = (math.log(und / strike) + 0.5 * sd * sd) / sd
+    d2 = d1 - sd
+    pdf = math.exp(-0.5 * d1 * d1) / math.sqrt(2 * math.pi)
+    if right.upper().startswith('C'):
+        price = und * _cdf(d1) - strike * _cdf(d2)
+        delta = _cdf(d1)
+    else:
+        price = strike * _cdf(-d2) - und * _cdf(-d1)
+        delta = _cdf(d1) - 1.0
+    gamma = pdf / (und * sd)
+    vega = und * pdf * math.sqrt(t) / 100
+    theta = -und * pdf * vol / (2 * math.sqrt(t)) / 365
+    return max(price, 0.01), delta, gamma, vega, theta
+
+
+class SimConfig:
+    """Knobs for the simulated Gateway; every field maps to an IB_SIM_* env var."""
+
+    def __init__(self, seed=1, latency_ms=5.0, jitter_ms=2.0, latency_overrides=None,
+                 timeout_rate=0.0, error_rate=0.0, disconnect_every=0.0, pacing_limit=60,
+                 fill_delay_ms=50.0, tick_interval=0.25, account='DU0000001',
+                 positions=None, executions=20, unknown_symbols=('INVALID',), max_bars=2000):
+        self.seed = seed
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.latency_overrides = dict(latency_overrides or {})
+        self.timeout_rate = timeout_rate
+        self.error_rate = error_rate
+        self.disconnect_every = disconnect_every
+        self.pacing_limit = pacing_limit
+        self.fill_delay_ms = fill_delay_ms
+        self.tick_interval = tick_interval
+        self.account = account
+        self.positions = dict(positions if positions is not None else {'AAPL': 100, 'MSFT': -50})
+        self.executions = executions
+        self.unknown_symbols = tuple(s.upper() for s in unknown_symbols)
+        self.max_bars = max_bars
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            seed=_env('IB_SIM_SEED', 1, int),
+            latency_ms=_env('IB_SIM_LATENCY_MS', 5.0, float),
+            jitter_ms=_env('IB_SIM_JITTER_MS', 2.0, float),
+            latency_overrides=_parse_pairs(os.getenv('IB_SIM_LATENCY_OVERRIDES'), float),
+            timeout_rate=_env('IB_SIM_TIMEOUT_RATE', 0.0, float),
+            error_rate=_env('IB_SIM_ERROR_RATE', 0.0, float),
+            disconnect_every=_env('IB_SIM_DISCONNECT_EVERY', 0.0, float),
+            pacing_limit=_env('IB_SIM_PACING_LIMIT', 60, int),
+            fill_delay_ms=_env('IB_SIM_FILL_DELAY_MS', 50.0, float),
+            tick_interval=_env('IB_SIM_TICK_INTERVAL', 0.25, float),
+            account=_env('IB_SIM_ACCOUNT', 'DU0000001'),
+            positions=_parse_pairs(os.getenv('IB_SIM_POSITIONS', 'AAPL:100,MSFT:-50'), float),
+            executions=_env('IB_SIM_EXECUTIONS', 20, int),
+            unknown_symbols=tuple(s for s in _env('IB_SIM_UNKNOWN_SYMBOLS', 'INVALID').split(',') if s),
+            max_bars=_env('IB_SIM_MAX_BARS', 2000, int),
+        )
+
+    def latency(self, name, rng):
+        base = self.latency_overrides.get(name, self.latency_ms)
+        return max(0.0, base + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+
+class _SimClient:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def isReady(self):
+        return self.sim.connected
+
+    def serverVersion(self):
+        return 176
+
+    def cancelOrder(self, orderId, manualCancelOrderTime=''):
+        trade = self.sim.trades_by_id.get(orderId)
+        if trade is None:
+            self.sim._error(orderId, 10147, f"OrderId {orderId} that needs to be cancelled is not found.")
+            return
+        self.sim.cancelOrder(trade.order)
+
+
+class SimulatedIB:
+    """Drop-in for ib_insync.IB covering the calls ibkr_bridge makes."""
+
+    def __init__(self, config=None):
+        self.config = config or SimConfig()
+        self.rng = random.Random(self.config.seed)
+        self.client = _SimClient(self)
+        self.connected = False
+        self.client_id = 0
+        self.market_data_type = 1
+
+        self.errorEvent = Event('errorEvent')
+        self.connectedEvent = Event('connectedEvent')
+        self.disconnectedEvent = Event('disconnectedEvent')
+        self.pendingTickersEvent = Event('pendingTickersEvent')
+        self.openOrderEvent = Event('openOrderEvent')
+        self.orderStatusEvent = Event('orderStatusEvent')
+        self.execDetailsEvent = Event('execDetailsEvent')
+        self.commissionReportEvent = Event('commissionReportEvent')
+        self.positionEvent = Event('positionEvent')
+        self.updatePortfolioEvent = Event('updatePortfolioEvent')
+        self.pnlEvent = Event('pnlEvent')
+        self.pnlSingleEvent = Event('pnlSingleEvent')
+        self.accountSummaryEvent = Event('accountSummaryEvent')
+
+        self.req_ids = itertools.count(1)
+        self.order_ids = itertools.count(1)
+        self.perm_ids = itertools.count(900000001)
+        self.exec_ids = itertools.count(1)
+        self.prices = {}
+        self.contracts = {}
+        self.position_rows = {}
+        self.trades_by_id = {}
+        self.fills = []
+        self.historical_requests = collections.deque()
+
+        # Subscriptions; dropped on disconnect.
+        self.tickers = {}
+        self.pnl_subs = {}
+        self.pnl_single_subs = {}
+        self.account_summary_sub = False
+        self.pending = set()
+        self.tasks = []
+        self.stats = collections.Counter()
+        self._seed_account()
+
+    @classmethod
+    def from_env(cls):
+        return cls(SimConfig.from_env())
+
+    # --- Lifecycle ---
+
+    def run(self):
+        asyncio.get_event_loop().run_forever()
+
+    async def connectAsync(self, host='127.0.0.1', port=7497, clientId=1, timeout=4, readonly=False, account=''):
+        if self.connected:
+            raise ConnectionError('Already connected')
+        await asyncio.sleep(self.config.latency('connectAsync', self.rng))
+        self.connected = True
+        self.client_id = int(clientId)
+        loop = asyncio.get_event_loop()
+        self.tasks = [loop.create_task(self._tick_loop())]
+        if self.config.disconnect_every > 0:
+            self.tasks.append(loop.create_task(self._chaos_loop()))
+        for code, msg in ((2104, "Market data farm connection is OK:usfarm"),
+                          (2106, "HMDS data farm connection is OK:ushmds"),
+                          (2158, "Sec-def data farm connection is OK:secdefil")):
+            self._error(-1, code, msg)
+        self.connectedEvent.emit()
+        return self
+
+    def disconnect(self):
+        if not self.connected:
+            return
+        self.connected = False
+        self.stats['disconnects'] += 1
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        for fut in list(self.pending):
+            if not fut.done():
+                fut.set_exception(ConnectionError('Socket disconnect'))
+        self.pending.clear()
+        self.tickers.clear()
+        self.pnl_subs.clear()
+        self.pnl_single_subs.clear()
+        self.account_summary_sub = False
+        self.disconnectedEvent.emit()
+
+    def isConnected(self):
+        return self.connected
+
+    def managedAccounts(self):
+        return [self.config.account] if self.connected else []
+
+    def reqMarketDataType(self, marketDataType):
+        self.market_data_type = marketDataType
+
+    # --- Request plumbing ---
+
+    def _require_connection(self):
+        if not self.connected:
+            raise ConnectionError('Not connected')
+
+    def _error(self, req_id, code, msg, contract=None):
+        self.stats[f'error.{code}'] += 1
+        self.errorEvent.emit(req_id, code, msg, contract)
+
+    async def _wait(self, seconds):
+        # Tracked so a disconnect fails it like a dropped socket would.
+        loop = asyncio.get_event_loop()
+        fut = loop.create_future()
+        handle = loop.call_later(seconds, lambda: fut.done() or fut.set_result(None)) if seconds is not None else None
+        self.pending.add(fut)
+        try:
+            await fut
+        finally:
+            self.pending.discard(fut)
+            if handle:
+                handle.cancel()
+
+    async def _request(self, name, contract=None):
+        """Applies latency and injected faults; returns an (id, code, msg) error or None."""
+        self._require_connection()
+        self.stats[name] += 1
+        req_id = next(self.req_ids)
+        if self.config.timeout_rate and self.rng.random() < self.config.timeout_rate:
+            self.stats['timeouts'] += 1
+            await self._wait(None)
+        await self._wait(self.config.latency(name, self.rng))
+        if self.config.error_rate and self.rng.random() < self.config.error_rate:
+            code, msg = INJECTED_ERRORS.get(name, DEFAULT_INJECTED_ERROR)
+            self._error(req_id, code, msg, contract)
+            return req_id, code, msg
+        return None
+
+    # --- Reference data ---
+
+    def _qualify(self, contract):
+        symbol = (contract.symbol or '').upper()
+        if not symbol or symbol in self.config.unknown_symbols:
+            return False
+        if not contract.conId:
+            key = (symbol, contract.secType, contract.lastTradeDateOrContractMonth, contract.strike, contract.right)
+            contract.conId = 100000 + symbol_seed(*key) % 900000000
+        if contract.secType == 'OPT':
+            contract.multiplier = contract.multiplier or '100'
+            contract.tradingClass = contract.tradingClass or symbol
+            contract.localSymbol = contract.localSymbol or f"{symbol:<6}{contract.lastTradeDateOrContractMonth[2:8]}{contract.right[:1]}{int(contract.strike * 1000):08d}"
+        contract.primaryExchange = contract.primaryExchange or ('CBOE' if contract.secType == 'IND' else 'NASDAQ')
+        self.contracts[contract.conId] = contract
+        return True
+
+    async def qualifyContractsAsync(self, *contracts):
+        failure = await self._request('qualifyContractsAsync', contracts[0] if contracts else None)
+        qualified = []
+        for contract in contracts:
+            if failure is None and self._qualify(contract):
+                qualified.append(contract)
+            elif failure is None:
+                self._error(next(self.req_ids), 200, "No security definition has been found for the request", contract)
+        return qualified
+
+    async def reqContractDetailsAsync(self, contract):
+        if await self._request('reqContractDetailsAsync', contract) or not self._qualify(contract):
+            return []
+        return [ContractDetails(contract=contract, longName=f"{contract.symbol.upper()} Simulated Inc",
+                                minTick=0.01, underConId=contract.conId, timeZoneId='US/Eastern')]
+
+    async def reqSecDefOptParamsAsync(self, underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId):
+        if await self._request('reqSecDefOptParamsAsync'):
+            return []
+        symbol = underlyingSymbol.upper()
+        price = self._price(symbol)
+        step = 1.0 if price < 100 else 5.0 if price < 500 else 10.0
+        low, high = math.floor(price * 0.5 / step) * step, math.ceil(price * 1.5 / step) * step
+        strikes = [round(low + i * step, 2) for i in range(int((high - low) / step) + 1)]
+        today = date.today()
+        fridays = [today + timedelta(days=(4 - today.weekday()) % 7 + 7 * i) for i in range(8)]
+        monthlies = []
+        for months in range(1, 7):
+            first = date(today.year + (today.month - 1 + months) // 12, (today.month - 1 + months) % 12 + 1, 1)
+            monthlies.append(first + timedelta(days=(4 - first.weekday()) % 7 + 14))
+        expirations = sorted({d.strftime('%Y%m%d') for d in fridays + monthlies})
+        if symbol in INDEX_SYMBOLS:
+            # Index options list monthlies under the root and weeklies under <root>W.
+            classes = [(symbol, sorted(d.strftime('%Y%m%d') for d in monthlies)), (symbol + 'W', expirations)]
+        else:
+            classes = [(symbol, expirations)]
+        return [OptionChain(exchange, underlyingConId, trading_class, '100', exps, strikes)
+                for trading_class, exps in classes for exchange in ('SMART', 'CBOE')]
+
+    # --- Market data ---
+
+    def _price(self, symbol):
+        symbol = symbol.upper()
+        if symbol not in self.prices:
+            self.prices[symbol] = base_price(symbol)
+        return self.prices[symbol]
+
+    def _fill_ticker(self, ticker):
+        contract = ticker.contract
+        now = datetime.now(timezone.utc)
+        if contract.secType == 'OPT':
+            und = self._price(contract.symbol)
+            vol = 0.2 + (symbol_seed(contract.symbol) % 30) / 100.0
+            price, delta, gamma, vega, theta = option_model(und, contract.strike or und, contract.right or 'C',
+                                                            contract.lastTradeDateOrContractMonth, vol)
+            spread = max(0.01, round(price * 0.02, 2))
+            ticker.modelGreeks = OptionComputation(0, vol, delta, price, 0.0, gamma, vega, theta, und)
+            ticker.callOpenInterest = ticker.putOpenInterest = float(symbol_seed(contract.conId) % 5000)
+        else:
+            price = self._price(contract.symbol)
+            spread = max(0.01, round(price * 0.0005, 2))
+        ticker.time = now
+        ticker.marketDataType = self.market_data_type
+        ticker.last = round(price, 2)
+        ticker.close = round(price * 0.995, 2)
+        ticker.high = round(max(price, ticker.close) * 1.01, 2)
+        ticker.low = round(min(price, ticker.close) * 0.99, 2)
+        ticker.volume = float(symbol_seed(contract.symbol, now.hour) % 5000000)
+        if contract.secType != 'IND':
+            ticker.bid = round(price - spread / 2, 2)
+            ticker.ask = round(price + spread / 2, 2)
+            ticker.bidSize = ticker.askSize = 100.0
+        return ticker
+
+    async def reqTickersAsync(self, *contracts, regulatorySnapshot=False):
+        failure = await self._request('reqTickersAsync', contracts[0] if contracts else None)
+        tickers = []
+        for contract in contracts:
+            ticker = Ticker(contract=contract)
+            if failure is None and contract.symbol.upper() not in self.config.unknown_symbols:
+                self._fill_ticker(ticker)
+            tickers.append(ticker)
+        return tickers
+
+    def reqMktData(self, contract, genericTickList='', snapshot=False, regulatorySnapshot=False, mktDataOptions=None):
+        self._require_connection()
+        self.stats['reqMktData'] += 1
+        key = contract.conId or id(contract)
+        ticker = self.tickers.get(key)
+        if ticker is None:
+            ticker = self.tickers[key] = self._fill_ticker(Ticker(contract=contract))
+        return ticker
+
+    def cancelMktData(self, contract):
+        self.tickers.pop(contract.conId or id(contract), None)
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime='', durationStr='1 D', barSizeSetting='1 hour',
+                                     whatToShow='TRADES', useRTH=True, formatDate=1, keepUpToDate=False,
+                                     chartOptions=None, timeout=60):
+        if await self._request('reqHistoricalDataAsync', contract):
+            return []
+        now = asyncio.get_event_loop().time()
+        while self.historical_requests and now - self.historical_requests[0] > 600:
+            self.historical_requests.popleft()
+        if self.config.pacing_limit and len(self.historical_requests) >= self.config.pacing_limit:
+            self._error(next(self.req_ids), *PACING_ERROR, contract)
+            return []
+        self.historical_requests.append(now)
+
+        step = bar_seconds(barSizeSetting)
+        count = max(1, min(self.config.max_bars, duration_seconds(durationStr) // step))
+        # Seeded by contract and bar size so repeated requests see the same history.
+        rng = random.Random(symbol_seed(self.config.seed, contract.symbol, barSizeSetting))
+        end = endDateTime if isinstance(endDateTime, datetime) else datetime.now(timezone.utc)
+        end = end.replace(second=0, microsecond=0)
+        price = self._price(contract.symbol)
+        bars = []
+        # Walk back from the current price: each bar opens where the previous one closed.
+        for i in range(count):
+            close = price
+            open_ = max(0.01, close * (1 + rng.gauss(0, 0.0005 * math.sqrt(step / 60.0))))
+            stamp = end - timedelta(seconds=step * i)
+            bars.append(BarData(
+                date=stamp.date() if step >= 86400 else stamp,
+                open=round(open_, 2), high=round(max(open_, close) * 1.001, 2),
+                low=round(min(open_, close) * 0.999, 2), close=round(close, 2),
+                volume=float(rng.randint(1000, 100000)), average=round((open_ + close) / 2, 2),
+                barCount=rng.randint(10, 500)))
+            price = open_
+        bars.reverse()
+        return bars
+
+    async def reqCurrentTimeAsync(self):
+        await self._request('reqCurrentTimeAsync')
+        return datetime.now(timezone.utc)
+
+    # --- Account ---
+
+    def _seed_account(self):
+        self.cash = 100000.0
+        self.realized = 0.0
+        for symbol, quantity in self.config.positions.items():
+            contract = Stock(symbol.upper(), 'SMART', 'USD')
+            self._qualify(contract)
+            self.position_rows[contract.conId] = Position(self.config.account, contract, float(quantity), base_price(symbol))
+        start = datetime.now(timezone.utc) - timedelta(days=5)
+        symbols = list(self.config.positions) or ['AAPL']
+        for i in range(self.config.executions):
+            contract = self._stock(symbols[i % len(symbols)])
+            self._record_fill(contract, 'BOT' if i % 2 == 0 else 'SLD', 10.0, base_price(contract.symbol),
+                              start + timedelta(minutes=37 * i), order_id=0, perm_id=next(self.perm_ids))
+
+    def _stock(self, symbol):
+        contract = Stock(symbol.upper(), 'SMART', 'USD')
+        self._qualify(contract)
+        return contract
+
+    def _record_fill(self, contract, side, shares, price, when, order_id, perm_id, order_ref=''):
+        exec_id = f"0000sim.{next(self.exec_ids):08d}.01.01"
+        execution = Execution(execId=exec_id, time=when, acctNumber=self.config.account, exchange='SMART',
+                              side=side, shares=shares, price=price, permId=perm_id, clientId=self.client_id,
+                              orderId=order_id, cumQty=shares, avgPrice=price, orderRef=order_ref)
+        report = CommissionReport(execId=exec_id, commission=round(max(1.0, shares * 0.005), 2), currency='USD')
+        fill = Fill(contract, execution, report, when)
+        self.fills.append(fill)
+        return fill
+
+    def _market_value(self, position):
+        multiplier = float(position.contract.multiplier or 1) if position.contract.secType == 'OPT' else 1.0
+        return position.position * self._mark(position.contract) * multiplier
+
+    def _mark(self, contract):
+        if contract.secType == 'OPT':
+            return self._fill_ticker(Ticker(contract=contract)).last
+        return self._price(contract.symbol)
+
+    def _portfolio_item(self, position):
+        value = self._market_value(position)
+        multiplier = float(position.contract.multiplier or 1) if position.contract.secType == 'OPT' else 1.0
+        cost = position.position * position.avgCost * multiplier
+        return PortfolioItem(position.contract, position.position, self._mark(position.contract), round(value, 2),
+                             position.avgCost, round(value - cost, 2), 0.0, self.config.account)
+
+    def positions(self, account=''):
+        return [p for p in self.position_rows.values() if p.position]
+
+    def portfolio(self, account=''):
+        return [self._portfolio_item(p) for p in self.positions()]
+
+    def _account_values(self):
+        gross = sum(abs(self._market_value(p)) for p in self.positions())
+        net = self.cash + sum(self._market_value(p) for p in self.positions())
+        values = {'NetLiquidation': net, 'TotalCashValue': self.cash, 'BuyingPower': net * 4,
+                  'AvailableFunds': net - gross * 0.25, 'ExcessLiquidity': net - gross * 0.25,
+                  'GrossPositionValue': gross, 'MaintMarginReq': gross * 0.25, 'InitMarginReq': gross * 0.25}
+        return [AccountValue(self.config.account, tag, f"{values[tag]:.2f}", 'USD', '') for tag in ACCOUNT_TAGS]
+
+    async def reqAccountSummaryAsync(self):
+        if await self._request('reqAccountSummaryAsync'):
+            return []
+        self.account_summary_sub = True
+        values = self._account_values()
+        for value in values:
+            self.accountSummaryEvent.emit(value)
+        return values
+
+    def _pnl_values(self, position=None):
+        rows = [position] if position else self.positions()
+        unrealized = sum(self._portfolio_item(p).unrealizedPNL for p in rows)
+        daily = sum(self._market_value(p) * 0.005 for p in rows)
+        return round(daily, 2), round(unrealized, 2)
+
+    def reqPnL(self, account, modelCode=''):
+        self._require_connection()
+        pnl = self.pnl_subs.get((account, modelCode))
+        if pnl is None:
+            pnl = self.pnl_subs[(account, modelCode)] = PnL(account, modelCode)
+            asyncio.get_event_loop().call_later(self.config.latency('reqPnL', self.rng), self._update_pnl, pnl)
+        return pnl
+
+    def cancelPnL(self, account, modelCode=''):
+        self.pnl_subs.pop((account, modelCode), None)
+
+    def reqPnLSingle(self, account, modelCode, conId):
+        self._require_connection()
+        pnl = self.pnl_single_subs.get((account, modelCode, conId))
+        if pnl is None:
+            pnl = self.pnl_single_subs[(account, modelCode, conId)] = PnLSingle(account, modelCode, conId)
+            asyncio.get_event_loop().call_later(self.config.latency('reqPnLSingle', self.rng), self._update_pnl_single, pnl)
+        return pnl
+
+    def cancelPnLSingle(self, account, modelCode, conId):
+        self.pnl_single_subs.pop((account, modelCode, conId), None)
+
+    def _update_pnl(self, pnl):
+        if self.pnl_subs.get((pnl.account, pnl.modelCode)) is not pnl:
+            return
+        pnl.dailyPnL, pnl.unrealizedPnL = self._pnl_values()
+        pnl.realizedPnL = round(self.realized, 2)
+        self.pnlEvent.emit(pnl)
+
+    def _update_pnl_single(self, pnl):
+        if self.pnl_single_subs.get((pnl.account, pnl.modelCode, pnl.conId)) is not pnl:
+            return
+        position = self.position_rows.get(pnl.conId)
+        if position is None or not position.position:
+            pnl.position, pnl.dailyPnL, pnl.unrealizedPnL, pnl.value = 0, 0.0, 0.0, 0.0
+        else:
+            pnl.dailyPnL, pnl.unrealizedPnL = self._pnl_values(position)
+            pnl.position = int(position.position)
+            pnl.value = round(self._market_value(position), 2)
+        pnl.realizedPnL = 0.0
+        self.pnlSingleEvent.emit(pnl)
+
+    async def reqExecutionsAsync(self, execFilter=None):
+        if await self._request('reqExecutionsAsync'):
+            return []
+        since = None
+        if execFilter is not None and getattr(execFilter, 'time', ''):
+            try:
+                since = datetime.strptime(execFilter.time[:17], '%Y%m%d %H:%M:%S').replace(tzinfo=timezone.utc)
+            except ValueError:
+                since = None
+        return [f for f in self.fills if since is None or f.time >= since]
+
+    # --- Orders ---
+
+    def openTrades(self):
+        return [t for t in self.trades_by_id.values() if t.orderStatus.status not in DONE_STATES]
+
+    def trades(self):
+        return list(self.trades_by_id.values())
+
+    async def reqOpenOrdersAsync(self):
+        if await self._request('reqOpenOrdersAsync'):
+            return []
+        return self.openTrades()
+
+    def _set_status(self, trade, status, message='', error_code=0):
+        trade.orderStatus.status = status
+        trade.log.append(TradeLogEntry(datetime.now(timezone.utc), status, message, error_code))
+        self.orderStatusEvent.emit(trade)
+
+    def placeOrder(self, contract, order):
+        self._require_connection()
+        self.stats['placeOrder'] += 1
+        if contract.secType != 'BAG':
+            # The Gateway resolves unqualified contracts itself.
+            self._qualify(contract)
+        if not order.orderId:
+            order.orderId = next(self.order_ids)
+        order.clientId = self.client_id
+        order.permId = order.permId or next(self.perm_ids)
+        status = OrderStatus(orderId=order.orderId, status='PendingSubmit', remaining=order.totalQuantity,
+                             permId=order.permId, clientId=self.client_id)
+        trade = Trade(contract, order, status, [], [TradeLogEntry(datetime.now(timezone.utc), 'PendingSubmit', '', 0)])
+        self.trades_by_id[order.orderId] = trade
+        loop = asyncio.get_event_loop()
+        loop.call_later(self.config.latency('placeOrder', self.rng), self._acknowledge, trade)
+        return trade
+
+    def _acknowledge(self, trade):
+        if not self.connected or trade.orderStatus.status in DONE_STATES:
+            return
+        order = trade.order
+        if order.totalQuantity <= 0 or (trade.contract.symbol or '').upper() in self.config.unknown_symbols:
+            message = "Order rejected - reason:Invalid quantity or contract"
+            self._error(order.orderId, 201, message, trade.contract)
+            self._set_status(trade, 'Cancelled', message, 201)
+            return
+        self.openOrderEvent.emit(trade)
+        self._set_status(trade, 'Submitted')
+        if self._marketable(trade):
+            asyncio.get_event_loop().call_later(self.config.fill_delay_ms / 1000.0, self._fill, trade)
+
+    def _marketable(self, trade):
+        order = trade.order
+        if order.orderType == 'MKT':
+            return True
+        if order.orderType != 'LMT':
+            return False
+        price = self._mark(trade.contract) if trade.contract.secType != 'BAG' else order.lmtPrice
+        return order.lmtPrice >= price if order.action == 'BUY' else order.lmtPrice <= price
+
+    def _fill(self, trade):
+        if not self.connected or trade.orderStatus.status in DONE_STATES:
+            return
+        order, contract = trade.order, trade.contract
+        price = order.lmtPrice if contract.secType == 'BAG' or order.orderType == 'LMT' else self._mark(contract)
+        shares = order.totalQuantity
+        fill = self._record_fill(contract, 'BOT' if order.action == 'BUY' else 'SLD', shares, round(price, 2),
+                                 datetime.now(timezone.utc), order.orderId, order.permId, order.orderRef or '')
+        trade.fills.append(fill)
+        trade.orderStatus.filled = shares
+        trade.orderStatus.remaining = 0.0
+        trade.orderStatus.avgFillPrice = trade.orderStatus.lastFillPrice = fill.execution.price
+        self.execDetailsEvent.emit(trade, fill)
+        self.commissionReportEvent.emit(trade, fill, fill.commissionReport)
+        self._set_status(trade, 'Filled')
+        if contract.secType != 'BAG':
+            self._apply_fill(contract, shares if order.action == 'BUY' else -shares, fill.execution.price)
+
+    def _apply_fill(self, contract, signed_qty, price):
+        current = self.position_rows.get(contract.conId)
+        quantity = (current.position if current else 0.0) + signed_qty
+        avg_cost = price if not current or not current.position else current.avgCost
+        multiplier = float(contract.multiplier or 1) if contract.secType == 'OPT' else 1.0
+        self.cash -= signed_qty * price * multiplier
+        position = Position(self.config.account, contract, quantity, avg_cost)
+        self.position_rows[contract.conId] = position
+        self.positionEvent.emit(position)
+        self.updatePortfolioEvent.emit(self._portfolio_item(position))
+
+    def cancelOrder(self, order, manualCancelOrderTime=''):
+        self._require_connection()
+        trade = self.trades_by_id.get(order.orderId)
+        if trade is None or trade.orderStatus.status in DONE_STATES:
+            self._error(order.orderId, 10148, f"OrderId {order.orderId} that needs to be cancelled cannot be cancelled")
+            return trade
+        self._set_status(trade, 'PendingCancel')
+        asyncio.get_event_loop().call_later(self.config.latency('cancelOrder', self.rng), self._cancelled, trade)
+        return trade
+
+    def _cancelled(self, trade):
+        if trade.orderStatus.status not in DONE_STATES:
+            self._set_status(trade, 'Cancelled')
+
+    # --- Background ---
+
+    async def _tick_loop(self):
+        ticks = 0
+        while self.connected:
+            await asyncio.sleep(self.config.tick_interval)
+            ticks += 1
+            for symbol in list(self.prices):
+                self.prices[symbol] = max(0.01, self.prices[symbol] * (1 + self.rng.gauss(0, 0.0005)))
+            for ticker in list(self.tickers.values()):
+                self._fill_ticker(ticker)
+            if self.tickers:
+                self.pendingTickersEvent.emit(set(self.tickers.values()))
+            if ticks % max(1, int(1.0 / self.config.tick_interval)) == 0:
+                for pnl in list(self.pnl_subs.values()):
+                    self._update_pnl(pnl)
+                for pnl in list(self.pnl_single_subs.values()):
+                    self._update_pnl_single(pnl)
+                if self.account_summary_sub:
+                    for value in self._account_values()[:1]:
+                        self.accountSummaryEvent.emit(value)
+
+    async def _chaos_loop(self):
+        await asyncio.sleep(self.config.disconnect_every)
+        if self.connected:
+            self._error(-1, 1100, "Connectivity between IB and Trader Workstation has been lost.")
+            self.disconnect()
@@ -1,9 +1,18 @@
 
 import unittest
 from unittest.mock import MagicMock, patch
+import concurrent.futures
+import http.server
+import gzip
 import json
+import logging
+import shutil
 import sys
 import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
 
 # Ensure we can import the bridge
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -11,117 +20,1417 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # Import the app but mock the global IB initialization to avoid connecting
 with patch('ib_insync.IB'):
     import ibkr_bridge
+import sim_ib
+from ib_insync import Ticker
+
+class LoopThread:
+    def __enter__(self):
+        self.loop = ibkr_bridge.asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self.loop
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+        self.loop.close()
+        return False
+
+def fast_sim_config(**overrides):
+    fields = dict(latency_ms=1.0, jitter_ms=0.0, tick_interval=0.05, fill_delay_ms=5.0, executions=2)
+    fields.update(overrides)
+    return sim_ib.SimConfig(**fields)
+
+class SimulatedGateway:
+    """Runs a connected SimulatedIB on its own loop and points the bridge at it."""
+
+    def __init__(self, **overrides):
+        self.sim = sim_ib.SimulatedIB(fast_sim_config(**overrides))
+
+    def __enter__(self):
+        self.loop_thread = LoopThread()
+        self.loop = self.loop_thread.__enter__()
+        self.call(self.sim.connectAsync())
+        self.patches = [patch('ibkr_bridge.ib', self.sim), patch('ibkr_bridge.get_loop', return_value=self.loop)]
+        for p in self.patches:
+            p.start()
+        ibkr_bridge.connection_ready.set()
+        return self
+
+    def call(self, coro, timeout=5.0):
+        return ibkr_bridge.asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def __exit__(self, *exc):
+        ibkr_bridge.connection_ready.clear()
+        for p in reversed(self.patches):
+            p.stop()
+        async def shutdown():
+            self.sim.disconnect()
+            await ibkr_bridge.asyncio.sleep(0)
+        self.call(shutdown())
+        return self.loop_thread.__exit__(*exc)
 
 class TestIBKRBridge(unittest.TestCase):
     def setUp(self):
         self.app = ibkr_bridge.app.test_client()
         self.app.testing = True
-        
-    @patch('ibkr_bridge.get_ib')
-    def test_health_check_connected(self, mock_get_ib):
-        mock_ib = MagicMock()
-        mock_ib.isConnected.return_value = True
-        mock_get_ib.return_value = mock_ib
-        
-        # We also need to patch the global 'ib' variable used in health endpoint's try/except block
-        with patch('ibkr_bridge.ib', mock_ib):
-            response = self.app.get('/health')
-            data = json.loads(response.data)
-            
-            self.assertTrue(data['connected'])
-            self.assertEqual(data['status'], 'ok')
-            
+        for cache in (ibkr_bridge.market_data_cache, ibkr_bridge.option_chain_cache, ibkr_bridge.qualified_contracts_cache):
+            cache.clear()
+        ibkr_bridge.market_data_streams.clear()
+
+    def test_health_check_connected(self):
+        with SimulatedGateway():
+            data = json.loads(self.app.get('/health').data)
+        self.assertTrue(data['connected'])
+        self.assertEqual(data['status'], 'ok')
+
     def test_health_check_disconnected(self):
-        with patch('ibkr_bridge.ib', None):
-            response = self.app.get('/health')
-            data = json.loads(response.data)
-            self.assertFalse(data['connected'])
-
-    @patch('ibkr_bridge.get_ib')
-    def test_market_data(self, mock_get_ib):
-        mock_ib = MagicMock()
-        mock_ib.isConnected.return_value = True
-        mock_get_ib.return_value = mock_ib
-        
-        # Mock ticker data
-        mock_ticker = MagicMock()
-        mock_ticker.last = 150.0
-        mock_ticker.bid = 149.9
-        mock_ticker.ask = 150.1
-        mock_ticker.volume = 1000
-        mock_ticker.close = 148.0
-        mock_ticker.high = 151.0
-        mock_ticker.low = 148.0
-        
-        mock_ib.reqMktData.return_value = mock_ticker
-        
-        response = self.app.get('/market-data/AAPL')
-        data = json.loads(response.data)
-        
+        with patch('ibkr_bridge.ib', sim_ib.SimulatedIB(fast_sim_config())):
+            data = json.loads(self.app.get('/health').data)
+        self.assertFalse(data['connected'])
+        self.assertEqual(data['status'], 'disconnected')
+
+    def test_market_data(self):
+        with SimulatedGateway():
+            data = json.loads(self.app.get('/market-data/AAPL').data)
         self.assertEqual(data['symbol'], 'AAPL')
-        self.assertEqual(data['last'], 150.0)
-        
-    @patch('ibkr_bridge.get_ib')
-    def test_option_chain(self, mock_get_ib):
-        mock_ib = MagicMock()
-        mock_ib.isConnected.return_value = True
-        mock_get_ib.return_value = mock_ib
-        
-        # Mock chain
-        mock_chain = MagicMock()
-        mock_chain.exchange = 'SMART'
-        mock_chain.expirations = ['20260101', '20260201']
-        mock_chain.strikes = [100.0, 110.0]
-        mock_chain.multiplier = 100
-        mock_ib.reqSecDefOptParams.return_value = [mock_chain]
-        
-        response = self.app.get('/option-chain/AAPL')
-        data = json.loads(response.data)
-        
+        self.assertAlmostEqual(data['last'], sim_ib.base_price('AAPL'), delta=sim_ib.base_price('AAPL') * 0.05)
+        self.assertLess(data['bid'], data['ask'])
+
+    def test_option_chain(self):
+        with SimulatedGateway():
+            data = json.loads(self.app.get('/option-chain/AAPL').data)
         self.assertEqual(data['exchange'], 'SMART')
-        self.assertEqual(len(data['expirations']), 2)
-        
-    @patch('ibkr_bridge.get_ib')
-    def test_option_quote(self, mock_get_ib):
-        mock_ib = MagicMock()
-        mock_ib.isConnected.return_value = True
-        mock_get_ib.return_value = mock_ib
-        
-        mock_ticker = MagicMock()
-        mock_ticker.bid = 5.0
-        mock_ticker.ask = 5.2
-        # Use simple floats for last/volume to avoid Mock objects
-        mock_ticker.last = 5.1
-        mock_ticker.volume = 100
-        mock_ticker.callOpenInterest = 1000
-        mock_ticker.putOpenInterest = 1000
-        
-        mock_greeks = MagicMock()
-        mock_greeks.delta = 0.5
-        mock_greeks.gamma = 0.1
-        mock_greeks.theta = -0.05
-        mock_greeks.vega = 0.2
-        mock_greeks.impliedVol = 0.3
-        mock_greeks.undPrice = 150.0
-        
-        mock_ticker.modelGreeks = mock_greeks
-        
-        mock_ib.reqMktData.return_value = mock_ticker
-        
-        payload = {
-            'symbol': 'AAPL',
-            'strike': 150,
-            'expiration': '20260101',
-            'right': 'C'
-        }
-        
-        response = self.app.post('/option-quote', 
-                               data=json.dumps(payload),
-                               content_type='application/json')
+        self.assertEqual(data['tradingClass'], 'AAPL')
+        self.assertEqual(data['expirations'], sorted(data['expirations']))
+        self.assertGreater(len(data['strikes']), 10)
+
+    def test_option_quote(self):
+        payload = {'symbol': 'AAPL', 'strike': 150, 'expiration': '20991217', 'right': 'C'}
+        with SimulatedGateway():
+            response = self.app.post('/option-quote', data=json.dumps(payload), content_type='application/json')
         data = json.loads(response.data)
-        
-        self.assertEqual(data['bid'], 5.0)
-        self.assertEqual(data['delta'], 0.5)
+        self.assertLess(data['bid'], data['ask'])
+        self.assertTrue(0 < data['delta'] <= 1)
+        self.assertAlmostEqual(data['undPrice'], sim_ib.base_price('AAPL'), delta=sim_ib.base_price('AAPL') * 0.05)
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+
+    def test_histogram_bucket_bounds(self):
+        for value in (0, 31, 32, 33, 1000, 123456, 9999999):
+            index = ibkr_bridge.LatencyHistogram.bucket_index(value)
+            self.assertGreaterEqual(ibkr_bridge.LatencyHistogram.bucket_upper(index), value)
+            self.assertLessEqual(ibkr_bridge.LatencyHistogram.bucket_upper(index), value * 1.07 + 1)
+
+    def test_histogram_percentiles(self):
+        hist = ibkr_bridge.LatencyHistogram()
+        for ms in range(1, 101):
+            hist.record(ms)
+        self.assertEqual(hist.count, 100)
+        self.assertAlmostEqual(hist.percentile_ms(50), 50, delta=50 * 0.07)
+        self.assertAlmostEqual(hist.percentile_ms(99), 99, delta=99 * 0.07)
+        self.assertEqual(hist.summary()["maxMs"], 100.0)
+
+    def test_metrics_endpoint_exports_histograms_and_counters(self):
+        ibkr_bridge.observe_latency("market-data", "market", "total", 12.5)
+        ibkr_bridge.inc_counter("bridge_ib_errors_total", code="10197")
+        response = self.app.get('/metrics')
+        body = response.data.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('bridge_request_stage_seconds_bucket{route="market-data",group="market",stage="total",le="0.025"}', body)
+        self.assertIn('bridge_ib_errors_total{code="10197"}', body)
+        data = json.loads(self.app.get('/metrics?format=json').data)
+        self.assertIn("market-data", data["routes"])
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        ibkr_bridge.connection_ready.set()
+        ibkr_bridge.cache_write(ibkr_bridge.option_chain_cache, "AAPL", {"symbol": "AAPL", "strikes": [100.0]})
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        ibkr_bridge.option_chain_cache.clear()
+        ibkr_bridge.slow_requests.clear()
+
+    def test_server_timing_header_on_request(self):
+        response = self.app.get('/option-chain/AAPL', headers={'X-Bridge-Timing': '1'})
+        self.assertEqual(response.status_code, 200)
+        timing = response.headers.get('Server-Timing')
+        self.assertIn('total;dur=', timing)
+        self.assertIn('cache.option_chain;dur=', timing)
+        self.assertIn('serialize;dur=', timing)
+
+    def test_no_server_timing_by_default(self):
+        response = self.app.get('/option-chain/AAPL')
+        self.assertIsNone(response.headers.get('Server-Timing'))
+
+    def test_slow_requests_are_kept_as_exemplars(self):
+        with patch('ibkr_bridge.BRIDGE_SLOW_REQUEST_MS', 0):
+            self.app.get('/option-chain/AAPL')
+        data = json.loads(self.app.get('/diag/slow?route=option-chain').data)
+        self.assertEqual(data["count"], 1)
+        entry = data["requests"][0]
+        self.assertEqual(entry["status"], 200)
+        self.assertIn("cache.option_chain", [span["name"] for span in entry["spans"]])
+
+class TestResponseEncoding(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        ibkr_bridge.connection_ready.set()
+        self.chain = {"symbol": "AAPL", "expirations": ["20990115"], "strikes": [100.0 + i for i in range(400)]}
+        ibkr_bridge.cache_write(ibkr_bridge.option_chain_cache, "AAPL", self.chain)
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        ibkr_bridge.option_chain_cache.clear()
+
+    def test_non_finite_floats_encode_as_null(self):
+        payload = {"bid": float("nan"), "ask": float("inf"), "rows": [{"last": float("nan")}, 1.5]}
+        expected = {"bid": None, "ask": None, "rows": [{"last": None}, 1.5]}
+        for use_orjson in (True, False):
+            if use_orjson and ibkr_bridge.orjson is None:
+                continue
+            provider = ibkr_bridge.BridgeJSONProvider(ibkr_bridge.app, use_orjson)
+            self.assertEqual(json.loads(provider.encode(payload)), expected)
+
+    def test_gzip_negotiated_for_large_bodies(self):
+        response = self.app.get('/option-chain/AAPL', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertIn('Accept-Encoding', response.headers.get('Vary'))
+        self.assertEqual(json.loads(gzip.decompress(response.data)), self.chain)
+
+    def test_small_or_unaccepted_bodies_stay_plain(self):
+        self.assertIsNone(self.app.get('/option-chain/AAPL').headers.get('Content-Encoding'))
+        with patch('ibkr_bridge.BRIDGE_COMPRESS_MIN_BYTES', 10 ** 6):
+            response = self.app.get('/option-chain/AAPL', headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual(json.loads(response.data), self.chain)
+
+    def test_unchanged_option_chain_returns_304(self):
+        first = self.app.get('/option-chain/AAPL')
+        etag = first.headers.get('ETag')
+        self.assertTrue(etag.startswith('W/'))
+        second = self.app.get('/option-chain/AAPL', headers={'If-None-Match': etag})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.data, b'')
+        self.chain["strikes"].append(999.0)
+        ibkr_bridge.cache_write(ibkr_bridge.option_chain_cache, "AAPL", self.chain)
+        third = self.app.get('/option-chain/AAPL', headers={'If-None-Match': etag})
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third.headers.get('ETag'), etag)
+
+class TestOptionChainIndex(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        ibkr_bridge.connection_ready.set()
+        self.today = datetime.now(timezone.utc).date()
+        self.chain = {
+            "symbol": "AAPL",
+            "expirations": [(self.today + ibkr_bridge.timedelta(days=d)).strftime('%Y%m%d') for d in (30, 1, 7, 14, 60)],
+            "strikes": [100.0 + 5 * i for i in range(40)][::-1],
+        }
+        ibkr_bridge.cache_write(ibkr_bridge.option_chain_cache, "AAPL", self.chain)
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        ibkr_bridge.option_chain_cache.clear()
+        ibkr_bridge.option_chain_indexes.clear()
+
+    def test_slices_by_dte_and_strike_bounds(self):
+        index = ibkr_bridge.OptionChainIndex(self.chain)
+        days = lambda d: (self.today + ibkr_bridge.timedelta(days=d)).strftime('%Y%m%d')
+        self.assertEqual(index.expiration_slice(7, 30, self.today), [days(7), days(14), days(30)])
+        self.assertEqual(index.expiration_slice(dte_min=31, today=self.today), [days(60)])
+        self.assertEqual(index.strike_slice(150, 162.5), [150.0, 155.0, 160.0])
+        self.assertEqual(index.strike_slice(count=2), [100.0, 105.0])
+
+    def test_count_takes_strikes_nearest_the_price(self):
+        index = ibkr_bridge.OptionChainIndex(self.chain)
+        self.assertEqual(index.strike_slice(near_price=151.0, count=3), [145.0, 150.0, 155.0])
+        self.assertEqual(index.strike_slice(near_price=10.0, count=2), [100.0, 105.0])
+        self.assertEqual(index.strike_slice(near_price=999.0, count=2), [290.0, 295.0])
+        self.assertEqual(index.strike_slice(strike_min=200, near_price=150.0, count=2), [200.0, 205.0])
+
+    def test_endpoint_filters_and_reuses_index(self):
+        data = json.loads(self.app.get('/option-chain/AAPL?dteMax=10&nearPrice=151&count=4').data)
+        self.assertEqual(len(data["expirations"]), 2)
+        self.assertEqual(data["strikes"], [145.0, 150.0, 155.0, 160.0])
+        self.assertEqual((data["totalExpirations"], data["totalStrikes"]), (5, 40))
+        index = ibkr_bridge.option_chain_indexes["AAPL"]
+        self.app.get('/option-chain/AAPL?strikeMin=200')
+        self.assertIs(ibkr_bridge.option_chain_indexes["AAPL"], index)
+        full = json.loads(self.app.get('/option-chain/AAPL').data)
+        self.assertEqual(len(full["strikes"]), 40)
+        self.assertNotIn("totalStrikes", full)
+
+    def test_trading_classes_are_merged(self):
+        ibkr_bridge.option_chain_cache.clear()
+        with SimulatedGateway():
+            plain = self.app.get('/option-chain/SPX')
+            data = json.loads(self.app.get('/option-chain/SPX?classes=1').data)
+            weekly = json.loads(self.app.get('/option-chain/SPX?tradingClass=spxw&dteMax=10').data)
+            every = json.loads(self.app.get('/option-chain/SPX?tradingClass=all').data)
+            friday = every["expirations"][0]
+            on_day = json.loads(self.app.get(f'/option-chain/SPX?expiration={friday}&tradingClass=all').data)
+            missing = self.app.get('/option-chain/SPX?tradingClass=XYZ')
+        self.assertEqual(data["tradingClass"], "SPX")
+        self.assertNotIn("classes", json.loads(plain.data))
+        self.assertLess(len(plain.data), len(json.dumps(data)) / 2)
+        self.assertEqual(sorted(data["classes"]), ["SPX", "SPXW"])
+        self.assertEqual(data["classes"]["SPXW"]["exchanges"], ["CBOE", "SMART"])
+        self.assertEqual(data["expirations"], data["classes"]["SPX"]["expirations"])
+        self.assertEqual(weekly["tradingClass"], "SPXW")
+        self.assertNotIn("classes", weekly)
+        self.assertTrue(set(data["expirations"]) < set(every["expirations"]))
+        self.assertEqual(every["expirations"], sorted(set(every["expirations"])))
+        self.assertIn("SPXW", every["expirationClasses"][friday])
+        self.assertEqual(on_day["expirations"], [friday])
+        self.assertEqual(missing.status_code, 404)
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.app.get('/option-chain/AAPL?count=0')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)["param"], "count")
+        self.assertEqual(self.app.get('/option-chain/AAPL?nearPrice=abc').status_code, 400)
+
+def eastern_ts(year, month, day, hour, minute=0):
+    return datetime(year, month, day, hour, minute, tzinfo=ibkr_bridge.MARKET_TZ).timestamp()
+
+class TestOptionChainExpiry(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        ibkr_bridge.connection_ready.set()
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        ibkr_bridge.option_chain_cache.clear()
+        ibkr_bridge.option_chain_indexes.clear()
+
+    def test_session_boundaries_follow_the_calendar(self):
+        boundary = lambda ts: datetime.fromtimestamp(ibkr_bridge.next_session_boundary(ts), ibkr_bridge.MARKET_TZ)
+        self.assertEqual(boundary(eastern_ts(2026, 10, 20, 8)).hour, 9)
+        self.assertEqual(boundary(eastern_ts(2026, 10, 20, 12)).hour, 16)
+        # Friday after the close -> Monday open; Thanksgiving is skipped.
+        self.assertEqual(boundary(eastern_ts(2026, 10, 23, 17)).date().isoformat(), "2026-10-26")
+        self.assertEqual(boundary(eastern_ts(2026, 11, 25, 17)).date().isoformat(), "2026-11-27")
+        self.assertEqual(ibkr_bridge.expired_through(eastern_ts(2026, 10, 20, 15, 59)), "20261019")
+        self.assertEqual(ibkr_bridge.expired_through(eastern_ts(2026, 10, 20, 16)), "20261020")
+
+    def test_holiday_table_input_and_coverage(self):
+        with self.assertLogs(ibkr_bridge.logger, level="WARNING") as logs:
+            days = ibkr_bridge.parse_market_holidays("2026-12-31, 20270102,12/31/2026")
+        self.assertEqual(days, {"2026-12-31", "2027-01-02"})
+        self.assertIn("12/31/2026", logs.output[0])
+        with patch('ibkr_bridge.holiday_years_warned', set()), \
+                self.assertLogs(ibkr_bridge.logger, level="WARNING") as logs:
+            ibkr_bridge.market_now(eastern_ts(2026, 10, 20, 12))
+            ibkr_bridge.market_now(datetime(2031, 1, 2, tzinfo=timezone.utc).timestamp())
+            ibkr_bridge.market_now(datetime(2031, 6, 2, tzinfo=timezone.utc).timestamp())
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("2031", logs.output[0])
+
+    def test_stored_chain_expires_at_next_boundary(self):
+        now = eastern_ts(2026, 10, 20, 15, 30)
+        ibkr_bridge.store_option_chain("AAPL", {"symbol": "AAPL", "expirations": ["20261023"], "strikes": [1.0]}, now=now)
+        entry = ibkr_bridge.option_chain_cache["AAPL"]
+        self.assertEqual(entry["expiresAt"], eastern_ts(2026, 10, 20, 16))
+        entry["expiresAt"] = time.time() - 1
+        self.assertEqual(ibkr_bridge.cache_read(ibkr_bridge.option_chain_cache, "AAPL", 3600), (None, None))
+
+    def test_expired_expirations_are_pruned_once(self):
+        chain = {
+            "symbol": "SPX", "expirations": ["20261016", "20261120"], "strikes": [1.0],
+            "classes": {"SPXW": {"expirations": ["20261015", "20261016"]}, "SPX": {"expirations": ["20261016", "20261120"]}},
+        }
+        ibkr_bridge.cache_write(ibkr_bridge.option_chain_cache, "SPX", chain)
+        now = eastern_ts(2026, 10, 16, 16, 5)
+        pruned = ibkr_bridge.prune_cached_chain("SPX", chain, now=now)
+        self.assertEqual(pruned["expirations"], ["20261120"])
+        self.assertEqual(list(pruned["classes"]), ["SPX"])
+        self.assertIs(ibkr_bridge.option_chain_cache["SPX"]["payload"], pruned)
+        self.assertIs(ibkr_bridge.prune_cached_chain("SPX", pruned, now=now), pruned)
+        self.assertIsNone(ibkr_bridge.prune_cached_chain("SPX", pruned, now=eastern_ts(2026, 11, 20, 16, 30)))
+
+    def test_invalidate_endpoint(self):
+        for symbol in ("AAPL", "MSFT"):
+            ibkr_bridge.cache_write(ibkr_bridge.option_chain_cache, symbol, {"symbol": symbol})
+        data = json.loads(self.app.post('/option-chain/invalidate', json={"symbols": ["aapl", "TSLA"], "reason": "split"}).data)
+        self.assertEqual(data["invalidated"], ["AAPL"])
+        self.assertEqual(list(ibkr_bridge.option_chain_cache), ["MSFT"])
+        self.assertEqual(json.loads(self.app.post('/option-chain/invalidate', json={}).data)["count"], 1)
+        self.assertEqual(self.app.post('/option-chain/invalidate', json={"symbols": "AAPL"}).status_code, 400)
+
+class TestSessionCachePolicy(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        ibkr_bridge.connection_ready.set()
+        ibkr_bridge.market_data_cache.clear()
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        ibkr_bridge.market_data_cache.clear()
+
+    def test_sessions(self):
+        cases = {
+            (2026, 10, 20, 3, 59): 'closed', (2026, 10, 20, 4, 0): 'pre-market', (2026, 10, 20, 9, 30): 'rth',
+            (2026, 10, 20, 16, 0): 'after-hours', (2026, 10, 20, 20, 0): 'closed', (2026, 10, 24, 12, 0): 'closed',
+            (2026, 11, 26, 12, 0): 'holiday',
+        }
+        for args, session in cases.items():
+            self.assertEqual(ibkr_bridge.market_session(eastern_ts(*args)), session, args)
+
+    def test_ttls_stretch_outside_rth(self):
+        ttl = ibkr_bridge.IB_MARKET_DATA_CACHE_TTL
+        self.assertEqual(ibkr_bridge.session_ttl(ttl, eastern_ts(2026, 10, 20, 12)), ttl)
+        self.assertEqual(ibkr_bridge.session_ttl(ttl, eastern_ts(2026, 10, 20, 17)), ibkr_bridge.BRIDGE_EXTENDED_HOURS_CACHE_TTL)
+        self.assertEqual(ibkr_bridge.session_ttl(ttl, eastern_ts(2026, 10, 24, 12)), ibkr_bridge.BRIDGE_CLOSED_CACHE_TTL)
+        # Friday night entries live until Monday's pre-market open.
+        self.assertEqual(ibkr_bridge.session_expires_at(eastern_ts(2026, 10, 23, 21)), eastern_ts(2026, 10, 26, 4))
+        with patch('ibkr_bridge.BRIDGE_SESSION_CACHE_POLICY', False):
+            self.assertEqual(ibkr_bridge.session_ttl(ttl, eastern_ts(2026, 10, 24, 12)), ttl)
+            self.assertIsNone(ibkr_bridge.session_expires_at(eastern_ts(2026, 10, 24, 12)))
+
+    def test_closed_market_serves_frozen_quote(self):
+        saturday = eastern_ts(2026, 10, 24, 12)
+        ticker = Ticker(contract=ibkr_bridge.Stock('AAPL', 'SMART', 'USD'), last=101.0, bid=100.9, ask=101.1, close=100.5)
+        requested = []
+
+        def snapshot(symbol, data_type, timeout):
+            requested.append(data_type)
+            return ticker, None
+        with patch('ibkr_bridge.time.time', return_value=saturday), \
+                patch('ibkr_bridge.fetch_market_data_snapshot', side_effect=snapshot):
+            first = json.loads(self.app.get('/market-data/AAPL').data)
+            second = json.loads(self.app.get('/market-data/AAPL').data)
+        self.assertEqual(requested, [2])
+        self.assertEqual(first["source"], "frozen")
+        self.assertEqual(second, first)
+        self.assertEqual(ibkr_bridge.market_data_cache["AAPL"]["expiresAt"], eastern_ts(2026, 10, 26, 4))
+
+class TestLogBuffer(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        self.handler = ibkr_bridge.RingBufferHandler(5)
+        self.handler.addFilter(ibkr_bridge.RequestContextFilter())
+        self.logger = logging.getLogger("test-log-buffer")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        ibkr_bridge.clear_request_context()
+
+    def test_buffer_is_bounded(self):
+        for i in range(10):
+            self.logger.warning("line %s", i)
+        entries, size = self.handler.query(100)
+        self.assertEqual(size, 5)
+        self.assertEqual([e["message"] for e in entries], [f"line {i}" for i in range(5, 10)])
+
+    def test_query_filters_by_request_level_and_route(self):
+        ibkr_bridge.set_request_context("abc12345", "positions")
+        self.logger.info("positions start")
+        self.logger.warning("positions slow")
+        ibkr_bridge.clear_request_context()
+        self.logger.warning("unrelated")
+        entries, _ = self.handler.query(10, request_id="abc12345")
+        self.assertEqual(len(entries), 2)
+        entries, _ = self.handler.query(10, min_level=logging.WARNING, route="positions")
+        self.assertEqual([e["message"] for e in entries], ["positions slow"])
+        entries, _ = self.handler.query(1)
+        self.assertEqual(entries[0]["message"], "unrelated")
+
+    def test_diag_logs_endpoint(self):
+        ibkr_bridge.set_request_context("feedbeef", "orders")
+        ibkr_bridge.log_ctx(logging.WARNING, "orders lock timeout", waitMs=120)
+        ibkr_bridge.clear_request_context()
+        self.assertTrue(ibkr_bridge.flush_logs())
+        data = json.loads(self.app.get('/diag/logs?requestId=feedbeef&level=warning').data)
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(data["logs"][0]["fields"]["waitMs"], 120)
+        self.assertEqual(data["logs"][0]["route"], "orders")
+
+class TestLogPipeline(unittest.TestCase):
+    def make_record(self, **extra):
+        record = logging.LogRecord("ibkr_bridge", logging.WARNING, __file__, 1, "[req %s] %s lock timeout | %s",
+                                   ("abc", "orders", {"waitMs": 5}), None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_uses_structured_fields(self):
+        record = self.make_record(event_msg="%s lock timeout", event_args=("orders",), fields={"waitMs": 5},
+                                  request_id="abc", route="orders")
+        entry = json.loads(ibkr_bridge.JsonLogFormatter().format(record))
+        self.assertEqual(entry["message"], "orders lock timeout")
+        self.assertEqual(entry["requestId"], "abc")
+        self.assertEqual(entry["fields"], {"waitMs": 5})
+
+    def test_queue_handler_defers_formatting(self):
+        handler = ibkr_bridge.LazyQueueHandler(ibkr_bridge.queue.Queue())
+        record = self.make_record()
+        handler.handle(record)
+        queued = handler.queue.get_nowait()
+        self.assertEqual(queued.msg, "[req %s] %s lock timeout | %s")
+        self.assertEqual(queued.getMessage(), "[req abc] orders lock timeout | {'waitMs': 5}")
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = ibkr_bridge.LazyQueueHandler(ibkr_bridge.queue.Queue(maxsize=1))
+        handler.handle(self.make_record())
+        handler.handle(self.make_record())
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_routine_lines_follow_request_sampling(self):
+        with patch('ibkr_bridge.BRIDGE_LOG_SAMPLE_RATE', 0.0):
+            ibkr_bridge.set_request_context("sampled0", "positions")
+            self.assertFalse(ibkr_bridge.log_sampled())
+        ibkr_bridge.clear_request_context()
+        self.assertTrue(ibkr_bridge.log_sampled())
+
+class TestExecutionWebhook(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "spool.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_spool_survives_restart(self):
+        spool = ibkr_bridge.ExecutionSpool(self.path)
+        spool.add([{"execId": "a"}, {"execId": "b"}, {"execId": "a"}])
+        spool.ack(["a"])
+        recovered = ibkr_bridge.ExecutionSpool(self.path).load()
+        self.assertEqual([e["execId"] for e in recovered], ["b"])
+
+    def test_spool_removed_once_drained(self):
+        spool = ibkr_bridge.ExecutionSpool(self.path)
+        spool.add([{"execId": "a"}])
+        spool.ack(["a"])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_batch_post_reuses_connection(self):
+        received = []
+        connections = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                connections.append(self.client_address)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                received.append(json.loads(body))
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            pool = ibkr_bridge.WebhookConnectionPool(f"http://127.0.0.1:{server.server_port}/ingest", 1, 5)
+            for batch in ([{"execId": "1"}, {"execId": "2"}], [{"execId": "3"}]):
+                delivered, permanent, err = ibkr_bridge.post_execution_batch(pool, batch)
+                self.assertTrue(delivered, err)
+        finally:
+            server.shutdown()
+        self.assertEqual(len(received[0]["executions"]), 2)
+        self.assertEqual(len(connections), 1)
+
+    def test_client_errors_are_permanent(self):
+        pool = MagicMock()
+        pool.post_json.return_value = (400, b"bad")
+        self.assertEqual(ibkr_bridge.post_execution_batch(pool, [{"execId": "x"}])[:2], (False, True))
+        pool.post_json.return_value = (503, b"down")
+        self.assertEqual(ibkr_bridge.post_execution_batch(pool, [{"execId": "x"}])[:2], (False, False))
+
+def make_position(symbol, con_id, quantity, sec_type="OPT", account="DU123"):
+    contract = MagicMock(symbol=symbol, conId=con_id, secType=sec_type, right="P", strike=100.0,
+                         lastTradeDateOrContractMonth="20260116", localSymbol=symbol, multiplier="100")
+    return MagicMock(account=account, contract=contract, position=quantity, avgCost=1.5)
+
+class TestPortfolioBooks(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        self.book = ibkr_bridge.VersionedBook(max_tombstones=2)
+
+    def test_upsert_is_idempotent(self):
+        self.assertTrue(self.book.upsert("a", {"q": 1}))
+        version = self.book.version
+        self.assertFalse(self.book.upsert("a", {"q": 1}))
+        self.assertEqual(self.book.version, version)
+
+    def test_delta_returns_changes_and_removals(self):
+        self.book.replace_all({"a": {"q": 1}, "b": {"q": 2}})
+        since = self.book.version
+        self.book.upsert("a", {"q": 5})
+        self.book.remove("b")
+        version, changed, removed = self.book.delta(since)
+        self.assertEqual(changed, [{"q": 5}])
+        self.assertEqual(removed, ["b"])
+        self.assertEqual(self.book.delta(version)[1:], ([], []))
+
+    def test_stale_cursor_needs_full_snapshot(self):
+        self.assertIsNone(self.book.delta(self.book.version - 1))
+        for key in ("a", "b", "c", "d"):
+            self.book.upsert(key, {})
+        since = self.book.version
+        for key in ("a", "b", "c"):
+            self.book.remove(key)
+        self.assertIsNone(self.book.delta(since))
+
+    def test_positions_endpoint_delta_mode(self):
+        book = ibkr_bridge.VersionedBook()
+        with patch('ibkr_bridge.positions_book', book):
+            ibkr_bridge.on_position(make_position("AAPL", 1, -1))
+            book.ready = True
+            ibkr_bridge.connection_ready.set()
+            try:
+                full = json.loads(self.app.get('/positions').data)
+                self.assertTrue(full["full"])
+                self.assertEqual(full["count"], 1)
+                unchanged = self.app.get(f'/positions?sinceVersion={full["version"]}')
+                self.assertEqual(unchanged.status_code, 304)
+                ibkr_bridge.on_position(make_position("MSFT", 2, -2))
+                ibkr_bridge.on_position(make_position("AAPL", 1, 0))
+                delta = json.loads(self.app.get(f'/positions?sinceVersion={full["version"]}').data)
+            finally:
+                ibkr_bridge.connection_ready.clear()
+        self.assertFalse(delta["full"])
+        self.assertEqual([row["symbol"] for row in delta["positions"]], ["MSFT"])
+        self.assertEqual(delta["removed"], ["DU123:1"])
+
+class TestCompanyNames(unittest.TestCase):
+    def tearDown(self):
+        ibkr_bridge.contract_details_cache.clear()
+
+    def test_names_are_fetched_concurrently(self):
+        class FakeIB:
+            async def reqContractDetailsAsync(self, contract):
+                await ibkr_bridge.asyncio.sleep(0.2)
+                return [MagicMock(longName=f"{contract.symbol} Inc")]
+
+        contracts = [MagicMock(conId=i, symbol=f"S{i}") for i in range(1, 6)]
+        with LoopThread() as loop, patch('ibkr_bridge.get_loop', return_value=loop), \
+                patch('ibkr_bridge.get_ib_instance', return_value=FakeIB()):
+            start = time.time()
+            names = ibkr_bridge.fetch_company_names(contracts, 2.0, None)
+            elapsed = time.time() - start
+        self.assertEqual(names["conid:3"], "S3 Inc")
+        self.assertLess(elapsed, 0.6)
+        cached, _ = ibkr_bridge.cache_read(ibkr_bridge.contract_details_cache, "conid:5", 60)
+        self.assertEqual(cached, "S5 Inc")
+
+    def test_details_cache_persists(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "details.json")
+            ibkr_bridge.cache_write(ibkr_bridge.contract_details_cache, "conid:1", "Apple Inc")
+            ibkr_bridge.save_contract_details_cache(path)
+            ibkr_bridge.contract_details_cache.clear()
+            ibkr_bridge.load_contract_details_cache(path)
+            self.assertEqual(ibkr_bridge.cached_company_name(MagicMock(conId=1)), "Apple Inc")
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def test_resolved_names_patch_positions_book(self):
+        book = ibkr_bridge.VersionedBook()
+        with patch('ibkr_bridge.positions_book', book), patch('ibkr_bridge.schedule_company_names') as schedule:
+            ibkr_bridge.on_position(make_position("AAPL", 7, 100, sec_type="STK"))
+            schedule.assert_called_once()
+            version = book.version
+            ibkr_bridge.apply_company_names({"conid:7": "Apple Inc"})
+        _, changed, _ = book.delta(version)
+        self.assertEqual(changed[0]["companyName"], "Apple Inc")
+
+class ImmediateLoop:
+    def call_soon_threadsafe(self, fn, *args):
+        fn(*args)
+
+def make_pnl_single(con_id, daily, account="DU123", value=1000.0):
+    return MagicMock(account=account, modelCode='', conId=con_id, dailyPnL=daily,
+                     unrealizedPnL=5.0, realizedPnL=0.0, position=1, value=value)
+
+class TestPnlSubscriptions(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        self.ib = MagicMock()
+        self.ib.managedAccounts.return_value = ["DU123"]
+        self.manager = ibkr_bridge.PnlManager(max_single=2, idle_ttl=300)
+        self.patches = [
+            patch('ibkr_bridge.get_loop', return_value=ImmediateLoop()),
+            patch('ibkr_bridge.get_ib_instance', return_value=self.ib),
+            patch('ibkr_bridge.pnl_manager', self.manager),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_subscribes_once_and_serves_events(self):
+        entry = self.manager.ensure("DU123", '', 42)
+        self.manager.ensure("DU123", '', 42)
+        self.ib.reqPnLSingle.assert_called_once_with("DU123", '', 42)
+        self.assertFalse(entry.first_update.is_set())
+        nan = float('nan')
+        ibkr_bridge.on_pnl_single(MagicMock(account="DU123", modelCode='', conId=42, dailyPnL=nan,
+                                            unrealizedPnL=nan, realizedPnL=nan, position=nan, value=nan))
+        self.assertFalse(entry.first_update.is_set())
+        ibkr_bridge.on_pnl_single(make_pnl_single(42, 12.5))
+        payload = entry.payload()
+        self.assertEqual(payload["dailyPnL"], 12.5)
+        self.assertEqual(payload["marketValue"], 1000.0)
+        self.assertIsNotNone(payload["asOf"])
+        self.ib.cancelPnLSingle.assert_not_called()
+
+    def test_resync_skips_account_pnl_without_managed_accounts(self):
+        self.ib.positions.return_value = []
+        self.ib.portfolio.return_value = []
+        self.ib.managedAccounts.return_value = []
+        with patch('ibkr_bridge.positions_book', ibkr_bridge.VersionedBook()), \
+                patch('ibkr_bridge.portfolio_book', ibkr_bridge.VersionedBook()):
+            ibkr_bridge.resync_portfolio_books()
+            self.ib.reqPnL.assert_not_called()
+            self.ib.managedAccounts.return_value = ["DU123"]
+            ibkr_bridge.resync_portfolio_books()
+        self.ib.reqPnL.assert_called_once_with("DU123", '')
+
+    def test_idle_adhoc_streams_are_evicted_before_held(self):
+        self.manager.set_held("DU123", 1, True)
+        self.manager.ensure("DU123", '', 2)
+        self.manager.ensure("DU123", '', 3)
+        self.ib.cancelPnLSingle.assert_called_once_with("DU123", '', 2)
+        self.assertEqual(self.manager.stats()["singles"], 2)
+        self.assertEqual(self.manager.held_con_ids("DU123"), [1])
+
+    def test_batch_endpoint_reads_from_memory(self):
+        self.manager.ensure("DU123", '', 1)
+        ibkr_bridge.on_pnl_single(make_pnl_single(1, 3.0))
+        ibkr_bridge.connection_ready.set()
+        try:
+            with patch('ibkr_bridge.BRIDGE_PNL_FIRST_UPDATE_TIMEOUT', 0.05):
+                body = json.loads(self.app.get('/pnl-single/batch?conIds=1,2').data)
+        finally:
+            ibkr_bridge.connection_ready.clear()
+        self.assertEqual(self.ib.reqPnLSingle.call_count, 2)
+        self.assertEqual(body["count"], 2)
+        self.assertEqual(body["results"][0]["dailyPnL"], 3.0)
+        self.assertEqual(body["missing"], [2])
+
+    def test_resubscribe_after_reconnect(self):
+        entry = self.manager.ensure("DU123", '', None)
+        ibkr_bridge.on_pnl(MagicMock(account="DU123", modelCode='', dailyPnL=1.0, unrealizedPnL=2.0, realizedPnL=3.0))
+        self.assertTrue(entry.first_update.is_set())
+        self.assertEqual(self.manager.resubscribe(), 1)
+        self.assertFalse(entry.first_update.is_set())
+        self.assertEqual(entry.payload()["dailyPnL"], 1.0)
+        self.assertEqual(self.ib.reqPnL.call_count, 2)
+
+def account_value(tag, value, currency="USD", account="DU123"):
+    return MagicMock(account=account, tag=tag, value=value, currency=currency)
+
+class TestAccountSummaryStream(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        self.reset()
+
+    def tearDown(self):
+        self.reset()
+
+    def reset(self):
+        with ibkr_bridge.account_summary_lock:
+            ibkr_bridge.account_summary_values.clear()
+            ibkr_bridge.account_summary_state["updatedAt"] = None
+        ibkr_bridge.reset_account_summary_stream()
+
+    def test_events_build_filtered_snapshot(self):
+        ibkr_bridge.on_account_summary(account_value("NetLiquidation", "1000.5"))
+        ibkr_bridge.on_account_summary(account_value("NetLiquidation", "900", currency="EUR"))
+        ibkr_bridge.on_account_summary(account_value("DailyPnL", "-12", currency="BASE"))
+        ibkr_bridge.on_account_summary(account_value("AccountCode", "DU123", currency=""))
+        ibkr_bridge.on_account_summary(account_value("Leverage", "1.2"))
+        payload = ibkr_bridge.build_account_summary_payload()
+        self.assertEqual(payload["NetLiquidation"], 1000.5)
+        self.assertEqual(payload["DailyPnL"], -12.0)
+        self.assertEqual(payload["AccountCode"], "DU123")
+        self.assertNotIn("Leverage", payload)
+        self.assertIsNotNone(payload["asOf"])
+        self.assertIsNone(ibkr_bridge.build_account_summary_payload(account="OTHER"))
+
+    def test_one_subscription_per_connection(self):
+        fut = concurrent.futures.Future()
+        with patch('ibkr_bridge.submit_ib_call', return_value=(fut, None)) as submit:
+            ibkr_bridge.start_account_summary_stream()
+            ibkr_bridge.start_account_summary_stream()
+            self.assertEqual(submit.call_count, 1)
+            fut.set_result(None)
+            ibkr_bridge.on_disconnect()
+            ibkr_bridge.start_account_summary_stream()
+            self.assertEqual(submit.call_count, 2)
+
+    def test_endpoint_serves_snapshot_without_portfolio_lock(self):
+        ibkr_bridge.on_account_summary(account_value("BuyingPower", "5000"))
+        ibkr_bridge.connection_ready.set()
+        try:
+            with patch('ibkr_bridge.acquire_bridge_lock') as acquire, patch('ibkr_bridge.submit_ib_call') as submit:
+                body = json.loads(self.app.get('/account-summary').data)
+            acquire.assert_not_called()
+            submit.assert_not_called()
+        finally:
+            ibkr_bridge.connection_ready.clear()
+        self.assertEqual(body["BuyingPower"], 5000.0)
+
+def make_execution_row(exec_id, ts, commission=None):
+    return {"execId": exec_id, "symbol": "AAPL", "side": "BOT", "shares": 1, "price": 1.0,
+            "commission": commission, "time": datetime.fromtimestamp(ts, timezone.utc).isoformat()}
+
+class TestExecutionStore(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        self.store = ibkr_bridge.ExecutionStore(retention_days=30)
+        self.now = time.time()
+
+    def test_merge_dedupes_and_windows_by_time(self):
+        self.store.merge([make_execution_row("a", self.now - 3 * 86400), make_execution_row("b", self.now - 3600)])
+        self.assertEqual(self.store.merge([make_execution_row("b", self.now - 3600)]), 0)
+        rows, cursor, _ = self.store.query(self.now - 86400)
+        self.assertEqual([r["execId"] for r in rows], ["b"])
+        self.assertEqual(cursor, self.store.seq)
+        self.assertEqual(self.store.latest_exec_id, "b")
+        rows, _, _ = self.store.query(self.now - 7 * 86400)
+        self.assertEqual([r["execId"] for r in rows], ["a", "b"])
+
+    def test_commission_update_is_resent_after_cursor(self):
+        self.store.merge([make_execution_row("a", self.now - 60), make_execution_row("b", self.now - 30)])
+        rows, _, _ = self.store.query(since_exec_id="b")
+        self.assertEqual(rows, [])
+        self.assertTrue(self.store.set_commission("a", 1.25))
+        self.assertFalse(self.store.set_commission("missing", 1.0))
+        rows, _, found = self.store.query(since_exec_id="b")
+        self.assertTrue(found)
+        self.assertEqual([(r["execId"], r["commission"]) for r in rows], [("a", 1.25)])
+
+    def test_change_cursor_resends_commission_update_once(self):
+        self.store.merge([make_execution_row("a", self.now - 60), make_execution_row("b", self.now - 30)])
+        _, cursor, _ = self.store.query()
+        self.assertTrue(self.store.set_commission("a", 1.25))
+        rows, cursor, found = self.store.query(since_seq=cursor)
+        self.assertTrue(found)
+        self.assertEqual([(r["execId"], r["commission"]) for r in rows], [("a", 1.25)])
+        self.assertEqual(self.store.query(since_seq=cursor)[0], [])
+        _, _, found = self.store.query(since_seq=self.store.floor - 1)
+        self.assertFalse(found)
+
+    def test_endpoint_change_cursor(self):
+        self.store.merge([make_execution_row("a", self.now - 60)])
+        self.store.mark_covered(self.now - 10 * 86400)
+        ibkr_bridge.connection_ready.set()
+        try:
+            with patch('ibkr_bridge.execution_store', self.store), patch('ibkr_bridge.submit_ib_call'):
+                first = json.loads(self.app.get('/executions').data)
+                self.store.set_commission("a", 2.0)
+                update = json.loads(self.app.get('/executions', query_string={"sinceCursor": first["cursor"]}).data)
+                again = json.loads(self.app.get('/executions', query_string={"sinceCursor": update["cursor"]}).data)
+        finally:
+            ibkr_bridge.connection_ready.clear()
+        self.assertEqual([r["commission"] for r in update["executions"]], [2.0])
+        self.assertEqual(again["executions"], [])
+        self.assertNotIn("cursorReset", again)
+
+    def test_prune_and_persist(self):
+        self.store.merge([make_execution_row("old", self.now - 40 * 86400), make_execution_row("new", self.now - 60)])
+        self.store.mark_covered(self.now - 45 * 86400)
+        self.assertEqual(self.store.prune(), 1)
+        self.assertTrue(self.store.covers(self.now - 30 * 86400 + 60))
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "executions.json")
+            with patch('ibkr_bridge.execution_store', self.store):
+                ibkr_bridge.save_execution_store(path)
+            restored = ibkr_bridge.ExecutionStore(retention_days=30)
+            with patch('ibkr_bridge.execution_store', restored):
+                self.assertEqual(ibkr_bridge.load_execution_store(path), 1)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def test_endpoint_serves_window_from_memory(self):
+        self.store.merge([make_execution_row("a", self.now - 2 * 86400), make_execution_row("b", self.now - 60)])
+        self.store.mark_covered(self.now - 10 * 86400)
+        ibkr_bridge.connection_ready.set()
+        try:
+            with patch('ibkr_bridge.execution_store', self.store), patch('ibkr_bridge.submit_ib_call') as submit:
+                week = json.loads(self.app.get('/executions?lookbackDays=7').data)
+                fresh = json.loads(self.app.get('/executions?lookbackDays=7&sinceExecId=a').data)
+                reset = json.loads(self.app.get('/executions?sinceExecId=zzz').data)
+            submit.assert_not_called()
+        finally:
+            ibkr_bridge.connection_ready.clear()
+        self.assertEqual(week["count"], 2)
+        self.assertEqual(week["latestExecId"], "b")
+        self.assertEqual([r["execId"] for r in fresh["executions"]], ["b"])
+        self.assertTrue(reset["cursorReset"])
+
+    def test_endpoint_since_includes_fill_in_same_second(self):
+        second = int(self.now) - 60
+        self.store.merge([make_execution_row("a", second - 1), make_execution_row("b", second),
+                          make_execution_row("c", second + 5)])
+        self.store.mark_covered(self.now - 10 * 86400)
+        since = datetime.fromtimestamp(second, timezone.utc).isoformat()
+        ibkr_bridge.connection_ready.set()
+        try:
+            with patch('ibkr_bridge.execution_store', self.store), patch('ibkr_bridge.submit_ib_call') as submit:
+                exact = json.loads(self.app.get('/executions', query_string={"since": since}).data)
+                later = json.loads(self.app.get('/executions', query_string={"since": second + 0.5}).data)
+            submit.assert_not_called()
+        finally:
+            ibkr_bridge.connection_ready.clear()
+        self.assertEqual([r["execId"] for r in exact["executions"]], ["b", "c"])
+        self.assertEqual([r["execId"] for r in later["executions"]], ["b", "c"])
+
+def make_trade(order_id, perm_id=0, status="Submitted", symbol="AAPL"):
+    trade = MagicMock()
+    trade.order = MagicMock(orderId=order_id, permId=perm_id, clientId=1, action="BUY", orderType="LMT",
+                            lmtPrice=1.5, auxPrice=0.0, totalQuantity=1.0, tif="DAY", orderRef="u1", account="DU123")
+    trade.orderStatus = MagicMock(status=status, remaining=1.0, filled=0.0, avgFillPrice=0.0, account="DU123")
+    trade.contract = MagicMock(symbol=symbol, secType="OPT", right="C", strike=100.0, conId=order_id * 10,
+                               lastTradeDateOrContractMonth="20261218", localSymbol=symbol, multiplier="100",
+                               currency="USD", exchange="SMART")
+    trade.orderState = MagicMock(initMarginChange="0")
+    return trade
+
+class TestRowRecords(unittest.TestCase):
+    def test_record_reads_like_a_dict(self):
+        row = ibkr_bridge.build_position_row(make_position("AAPL", 7, 100, sec_type="STK"), company_name="Apple Inc")
+        self.assertIsInstance(row, ibkr_bridge.PositionRow)
+        self.assertFalse(hasattr(row, "__dict__"))
+        self.assertEqual(row["key"], "DU123:7")
+        self.assertEqual(row.get("companyName"), "Apple Inc")
+        self.assertIsNone(row.get("missing"))
+        with self.assertRaises(KeyError):
+            row["missing"]
+        self.assertEqual(list(row.to_dict())[:3], ["key", "account", "symbol"])
+
+    def test_init_accepts_exactly_the_slots(self):
+        for cls in (ibkr_bridge.PositionRow, ibkr_bridge.PortfolioRow, ibkr_bridge.ExecutionRow, ibkr_bridge.OrderRow):
+            row = cls(**{name: name for name in cls.__slots__})
+            self.assertEqual(row.to_dict(), {name: name for name in cls.__slots__}, cls.__name__)
+            self.assertIsNone(cls().symbol)
+            with self.assertRaises(TypeError):
+                cls(bogus=1)
+
+    def test_replace_and_equality(self):
+        row = ibkr_bridge.build_order_row(make_trade(1))
+        self.assertEqual(row, ibkr_bridge.build_order_row(make_trade(1)))
+        changed = row.replace(status="Filled")
+        self.assertEqual((row["status"], changed["status"]), ("Submitted", "Filled"))
+        self.assertNotEqual(row, changed)
+        with self.assertRaises(TypeError):
+            ibkr_bridge.OrderRow(bogus=1)
+
+    def test_records_encode_as_objects(self):
+        row = ibkr_bridge.ExecutionRow(execId="a", price=float("nan"), symbol="AAPL")
+        for use_orjson in (True, False):
+            if use_orjson and ibkr_bridge.orjson is None:
+                continue
+            provider = ibkr_bridge.BridgeJSONProvider(ibkr_bridge.app, use_orjson)
+            data = json.loads(provider.encode({"executions": [row]}))
+            self.assertEqual(data["executions"][0], dict(row.to_dict(), price=None))
+
+    def test_store_keeps_records_and_merges_partial_updates(self):
+        store = ibkr_bridge.ExecutionStore(retention_days=30)
+        store.merge([make_execution_row("a", time.time() - 60)])
+        store.set_commission("a", 1.25, realized_pnl=3.0)
+        rows, _, _ = store.query()
+        self.assertIsInstance(rows[0], ibkr_bridge.ExecutionRow)
+        self.assertEqual((rows[0]["commission"], rows[0]["realizedPnl"], rows[0]["symbol"]), (1.25, 3.0, "AAPL"))
+        restored = ibkr_bridge.ExecutionStore(retention_days=30)
+        restored.restore(json.loads(json.dumps(store.dump())))
+        self.assertEqual(restored.query()[0], rows)
+
+class TestOrderBook(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        self.book = ibkr_bridge.VersionedBook()
+        self.book.ready = True
+        self.patches = [
+            patch('ibkr_bridge.orders_book', self.book),
+            patch.dict(ibkr_bridge.order_trades, clear=True),
+            patch.dict(ibkr_bridge.order_ids, clear=True),
+            patch.dict(ibkr_bridge.order_perm_ids, clear=True),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_events_rekey_on_perm_id_and_drop_done_orders(self):
+        trade = make_trade(7)
+        ibkr_bridge.on_order_event(trade)
+        self.assertIn("ord:1:7", self.book.rows)
+        trade.order.permId = 555
+        ibkr_bridge.on_order_event(trade)
+        self.assertEqual(list(self.book.rows), ["perm:555"])
+        self.assertIs(ibkr_bridge.find_order_trade(perm_id=555), trade)
+        self.assertIs(ibkr_bridge.find_order_trade(order_id=7), trade)
+        trade.orderStatus.status = "Filled"
+        ibkr_bridge.on_order_event(trade)
+        self.assertEqual(self.book.rows, {})
+        self.assertIsNone(ibkr_bridge.find_order_trade(order_id=7))
+
+    def test_orders_and_cancel_skip_open_orders_request(self):
+        trade = make_trade(8, perm_id=900)
+        ibkr_bridge.on_order_event(trade)
+        ib = MagicMock()
+        ibkr_bridge.connection_ready.set()
+        try:
+            with patch('ibkr_bridge.get_ib_instance', return_value=ib), \
+                    patch('ibkr_bridge.run_on_ib_loop', return_value=(trade, None)) as run:
+                orders = json.loads(self.app.get('/orders').data)
+                resp = self.app.post('/order/cancel', json={"permId": 900})
+        finally:
+            ibkr_bridge.connection_ready.clear()
+        ib.reqOpenOrdersAsync.assert_not_called()
+        self.assertEqual(orders["count"], 1)
+        self.assertEqual(orders["orders"][0]["orderId"], 8)
+        self.assertEqual(resp.status_code, 200)
+        run.assert_called_once_with(ib.cancelOrder, trade.order)
+
+def run_inline(fn, *args, **kwargs):
+    kwargs.pop("invoke_timeout", None)
+    return fn(*args, **kwargs), None
+
+class TestOrderBatch(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        self.ib = MagicMock()
+        self.placed = []
+        def place(contract, order):
+            self.placed.append((contract, order))
+            if contract.secType == "OPT" and contract.strike == 999.0:
+                raise ValueError("rejected")
+            return make_trade(len(self.placed), symbol=contract.symbol)
+        self.ib.placeOrder.side_effect = place
+        def qualify(contracts, timeout):
+            for i, c in enumerate(contracts):
+                c.conId = 0 if getattr(c, "strike", None) == 1.0 else 100 + i
+            return None
+        self.patches = [
+            patch('ibkr_bridge.get_ib_instance', return_value=self.ib),
+            patch('ibkr_bridge.run_on_ib_loop', side_effect=run_inline),
+            patch('ibkr_bridge.qualify_order_contracts', side_effect=qualify),
+        ]
+        for p in self.patches:
+            p.start()
+        ibkr_bridge.connection_ready.set()
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        for p in self.patches:
+            p.stop()
+
+    def leg(self, action, strike, **extra):
+        leg = {"symbol": "AAPL", "secType": "OPT", "expiration": "20261218", "strike": strike,
+               "right": "P", "action": action, "quantity": 1, "limitPrice": 1.0}
+        leg.update(extra)
+        return leg
+
+    def test_batch_reports_per_leg_results(self):
+        resp = self.app.post('/orders/batch', json={"uid": "u1", "orders": [
+            self.leg("BUY", 150), self.leg("SELL", 999.0)]})
+        body = json.loads(resp.data)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([r["index"] for r in body["results"]], [0, 1])
+        self.assertEqual(body["results"][0]["status"], "Submitted")
+        self.assertEqual(body["results"][1]["error"], "rejected")
+        self.assertEqual((body["placed"], body["failed"]), (1, 1))
+        self.assertEqual(self.placed[0][1].orderRef, "u1")
+
+    def test_unqualified_leg_rejects_whole_batch(self):
+        for combo in (False, True):
+            resp = self.app.post('/orders/batch', json={"combo": combo, "action": "BUY", "quantity": 1, "limitPrice": 0.3,
+                                                        "orders": [self.leg("BUY", 150), self.leg("SELL", 1.0)]})
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(json.loads(resp.data)["legs"], [1])
+        self.assertEqual(self.placed, [])
+
+    def test_invalid_combo_ratio_is_rejected_before_qualifying(self):
+        for ratio in (None, 0, -1, 1.5, "x"):
+            with patch('ibkr_bridge.qualify_order_contracts') as qualify:
+                resp = self.app.post('/orders/batch', json={
+                    "combo": True, "action": "BUY", "quantity": 1, "limitPrice": 0.3,
+                    "orders": [self.leg("BUY", 150, ratio=ratio), self.leg("SELL", 145)]})
+            self.assertEqual(resp.status_code, 400, ratio)
+            qualify.assert_not_called()
+        self.assertEqual(self.placed, [])
+
+    def test_roll_as_combo_order(self):
+        resp = self.app.post('/orders/batch', json={
+            "combo": True, "action": "BUY", "quantity": 2, "limitPrice": 0.35,
+            "orders": [self.leg("BUY", 150), self.leg("SELL", 145)]})
+        body = json.loads(resp.data)
+        self.assertEqual(resp.status_code, 200)
+        combo, order = self.placed[0]
+        self.assertEqual(combo.secType, "BAG")
+        self.assertEqual([(l.conId, l.action) for l in combo.comboLegs], [(100, "BUY"), (101, "SELL")])
+        self.assertEqual(order.totalQuantity, 2.0)
+        self.assertEqual(len(body["results"][0]["legs"]), 2)
+
+    def test_invalid_batch_is_rejected_before_placing(self):
+        resp = self.app.post('/orders/batch', json={"orders": [self.leg("BUY", 150), {"symbol": "AAPL"}]})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.placed, [])
+
+    def test_cancel_all_for_symbol(self):
+        trades = {"perm:1": make_trade(1, 1), "perm:2": make_trade(2, 2, symbol="MSFT"), "perm:3": make_trade(3, 3)}
+        with patch.dict(ibkr_bridge.order_trades, trades, clear=True):
+            body = json.loads(self.app.post('/orders/cancel-all?symbol=aapl').data)
+        self.assertEqual(sorted(r["orderId"] for r in body["results"]), [1, 3])
+        self.assertEqual(body["cancelled"], 2)
+        self.assertEqual(self.ib.cancelOrder.call_count, 2)
+
+class TestOrderPlacement(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        self.ib = MagicMock()
+        self.trade = make_trade(11, status="PendingSubmit")
+        self.trade.log = []
+        self.ib.placeOrder.return_value = self.trade
+        def qualify(contracts, timeout):
+            for c in contracts:
+                c.conId = 4242
+            return None
+        self.patches = [
+            patch('ibkr_bridge.get_ib_instance', return_value=self.ib),
+            patch('ibkr_bridge.run_on_ib_loop', side_effect=run_inline),
+            patch('ibkr_bridge.qualify_order_contracts', side_effect=qualify),
+            patch('ibkr_bridge.orders_book', ibkr_bridge.VersionedBook()),
+            patch.dict(ibkr_bridge.order_trades, clear=True),
+            patch.dict(ibkr_bridge.order_ids, clear=True),
+            patch.dict(ibkr_bridge.order_perm_ids, clear=True),
+        ]
+        for p in self.patches:
+            p.start()
+        ibkr_bridge.connection_ready.set()
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        for p in self.patches:
+            p.stop()
+
+    def order_body(self, **extra):
+        body = {"symbol": "AAPL", "secType": "STK", "action": "BUY", "quantity": 1, "limitPrice": 100.0}
+        body.update(extra)
+        return body
+
+    def test_waits_for_submitted(self):
+        def ack():
+            time.sleep(0.05)
+            self.trade.orderStatus.status = "Submitted"
+            ibkr_bridge.on_order_event(self.trade)
+        threading.Thread(target=ack).start()
+        body = json.loads(self.app.post('/order', json=self.order_body(wait=True)).data)
+        self.assertEqual(body["status"], "Submitted")
+        self.assertFalse(body["timedOut"])
+        self.assertEqual(self.ib.placeOrder.call_args[0][0].conId, 4242)
+
+    def test_wait_deadline_and_no_wait(self):
+        body = json.loads(self.app.post('/order', json=self.order_body(waitSeconds=0.05)).data)
+        self.assertTrue(body["timedOut"])
+        self.assertEqual(body["status"], "PendingSubmit")
+        body = json.loads(self.app.post('/order', json=self.order_body()).data)
+        self.assertIsNone(body["waitedMs"])
+
+    def test_stream_ends_when_order_is_done(self):
+        other = make_trade(12, status="Submitted")
+        other.log = []
+        resp = self.app.get('/orders/stream?orderId=11&maxSeconds=5', buffered=False)
+        chunks = resp.response
+        first = next(chunks)
+        self.trade.orderStatus.status = "Submitted"
+        ibkr_bridge.on_order_event(other)
+        ibkr_bridge.on_order_event(self.trade)
+        self.trade.orderStatus.status = "Filled"
+        ibkr_bridge.on_order_event(self.trade)
+        text = b"".join([first, *chunks]).decode()
+        resp.close()
+        events = [json.loads(line[6:]) for line in text.splitlines() if line.startswith("data: {\"")]
+        self.assertEqual([(e["orderId"], e["status"]) for e in events], [(11, "Submitted"), (11, "Filled")])
+        self.assertIn("event: end", text)
+        self.assertEqual(ibkr_bridge.order_stream_queues, set())
+
+    def test_stream_rejects_bad_max_seconds(self):
+        for value in ("abc", "0", "-5", "nan"):
+            resp = self.app.get('/orders/stream', query_string={"maxSeconds": value})
+            self.assertEqual(resp.status_code, 400, value)
+        self.assertEqual(ibkr_bridge.order_stream_queues, set())
+
+    def test_stream_for_finished_order_ends_immediately(self):
+        # Indexed but already done (the fill event is still being processed).
+        ibkr_bridge.index_order_trade(self.trade)
+        self.trade.orderStatus.status = "Filled"
+        start = time.time()
+        text = self.app.get('/orders/stream?orderId=11&maxSeconds=5').get_data(as_text=True)
+        self.assertLess(time.time() - start, 1.0)
+        self.assertIn('"status":"Filled"', text)
+        self.assertTrue(text.endswith("event: end\ndata: {}\n\n"))
+        self.assertEqual(ibkr_bridge.order_stream_queues, set())
+
+    def test_failed_lookup_does_not_leak_subscription(self):
+        with patch('ibkr_bridge.find_order_trade', side_effect=RuntimeError("index")):
+            with self.assertRaises(RuntimeError):
+                self.app.get('/orders/stream?orderId=11&maxSeconds=5').get_data()
+        self.assertEqual(ibkr_bridge.order_stream_queues, set())
+
+class TestWarmup(unittest.TestCase):
+    def setUp(self):
+        self.app = ibkr_bridge.app.test_client()
+        ibkr_bridge.qualified_contracts_cache.clear()
+        ibkr_bridge.historical_cache.clear()
+        ibkr_bridge.market_data_streams.clear()
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        ibkr_bridge.market_data_streams.clear()
+
+    def test_underlying_qualification_is_cached(self):
+        def submit(fn, *contracts, **kwargs):
+            for c in contracts:
+                c.conId = 265598
+            return MagicMock(), None
+        with patch('ibkr_bridge.submit_ib_call', side_effect=submit) as sub, \
+                patch('ibkr_bridge.wait_for_future', return_value=(None, None)):
+            self.assertIsNone(ibkr_bridge.qualify_underlyings([ibkr_bridge.Stock('AAPL', 'SMART', 'USD')], 1.0))
+            again = ibkr_bridge.Stock('AAPL', 'SMART', 'USD')
+            self.assertIsNone(ibkr_bridge.qualify_underlyings([again], 1.0))
+        self.assertEqual(sub.call_count, 1)
+        self.assertEqual(again.conId, 265598)
+
+    def test_run_warmup_reports_progress(self):
+        def qualify(contracts, timeout, epoch=None):
+            for c in contracts:
+                c.conId = 0 if c.symbol == "BAD" else 1
+            return None
+        ibkr_bridge.connection_ready.set()
+        chain = {"symbol": "AAPL", "expirations": [], "strikes": []}
+        with patch('ibkr_bridge.BRIDGE_WARMUP_SYMBOLS', ["AAPL", "BAD"]), \
+                patch('ibkr_bridge.BRIDGE_WARMUP_PACING', 0), \
+                patch('ibkr_bridge.positions_book', ibkr_bridge.VersionedBook()), \
+                patch('ibkr_bridge.qualify_underlyings', side_effect=qualify), \
+                patch('ibkr_bridge.open_market_data_streams', return_value=(1, None)) as streams, \
+                patch('ibkr_bridge.request_option_chain_payload', return_value=(chain, None)), \
+                patch('ibkr_bridge.request_historical_bars', return_value=([{"close": 1.0}], None)):
+            ibkr_bridge.run_warmup(ibkr_bridge.get_current_epoch())
+            with patch('ibkr_bridge.get_ib_instance', return_value=MagicMock(**{"isConnected.return_value": True})):
+                health = json.loads(self.app.get('/health').data)
+        warmup = health["warmup"]
+        self.assertEqual(warmup["status"], "done")
+        self.assertEqual(warmup["steps"]["qualify"], {"done": 1, "total": 2, "failed": 0})
+        self.assertEqual(warmup["steps"]["chains"]["done"], 1)
+        self.assertEqual(len(streams.call_args[0][0]), 1)
+        cached, _ = ibkr_bridge.cache_read(ibkr_bridge.option_chain_cache, "AAPL", 60)
+        self.assertEqual(cached, chain)
+        params = ibkr_bridge.historical_params({"duration": ibkr_bridge.BRIDGE_WARMUP_BARS_DURATION})
+        self.assertEqual(len(ibkr_bridge.historical_cache), 1)
+        self.assertIn(params["durationStr"], next(iter(ibkr_bridge.historical_cache)))
+
+    def test_historical_route_serves_prefetched_bars(self):
+        def qualify(contracts, timeout, epoch=None):
+            for c in contracts:
+                c.conId = 265598
+            return None
+        ibkr_bridge.connection_ready.set()
+        with patch('ibkr_bridge.BRIDGE_WARMUP_SYMBOLS', ["AAPL"]), \
+                patch('ibkr_bridge.BRIDGE_WARMUP_PACING', 0), \
+                patch('ibkr_bridge.BRIDGE_WARMUP_STREAMS', False), \
+                patch('ibkr_bridge.BRIDGE_WARMUP_CHAINS', False), \
+                patch('ibkr_bridge.positions_book', ibkr_bridge.VersionedBook()), \
+                patch('ibkr_bridge.qualify_underlyings', side_effect=qualify), \
+                patch('ibkr_bridge.request_historical_bars', return_value=([{"close": 2.0}], None)):
+            ibkr_bridge.run_warmup(ibkr_bridge.get_current_epoch())
+        ibkr_bridge.connection_ready.set()
+        request = {"symbol": "aapl", "duration": ibkr_bridge.BRIDGE_WARMUP_BARS_DURATION}
+        with patch('ibkr_bridge.get_loop', return_value=MagicMock()), \
+                patch('ibkr_bridge.qualify_underlyings') as qualify_route, \
+                patch('ibkr_bridge.submit_ib_call') as submit:
+            body = json.loads(self.app.post('/historical', json=request).data)
+        qualify_route.assert_not_called()
+        submit.assert_not_called()
+        self.assertEqual(body["bars"], [{"close": 2.0}])
+
+    def test_empty_bars_are_not_cached(self):
+        ibkr_bridge.connection_ready.set()
+        with patch('ibkr_bridge.get_loop', return_value=MagicMock()), \
+                patch('ibkr_bridge.qualify_underlyings', return_value=None), \
+                patch('ibkr_bridge.request_historical_bars', return_value=([], None)) as fetch:
+            self.app.post('/historical', json={"symbol": "AAPL"})
+            self.app.post('/historical', json={"symbol": "AAPL"})
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(ibkr_bridge.historical_cache, {})
+
+    def test_daily_bars_expire_at_session_boundary(self):
+        now = eastern_ts(2026, 10, 20, 8)
+        daily = ibkr_bridge.historical_params({"barSize": "1 day"})
+        self.assertEqual(daily["barSizeSetting"], "1 day")
+        with patch('ibkr_bridge.time.time', return_value=now):
+            self.assertEqual(ibkr_bridge.historical_cache_expiry(daily), eastern_ts(2026, 10, 20, 9, 30))
+
+    def test_market_data_reads_open_stream(self):
+        ticker = MagicMock(last=101.0, bid=100.9, ask=101.1, high=102.0, low=99.0, volume=1000, close=100.0)
+        with ibkr_bridge.market_data_streams_lock:
+            ibkr_bridge.market_data_streams["AAPL"] = ticker
+        ibkr_bridge.connection_ready.set()
+        with patch('ibkr_bridge.submit_ib_call') as submit:
+            body = json.loads(self.app.get('/market-data/aapl').data)
+        submit.assert_not_called()
+        self.assertEqual((body["last"], body["source"]), (101.0, "stream"))
+
+class TestReconnect(unittest.TestCase):
+    def setUp(self):
+        ibkr_bridge.market_data_streams.clear()
+        ibkr_bridge.suspended_market_data_streams.clear()
+        ibkr_bridge.disconnected_at = None
+
+    def tearDown(self):
+        ibkr_bridge.connection_ready.clear()
+        ibkr_bridge.reconnect_wakeup.clear()
+        ibkr_bridge.market_data_streams.clear()
+        ibkr_bridge.suspended_market_data_streams.clear()
+        ibkr_bridge.disconnected_at = None
+
+    def ready_patches(self):
+        return [patch('ibkr_bridge.resync_portfolio_books'), patch('ibkr_bridge.resync_order_book'),
+                patch('ibkr_bridge.start_account_summary_stream'), patch('ibkr_bridge.backfill_execution_store')]
+
+    def test_streams_and_caches_survive_reconnect(self):
+        contract = ibkr_bridge.Stock('AAPL', 'SMART', 'USD')
+        ibkr_bridge.market_data_streams["AAPL"] = MagicMock(contract=contract)
+        ibkr_bridge.cache_write(ibkr_bridge.option_chain_cache, "AAPL", {"symbol": "AAPL"})
+        ibkr_bridge.connection_ready.set()
+        epoch = ibkr_bridge.get_current_epoch()
+
+        ibkr_bridge.on_disconnect()
+        self.assertFalse(ibkr_bridge.connection_ready.is_set())
+        self.assertTrue(ibkr_bridge.reconnect_wakeup.is_set())
+        self.assertIsNone(ibkr_bridge.streamed_market_payload("AAPL"))
+
+        patches = self.ready_patches()
+        for p in patches:
+            p.start()
+        try:
+            with patch('ibkr_bridge.open_market_data_streams', return_value=(1, None)) as streams:
+                ibkr_bridge.mark_connection_ready()
+        finally:
+            for p in patches:
+                p.stop()
+        self.assertTrue(ibkr_bridge.connection_ready.is_set())
+        self.assertEqual(ibkr_bridge.get_current_epoch(), epoch + 1)
+        self.assertEqual(streams.call_args[0][0], [contract])
+        self.assertEqual(ibkr_bridge.suspended_market_data_streams, {})
+        self.assertIsNotNone(ibkr_bridge.diag_state["lastRecoveryMs"])
+        cached, _ = ibkr_bridge.cache_read(ibkr_bridge.option_chain_cache, "AAPL", 60)
+        self.assertEqual(cached, {"symbol": "AAPL"})
+
+    def test_failed_resubscribe_is_retried_next_ready(self):
+        contract = ibkr_bridge.Stock('MSFT', 'SMART', 'USD')
+        ibkr_bridge.suspended_market_data_streams["MSFT"] = contract
+        with patch('ibkr_bridge.open_market_data_streams', return_value=(0, "invoke-timeout")):
+            self.assertEqual(ibkr_bridge.resume_market_data_streams(), (0, "invoke-timeout"))
+        self.assertEqual(ibkr_bridge.suspended_market_data_streams, {"MSFT": contract})
+
+    def test_wait_for_ib_sync(self):
+        _ib = MagicMock(**{"isConnected.return_value": True, "client.isReady.return_value": True,
+                           "managedAccounts.return_value": ["DU123"]})
+        self.assertTrue(ibkr_bridge.wait_for_ib_sync(_ib, 1.0))
+        _ib.managedAccounts.return_value = []
+        start = time.time()
+        self.assertFalse(ibkr_bridge.wait_for_ib_sync(_ib, 0.1))
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_reconnect_delay_backs_off_to_interval(self):
+        with patch('ibkr_bridge.IB_RECONNECT_MIN_INTERVAL', 0.5), patch('ibkr_bridge.IB_RECONNECT_INTERVAL', 3.0):
+            self.assertEqual([ibkr_bridge.reconnect_delay(n) for n in range(5)], [0.0, 0.5, 1.0, 2.0, 3.0])
+
+    def test_heartbeat_disconnect_stays_in_process(self):
+        _ib = MagicMock()
+        with patch('ibkr_bridge.run_on_ib_loop', return_value=(None, None)) as run, \
+                patch('ibkr_bridge.os._exit') as exit_:
+            ibkr_bridge.request_disconnect(_ib)
+        run.assert_called_once()
+        self.assertIs(run.call_args[0][0], _ib.disconnect)
+        exit_.assert_not_called()
+        with patch('ibkr_bridge.run_on_ib_loop', return_value=(None, "invoke-timeout")), \
+                patch('ibkr_bridge.os._exit') as exit_:
+            ibkr_bridge.request_disconnect(_ib)
+        exit_.assert_called_once_with(1)
+
+class TestSimulatedIB(unittest.TestCase):
+    def test_latencies_are_seeded(self):
+        def draws(seed):
+            config = fast_sim_config(seed=seed, latency_ms=10.0, jitter_ms=5.0, latency_overrides={"reqHistoricalDataAsync": 200.0})
+            rng = sim_ib.random.Random(seed)
+            return [config.latency(name, rng) for name in ("reqTickersAsync", "reqHistoricalDataAsync") * 3]
+        self.assertEqual(draws(7), draws(7))
+        self.assertNotEqual(draws(7), draws(8))
+        self.assertTrue(all(0.195 <= d <= 0.205 for d in draws(7)[1::2]))
+
+    def test_injected_market_data_error(self):
+        errors = []
+        with SimulatedGateway(error_rate=1.0) as gw:
+            gw.sim.errorEvent += lambda *args: errors.append(args[1])
+            ticker, = gw.call(gw.sim.reqTickersAsync(ibkr_bridge.Stock('AAPL', 'SMART', 'USD')))
+        self.assertIn(10197, errors)
+        self.assertFalse(ibkr_bridge.has_market_price(ticker))
+
+    def test_historical_pacing_violation(self):
+        contract = ibkr_bridge.Stock('AAPL', 'SMART', 'USD')
+        errors = []
+        with SimulatedGateway(pacing_limit=2) as gw:
+            gw.sim.errorEvent += lambda *args: errors.append(args[1])
+            first, second, third = [gw.call(gw.sim.reqHistoricalDataAsync(contract, durationStr='1 D', barSizeSetting='1 hour'))
+                                    for _ in range(3)]
+        self.assertEqual(len(first), 24)
+        self.assertEqual([b.close for b in first], [b.close for b in second])
+        self.assertEqual(third, [])
+        self.assertIn(162, errors)
+
+    def test_disconnect_fails_hung_requests(self):
+        with SimulatedGateway(timeout_rate=1.0) as gw:
+            fut = ibkr_bridge.asyncio.run_coroutine_threadsafe(gw.sim.reqCurrentTimeAsync(), gw.loop)
+            time.sleep(0.05)
+            self.assertFalse(fut.done())
+            gw.loop.call_soon_threadsafe(gw.sim.disconnect)
+            with self.assertRaises(ConnectionError):
+                fut.result(2.0)
+            self.assertEqual(gw.sim.managedAccounts(), [])
+
+    def test_market_order_fills_and_updates_position(self):
+        statuses, fills = [], []
+        with SimulatedGateway() as gw:
+            sim = gw.sim
+            sim.orderStatusEvent += lambda trade: statuses.append(trade.orderStatus.status)
+            sim.execDetailsEvent += lambda trade, fill: fills.append(fill)
+            contract = ibkr_bridge.Stock('AAPL', 'SMART', 'USD')
+            held = sim.position_rows[sim._stock('AAPL').conId].position
+            trade, err = ibkr_bridge.run_on_ib_loop(sim.placeOrder, contract, ibkr_bridge.MarketOrder('BUY', 5))
+            self.assertIsNone(err)
+            deadline = time.time() + 2
+            while trade.orderStatus.status != 'Filled' and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(statuses, ['Submitted', 'Filled'])
+        self.assertEqual(fills[0].execution.shares, 5)
+        self.assertEqual(sim.position_rows[contract.conId].position, held + 5)
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 import argparse
+import http.client
 import json
 import os
+import queue
 import sys
+import threading
 import time
-import urllib.error
-import urllib.request
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from pathlib import Path
+from urllib.parse import urlsplit
 
 SCRIPT_ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(SCRIPT_ROOT / "lib"))
@@ -29,33 +31,104 @@ def load_env():
         return
 
 
-def http_json(url, method="GET", payload=None, headers=None, timeout=10):
-    body = None
-    request_headers = {"Accept": "application/json"}
-    if headers:
-        request_headers.update(headers)
-    if payload is not None:
-        body = json.dumps(payload).encode("utf-8")
-        request_headers["Content-Type"] = "application/json"
-    req = urllib.request.Request(url, data=body, headers=request_headers, method=method)
-    start = time.perf_counter()
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            raw = resp.read()
-            elapsed = time.perf_counter() - start
-            if raw:
-                return json.loads(raw.decode("utf-8")), elapsed, None
-            return None, elapsed, None
-    except urllib.error.HTTPError as exc:
-        elapsed = time.perf_counter() - start
+class Timing:
+    """Per-request phases; connect is 0 when a pooled connection was reused."""
+
+    __slots__ = ("connect", "ttfb", "body", "total", "reused")
+
+    def __init__(self, connect=0.0, ttfb=0.0, body=0.0, total=0.0, reused=False):
+        self.connect = connect
+        self.ttfb = ttfb
+        self.body = body
+        self.total = total
+        self.reused = reused
+
+
+class KeepAliveClient:
+    """Small pool of persistent http.client connections to one bridge.
+
+    Connections are opened explicitly so TCP/TLS setup is timed apart from
+    time-to-first-byte, and returned to the pool after every complete
+    response so later requests skip the handshake.
+    """
+
+    def __init__(self, base_url, headers=None, timeout=10, size=1):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.headers = {"Accept": "application/json", "Connection": "keep-alive"}
+        self.headers.update(headers or {})
+        self.idle = queue.LifoQueue()
+        self.size = max(1, size)
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def _acquire(self):
         try:
-            detail = exc.read().decode("utf-8")
-        except Exception:
-            detail = str(exc)
-        return None, elapsed, f"HTTP {exc.code}: {detail}"
-    except Exception as exc:
-        elapsed = time.perf_counter() - start
-        return None, elapsed, str(exc)
+            return self.idle.get_nowait(), True
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            with self.lock:
+                self.opened += 1
+            return cls(self.netloc, timeout=self.timeout), False
+
+    def _release(self, conn):
+        if self.idle.qsize() < self.size:
+            self.idle.put(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def request_json(self, path, method="GET", payload=None):
+        body = None
+        headers = dict(self.headers)
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            conn, reused = self._acquire()
+            timing = Timing(reused=reused)
+            start = time.perf_counter()
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    timing.connect = time.perf_counter() - start
+                sent = time.perf_counter()
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                first_byte = time.perf_counter()
+                raw = resp.read()
+                done = time.perf_counter()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as exc:
+                conn.close()
+                if reused and not attempt:
+                    # The server dropped an idle keep-alive socket; retry on a fresh one.
+                    continue
+                return None, Timing(total=time.perf_counter() - start), str(exc)
+            except Exception as exc:
+                conn.close()
+                return None, Timing(total=time.perf_counter() - start), str(exc)
+            timing.ttfb = first_byte - sent
+            timing.body = done - first_byte
+            timing.total = done - start
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            if resp.status >= 400:
+                return None, timing, f"HTTP {resp.status}: {raw.decode('utf-8', 'replace')}"
+            try:
+                return (json.loads(raw.decode("utf-8")) if raw else None), timing, None
+            except ValueError as exc:
+                return None, timing, f"invalid-json: {exc}"
 
 
 def parse_expiration(raw):
@@ -153,20 +226,53 @@ def pick_strike_window(strikes, target, count):
     return window[:count]
 
 
-def summarize(label, values, errors):
-    if not values:
+def percentile(values_sorted, p):
+    idx = int(round((p / 100.0) * (len(values_sorted) - 1)))
+    return values_sorted[idx]
+
+
+def summarize(label, timings, errors):
+    if not timings:
         return f"{label}: no samples (errors={errors})"
-    values_sorted = sorted(values)
-    count = len(values_sorted)
-    avg = sum(values_sorted) / count
-    def pct(p):
-        idx = int(round((p / 100.0) * (count - 1)))
-        return values_sorted[idx]
-    return (
-        f"{label}: n={count} avg={avg:.3f}s min={values_sorted[0]:.3f}s "
-        f"p50={pct(50):.3f}s p90={pct(90):.3f}s p95={pct(95):.3f}s max={values_sorted[-1]:.3f}s "
-        f"errors={errors}"
-    )
+    totals = sorted(t.total for t in timings)
+    count = len(totals)
+    avg = sum(totals) / count
+    new_conns = [t.connect for t in timings if not t.reused]
+    ttfb = sorted(t.ttfb for t in timings)
+    body = sorted(t.body for t in timings)
+    lines = [
+        f"{label}: n={count} avg={avg:.3f}s min={totals[0]:.3f}s "
+        f"p50={percentile(totals, 50):.3f}s p90={percentile(totals, 90):.3f}s p95={percentile(totals, 95):.3f}s "
+        f"max={totals[-1]:.3f}s errors={errors}",
+        f"  ttfb p50={percentile(ttfb, 50) * 1000:.1f}ms p95={percentile(ttfb, 95) * 1000:.1f}ms"
+        f"  body p50={percentile(body, 50) * 1000:.1f}ms p95={percentile(body, 95) * 1000:.1f}ms"
+        f"  connect n={len(new_conns)}"
+        + (f" avg={sum(new_conns) / len(new_conns) * 1000:.1f}ms" if new_conns else ""),
+    ]
+    return "\n".join(lines)
+
+
+def run_requests(client, count, concurrency, fn):
+    """Runs fn() count times with up to `concurrency` in flight; returns (timings, errors)."""
+    timings = []
+    errors = 0
+    first_error = None
+    if concurrency <= 1:
+        results = (fn() for _ in range(count))
+    else:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        results = (f.result() for f in as_completed([executor.submit(fn) for _ in range(count)]))
+    for _, timing, err in results:
+        if err:
+            errors += 1
+            first_error = first_error or err
+        else:
+            timings.append(timing)
+    if concurrency > 1:
+        executor.shutdown()
+    if first_error:
+        print(f"[{fn.__name__}] {errors} error(s), first: {' '.join(first_error.split())[:160]}")
+    return timings, errors
 
 
 def main():
@@ -182,6 +288,8 @@ def main():
     parser.add_argument("--otm-pct", type=float, default=0.05)
     parser.add_argument("--timeout", type=int, default=10)
     parser.add_argument("--sleep", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Requests in flight at once; above 1 the --sleep pacing is skipped.")
     parser.add_argument("--batch-size", type=int, default=0)
     parser.add_argument("--batch-iterations", type=int, default=5)
     parser.add_argument("--batch-parallel", type=int, default=1)
@@ -191,36 +299,24 @@ def main():
     headers = {}
     if args.api_key:
         headers["X-API-KEY"] = args.api_key
+    concurrency = max(1, args.concurrency)
+    client = KeepAliveClient(base_url, headers=headers, timeout=args.timeout,
+                             size=max(concurrency, args.batch_parallel))
 
     print(f"Bridge URL: {base_url}")
-    print(f"Symbol: {args.symbol} Right: {args.right} Iterations: {args.iterations}")
-
-    market_times = []
-    chain_times = []
-    quote_times = []
-    batch_times = []
-    errors = {"market": 0, "chain": 0, "quote": 0, "batch": 0}
+    print(f"Symbol: {args.symbol} Right: {args.right} Iterations: {args.iterations} Concurrency: {concurrency}")
 
-    market_url = f"{base_url}/market-data/{args.symbol}"
-    chain_url = f"{base_url}/option-chain/{args.symbol}"
-
-    market_data, elapsed, err = http_json(market_url, headers=headers, timeout=args.timeout)
+    market_data, market_timing, err = client.request_json(f"/market-data/{args.symbol}")
     if err:
-        errors["market"] += 1
         print(f"[market-data] error: {err}")
-    else:
-        market_times.append(elapsed)
 
     price = None
     if market_data:
         price = market_data.get("last") or market_data.get("bid") or market_data.get("close")
 
-    chain_data, elapsed, err = http_json(chain_url, headers=headers, timeout=args.timeout)
-    if err:
-        errors["chain"] += 1
-        print(f"[option-chain] error: {err}")
-    else:
-        chain_times.append(elapsed)
+    chain_data, chain_timing, chain_err = client.request_json(f"/option-chain/{args.symbol}")
+    if chain_err:
+        print(f"[option-chain] error: {chain_err}")
 
     expiration = None
     strike = None
@@ -240,57 +336,46 @@ def main():
         "strike": strike,
         "right": args.right
     }
-    quote_url = f"{base_url}/option-quote"
-    batch_url = f"{base_url}/option-quote/batch"
 
     print(f"Selected contract: {args.symbol} {expiration} {args.right} {strike}")
     if args.batch_size > 0:
         print(f"Batch mode: size={args.batch_size} iterations={args.batch_iterations} parallel={args.batch_parallel}")
 
-    for _ in range(args.iterations):
-        _, elapsed, err = http_json(quote_url, method="POST", payload=quote_payload, headers=headers, timeout=args.timeout)
-        if err:
-            errors["quote"] += 1
-        else:
-            quote_times.append(elapsed)
-        time.sleep(args.sleep)
+    def run_quote():
+        result = client.request_json("/option-quote", method="POST", payload=quote_payload)
+        if concurrency <= 1:
+            time.sleep(args.sleep)
+        return result
+
+    quote_times, quote_errors = run_requests(client, args.iterations, concurrency, run_quote)
 
+    batch_times, batch_errors = [], 0
     if args.batch_size > 0:
         strikes = pick_strike_window(chain_data.get("strikes"), strike, args.batch_size)
-        batch_contracts = [{
+        batch_payload = {"contracts": [{
             "symbol": args.symbol,
             "expiration": expiration,
             "strike": s,
             "right": args.right
-        } for s in strikes]
-        batch_payload = {"contracts": batch_contracts}
+        } for s in strikes]}
 
         def run_batch():
-            return http_json(batch_url, method="POST", payload=batch_payload, headers=headers, timeout=args.timeout)
+            return client.request_json("/option-quote/batch", method="POST", payload=batch_payload)
 
+        batch_concurrency = max(concurrency, args.batch_parallel)
         for _ in range(args.batch_iterations):
-            if args.batch_parallel > 1:
-                with ThreadPoolExecutor(max_workers=args.batch_parallel) as executor:
-                    futures = [executor.submit(run_batch) for _ in range(args.batch_parallel)]
-                    for future in as_completed(futures):
-                        _, elapsed, err = future.result()
-                        if err:
-                            errors["batch"] += 1
-                        else:
-                            batch_times.append(elapsed)
-            else:
-                _, elapsed, err = run_batch()
-                if err:
-                    errors["batch"] += 1
-                else:
-                    batch_times.append(elapsed)
+            times, errors = run_requests(client, max(1, args.batch_parallel), batch_concurrency, run_batch)
+            batch_times.extend(times)
+            batch_errors += errors
             time.sleep(args.sleep)
 
-    print(summarize("market-data", market_times, errors["market"]))
-    print(summarize("option-chain", chain_times, errors["chain"]))
-    print(summarize("option-quote", quote_times, errors["quote"]))
+    print(summarize("market-data", [market_timing] if not err else [], 1 if err else 0))
+    print(summarize("option-chain", [chain_timing] if not chain_err else [], 1 if chain_err else 0))
+    print(summarize("option-quote", quote_times, quote_errors))
     if args.batch_size > 0:
-        print(summarize(f"option-quote/batch size={args.batch_size} parallel={args.batch_parallel}", batch_times, errors["batch"]))
+        print(summarize(f"option-quote/batch size={args.batch_size} parallel={args.batch_parallel}", batch_times, batch_errors))
+    print(f"Connections opened: {client.opened}")
+    client.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""Open-loop load generator for the IBKR bridge.
+
+Requests are scheduled at a target arrival rate (constant or Poisson) and
+sent whether or not earlier ones have finished, so a slow bridge builds a
+queue instead of quietly lowering the offered load. Latency is measured
+from each request's *intended* start time (coordinated-omission corrected);
+the plain send-to-response service time is reported alongside.
+
+Examples:
+  bridge_load.py --profile 20:30 --out run.json
+  bridge_load.py --profile 10:20,50:60,100:30 --ramp --mix market-data=60,option-quote=40
+  bridge_load.py --profile 50:60 --out run.json --baseline baseline.json --max-p99-regression 0.2
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+SCRIPT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(SCRIPT_ROOT / "lib"))
+
+from ibkr_bridge_config import get_bridge_url, get_bridge_api_key  # noqa: E402
+from bridge_latency_probe import load_env, pick_expiration, pick_strike  # noqa: E402
+
+DEFAULT_MIX = "market-data=35,batch=10,option-chain=10,option-quote=20,historical=5,positions=10,orders=10"
+DEFAULT_SYMBOLS = "AAPL,MSFT,NVDA,AMZN,SPY,QQQ,TSLA,META"
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram (~1% relative precision, microsecond floor)."""
+
+    def __init__(self, precision=0.01):
+        self.precision = precision
+        self.log_base = math.log1p(precision)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = max(1.0, seconds * 1e6)
+        index = int(math.log(us) / self.log_base)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(pct / 100.0 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # Upper edge of the bucket, capped at the largest sample.
+                return min(math.exp((index + 1) * self.log_base) / 1e6, self.max)
+        return self.max
+
+    def summary_ms(self):
+        if not self.count:
+            return None
+        summary = {f"p{pct:g}": round(self.percentile(pct) * 1000, 3) for pct in PERCENTILES}
+        summary["mean"] = round(self.total / self.count * 1000, 3)
+        summary["max"] = round(self.max * 1000, 3)
+        return summary
+
+    def to_dict(self):
+        return {"precision": self.precision, "buckets": {str(k): v for k, v in sorted(self.buckets.items())}}
+
+
+class EndpointStats:
+    def __init__(self):
+        self.response = LatencyHistogram()
+        self.service = LatencyHistogram()
+        self.statuses = {}
+        self.errors = 0
+
+    def record(self, response_s, service_s, status, ok):
+        self.response.record(response_s)
+        self.service.record(service_s)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def merge(self, other):
+        self.response.merge(other.response)
+        self.service.merge(other.service)
+        for status, n in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + n
+        self.errors += other.errors
+
+    def to_dict(self, duration):
+        count = self.response.count
+        return {
+            "count": count,
+            "errors": self.errors,
+            "errorRate": round(self.errors / count, 4) if count else 0.0,
+            "achievedRps": round(count / duration, 2) if duration else None,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items(), key=lambda kv: str(kv[0]))},
+            "latencyMs": self.response.summary_ms(),
+            "serviceMs": self.service.summary_ms(),
+            "histogram": self.response.to_dict(),
+        }
+
+
+class BridgeClient:
+    """One keep-alive connection per worker thread."""
+
+    def __init__(self, base_url, api_key, timeout):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.headers = {"Accept": "application/json", "Connection": "keep-alive"}
+        if api_key:
+            self.headers["X-API-KEY"] = api_key
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = self.local.conn = cls(self.netloc, timeout=self.timeout)
+        return conn
+
+    def request(self, method, path, payload=None):
+        headers = dict(self.headers)
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            conn = self.connection()
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+                return resp.status, raw
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Stale keep-alive socket; reconnect once.
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+            except Exception:
+                conn.close()
+                self.local.conn = None
+                raise
+
+
+def parse_mix(raw):
+    mix = []
+    for item in raw.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in WORKLOADS:
+            raise SystemExit(f"Unknown workload '{name}'. Choose from: {', '.join(sorted(WORKLOADS))}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def parse_profile(raw):
+    # "rate:seconds,rate:seconds" stages.
+    stages = []
+    for item in raw.split(","):
+        rate, _, seconds = item.partition(":")
+        stages.append((float(rate), float(seconds)))
+    return stages
+
+
+def rate_at(stages, elapsed, ramp):
+    start = 0.0
+    previous = stages[0][0]
+    for rate, seconds in stages:
+        if elapsed < start + seconds:
+            if ramp:
+                return previous + (rate - previous) * (elapsed - start) / seconds
+            return rate
+        previous = rate
+        start += seconds
+    return None
+
+
+def arrival_schedule(stages, ramp, poisson, rng):
+    """Yields intended send offsets (seconds from start) for the whole profile."""
+    elapsed = 0.0
+    total = sum(seconds for _, seconds in stages)
+    while elapsed < total:
+        rate = rate_at(stages, elapsed, ramp)
+        if not rate or rate <= 0:
+            elapsed += 0.01
+            continue
+        gap = rng.expovariate(rate) if poisson else 1.0 / rate
+        elapsed += gap
+        if elapsed < total:
+            yield elapsed
+
+
+# --- Workloads ---
+
+def wl_market_data(ctx, rng):
+    return "GET", f"/market-data/{rng.choice(ctx['symbols'])}", None
+
+
+def wl_batch(ctx, rng):
+    symbols = rng.sample(ctx["symbols"], min(len(ctx["symbols"]), ctx["batch_size"]))
+    return "POST", "/market-data/batch", {"symbols": symbols}
+
+
+def wl_option_chain(ctx, rng):
+    return "GET", f"/option-chain/{rng.choice(ctx['symbols'])}", None
+
+
+def wl_option_quote(ctx, rng):
+    if not ctx.get("option"):
+        return None
+    return "POST", "/option-quote", ctx["option"]
+
+
+def wl_historical(ctx, rng):
+    return "POST", "/historical", {"symbol": rng.choice(ctx["symbols"]), "duration": ctx["hist_duration"], "barSize": ctx["hist_bar_size"]}
+
+
+def wl_positions(ctx, rng):
+    return "GET", "/positions", None
+
+
+def wl_orders(ctx, rng):
+    return "GET", "/orders", None
+
+
+WORKLOADS = {
+    "market-data": wl_market_data,
+    "batch": wl_batch,
+    "option-chain": wl_option_chain,
+    "option-quote": wl_option_quote,
+    "historical": wl_historical,
+    "positions": wl_positions,
+    "orders": wl_orders,
+}
+
+
+def resolve_option(client, symbol, right, dte_min, dte_max, otm_pct):
+    """Picks one real contract for the option-quote workload."""
+    try:
+        status, raw = client.request("GET", f"/market-data/{symbol}")
+        market = json.loads(raw) if status == 200 else {}
+        status, raw = client.request("GET", f"/option-chain/{symbol}")
+        chain = json.loads(raw) if status == 200 else {}
+    except Exception as exc:
+        print(f"Option preflight failed: {exc}")
+        return None
+    price = market.get("last") or market.get("bid") or market.get("close")
+    expiration = pick_expiration(chain.get("expirations"), dte_min, dte_max)
+    strike = pick_strike(chain.get("strikes"), price, right, otm_pct) if price else None
+    if not expiration or strike is None:
+        return None
+    return {"symbol": symbol, "expiration": expiration, "strike": strike, "right": right}
+
+
+def run_load(client, ctx, mix, stages, ramp, poisson, max_inflight, seed):
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    per_thread = []
+    per_thread_lock = threading.Lock()
+    local = threading.local()
+    inflight = threading.Semaphore(max_inflight)
+    saturated = {"count": 0}
+
+    def thread_stats():
+        stats = getattr(local, "stats", None)
+        if stats is None:
+            stats = local.stats = {}
+            with per_thread_lock:
+                per_thread.append(stats)
+        return stats
+
+    def fire(name, method, path, payload, intended):
+        try:
+            sent = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, payload)
+                ok = 200 <= status < 400
+            except Exception as exc:
+                status, ok = type(exc).__name__, False
+            done = time.perf_counter()
+            stats = thread_stats()
+            entry = stats.get(name) or stats.setdefault(name, EndpointStats())
+            entry.record(done - intended, done - sent, status, ok)
+        finally:
+            inflight.release()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        for offset in arrival_schedule(stages, ramp, poisson, rng):
+            intended = start + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name = rng.choices(names, weights)[0]
+            spec = WORKLOADS[name](ctx, rng)
+            if spec is None:
+                continue
+            if not inflight.acquire(blocking=False):
+                # Every worker is busy: block, but keep the intended time so
+                # the wait shows up in the corrected latency.
+                saturated["count"] += 1
+                inflight.acquire()
+            pool.submit(fire, name, spec[0], spec[1], spec[2], intended)
+    duration = time.perf_counter() - start
+
+    endpoints = {}
+    for stats in per_thread:
+        for name, entry in stats.items():
+            endpoints.setdefault(name, EndpointStats()).merge(entry)
+    return endpoints, duration, saturated["count"]
+
+
+def compare_to_baseline(results, baseline, max_regression, min_delta_ms):
+    regressions = []
+    rows = []
+    for name, current in sorted(results["endpoints"].items()):
+        base = baseline.get("endpoints", {}).get(name)
+        cur_p99 = (current.get("latencyMs") or {}).get("p99")
+        base_p99 = ((base or {}).get("latencyMs") or {}).get("p99")
+        if cur_p99 is None or base_p99 is None:
+            rows.append((name, base_p99, cur_p99, None, "n/a"))
+            continue
+        ratio = cur_p99 / base_p99 if base_p99 else float("inf")
+        regressed = ratio > 1 + max_regression and (cur_p99 - base_p99) > min_delta_ms
+        rows.append((name, base_p99, cur_p99, ratio, "REGRESSED" if regressed else "ok"))
+        if regressed:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_report(results):
+    print(f"Duration: {results['durationSeconds']}s offered={results['offeredRequests']} workerSaturation={results['saturatedSends']}")
+    header = f"{'endpoint':<14}{'n':>7}{'err%':>7}{'rps':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'p99.9':>10}{'svc p99':>10}"
+    print(header)
+    for name, row in sorted(results["endpoints"].items()) + [("ALL", results["overall"])]:
+        lat = row.get("latencyMs") or {}
+        svc = row.get("serviceMs") or {}
+        print(f"{name:<14}{row['count']:>7}{row['errorRate'] * 100:>6.1f}%{row['achievedRps'] or 0:>8.1f}"
+              f"{lat.get('p50', 0):>10.1f}{lat.get('p90', 0):>10.1f}{lat.get('p99', 0):>10.1f}{lat.get('p99.9', 0):>10.1f}"
+              f"{svc.get('p99', 0):>10.1f}")
+
+
+def main():
+    load_env()
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the IBKR bridge.")
+    parser.add_argument("--base-url", default=get_bridge_url(os.environ))
+    parser.add_argument("--api-key", default=get_bridge_api_key(os.environ))
+    parser.add_argument("--profile", default="10:30", help="Comma-separated rate:seconds stages (requests/s).")
+    parser.add_argument("--ramp", action="store_true", help="Ramp linearly between stage rates instead of stepping.")
+    parser.add_argument("--constant", action="store_true", help="Evenly spaced arrivals instead of Poisson.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Workload weights; one of: {', '.join(WORKLOADS)}.")
+    parser.add_argument("--symbols", default=DEFAULT_SYMBOLS)
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--hist-duration", default="1 D")
+    parser.add_argument("--hist-bar-size", default="5 mins")
+    parser.add_argument("--option-symbol", default="MSFT")
+    parser.add_argument("--right", choices=["C", "P"], default="C")
+    parser.add_argument("--dte-min", type=int, default=14)
+    parser.add_argument("--dte-max", type=int, default=28)
+    parser.add_argument("--otm-pct", type=float, default=0.05)
+    parser.add_argument("--max-inflight", type=int, default=128)
+    parser.add_argument("--timeout", type=float, default=15.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write results JSON here.")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against.")
+    parser.add_argument("--max-p99-regression", type=float, default=0.2, help="Allowed p99 growth vs baseline (0.2 = 20%%).")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore p99 increases smaller than this.")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    client = BridgeClient(base_url, args.api_key, args.timeout)
+    mix = parse_mix(args.mix)
+    stages = parse_profile(args.profile)
+    ctx = {
+        "symbols": [s.strip().upper() for s in args.symbols.split(",") if s.strip()],
+        "batch_size": args.batch_size,
+        "hist_duration": args.hist_duration,
+        "hist_bar_size": args.hist_bar_size,
+    }
+    print(f"Bridge URL: {base_url}")
+    print(f"Profile: {args.profile} ramp={args.ramp} arrivals={'constant' if args.constant else 'poisson'}")
+    if any(name == "option-quote" for name, _ in mix):
+        ctx["option"] = resolve_option(client, args.option_symbol, args.right, args.dte_min, args.dte_max, args.otm_pct)
+        if ctx["option"]:
+            o = ctx["option"]
+            print(f"Option contract: {o['symbol']} {o['expiration']} {o['right']} {o['strike']}")
+        else:
+            print("Could not derive an option contract; option-quote requests are skipped.")
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    endpoints, duration, saturated = run_load(
+        client, ctx, mix, stages, args.ramp, not args.constant, args.max_inflight, args.seed
+    )
+    overall = EndpointStats()
+    for entry in endpoints.values():
+        overall.merge(entry)
+    results = {
+        "meta": {
+            "startedAt": started_at,
+            "baseUrl": base_url,
+            "profile": args.profile,
+            "ramp": args.ramp,
+            "arrivals": "constant" if args.constant else "poisson",
+            "mix": args.mix,
+            "seed": args.seed,
+            "maxInflight": args.max_inflight,
+        },
+        "durationSeconds": round(duration, 2),
+        "offeredRequests": overall.response.count,
+        "saturatedSends": saturated,
+        "endpoints": {name: entry.to_dict(duration) for name, entry in endpoints.items()},
+        "overall": overall.to_dict(duration),
+    }
+    print_report(results)
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        rows, regressions = compare_to_baseline(results, baseline, args.max_p99_regression, args.min_delta_ms)
+        print(f"Baseline {args.baseline} (p99 ms, limit +{args.max_p99_regression * 100:.0f}%):")
+        for name, base_p99, cur_p99, ratio, verdict in rows:
+            ratio_text = f"{ratio:.2f}x" if ratio is not None else "-"
+            print(f"  {name:<14}{base_p99 if base_p99 is not None else '-':>10}{cur_p99 if cur_p99 is not None else '-':>10}{ratio_text:>8}  {verdict}")
+        if regressions:
+            print(f"p99 regression in: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()